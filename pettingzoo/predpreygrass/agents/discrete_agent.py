@@ -1,6 +1,6 @@
 import numpy as np
 from gymnasium import spaces
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 from pettingzoo.utils.env import AgentID
 
@@ -22,6 +22,8 @@ class DiscreteAgent:
         ],
         initial_energy: float = 10,
         energy_gain_per_step: float = -0.1,
+        energy_array: Optional[np.ndarray] = None,
+        age_array: Optional[np.ndarray] = None,
     ):
         # identification agent
         self.agent_type_nr: int = agent_type_nr  # also channel number of agent
@@ -35,6 +37,13 @@ class DiscreteAgent:
         self.n_actions_agent: int = len(self.motion_range)
         self.action_space_agent = spaces.Discrete(self.n_actions_agent)
         self.position: np.ndarray = np.zeros(2, dtype=np.int32)  # x and y position
+        # energy and age are stored in (environment wide) arrays indexed by
+        # agent_id_nr, so the global state is available without collecting them
+        if energy_array is None or age_array is None:
+            energy_array = np.zeros(agent_id_nr + 1, dtype=np.float64)
+            age_array = np.zeros(agent_id_nr + 1, dtype=np.int64)
+        self.energy_array: np.ndarray = energy_array
+        self.age_array: np.ndarray = age_array
         self.energy: float = initial_energy  # still to implement
         self.energy_gain_per_step: float = energy_gain_per_step
 
@@ -44,6 +53,22 @@ class DiscreteAgent:
         self.x_grid_dim: int = self.model_state_agent.shape[0]
         self.y_grid_dim: int = self.model_state_agent.shape[1]
 
+    @property
+    def energy(self) -> float:
+        return float(self.energy_array[self.agent_id_nr])
+
+    @energy.setter
+    def energy(self, energy: float) -> None:
+        self.energy_array[self.agent_id_nr] = energy
+
+    @property
+    def age(self) -> int:
+        return int(self.age_array[self.agent_id_nr])
+
+    @age.setter
+    def age(self, age: int) -> None:
+        self.age_array[self.agent_id_nr] = age
+
     def step(self, action: int) -> np.ndarray:
         # returns new position of agent "self" given action "action"
 
@@ -0,0 +1,207 @@
+"""
+Action traces of 'PredPreyGrass' episodes: the smallest record from which an
+episode can be regenerated. A trace holds the seed of the episode, a hash of
+the constructor arguments which determine the dynamics, the constructor
+arguments themselves and the actions of all agents, packed two per byte and
+compressed (numpy .npz). Resets and births draw from the seeded random of the
+environment and everything else is deterministic, so 'resimulate' steps a
+fresh environment with the same seed and actions through the same episode;
+a digest of the final world verifies that it is bit-exact.
+"""
+import hashlib
+import json
+import os
+import random
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+# constructor arguments which only change the rendering or the speed, not the
+# dynamics: ignored by the config hash
+trace_ignored_kwarg_names = (
+    "render_mode",
+    "cell_scale",
+    "x_pygame_window",
+    "y_pygame_window",
+    "show_energy_chart",
+    "kernel_backend",
+    "render_every_n_cycles",
+    "render_fps",
+)
+
+
+def config_hash(init_kwargs: Dict[str, Any]) -> str:
+    dynamics_kwargs = {
+        name: value
+        for name, value in init_kwargs.items()
+        if name not in trace_ignored_kwarg_names
+    }
+    return hashlib.sha256(
+        json.dumps(dynamics_kwargs, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def world_digest(pred_prey_env) -> str:
+    # hash of the world: the model state, energy and age of all agents and the
+    # cycle counter
+    n_agent_ids = pred_prey_env.agent_id_counter
+    digest = hashlib.sha256()
+    digest.update(np.asarray(pred_prey_env.model_state).tobytes())
+    digest.update(pred_prey_env.agent_energy_array[:n_agent_ids].tobytes())
+    digest.update(pred_prey_env.agent_age_array[:n_agent_ids].tobytes())
+    digest.update(str(pred_prey_env.n_aec_cycles).encode())
+    return digest.hexdigest()
+
+
+def pack_actions(actions: np.ndarray) -> np.ndarray:
+    # two actions (< 16) per byte
+    if len(actions) % 2:
+        actions = np.append(actions, 0)
+    return (actions[0::2] << 4 | actions[1::2]).astype(np.uint8)
+
+
+def unpack_actions(packed_actions: np.ndarray, n_actions: int) -> np.ndarray:
+    actions = np.empty(2 * len(packed_actions), dtype=np.uint8)
+    actions[0::2] = packed_actions >> 4
+    actions[1::2] = packed_actions & 0x0F
+    return actions[:n_actions]
+
+
+class ActionTraceRecorder:
+    def __init__(self, directory: str, seed: Optional[int] = None):
+        # episode n is seeded with seed + n
+        self.directory = directory
+        self.seed = random.SystemRandom().randrange(2**31) if seed is None else seed
+        self.n_episodes: int = 0
+        self.episode_seed: Optional[int] = None
+        self.pool_sizes = (0, 0)
+        self.init_kwargs: Optional[Dict[str, Any]] = None
+        # actions of the current episode in stepping order, grown by doubling
+        self.action_array = np.zeros(1024, dtype=np.uint8)
+        self.n_actions: int = 0
+        # actions of the completed cycles, per cycle
+        self.cycle_n_actions_list = []
+        self.n_cycle_actions: int = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def start_episode(self, pred_prey_env) -> None:
+        # called at the start of a reset: saves the previous episode and seeds
+        # the environment for the next one
+        self.save_episode(pred_prey_env)
+        self.episode_seed = self.seed + self.n_episodes
+        self.init_kwargs = pred_prey_env.init_kwargs
+        # grown agent pools keep their size over resets
+        self.pool_sizes = (pred_prey_env.n_possible_predator, pred_prey_env.n_possible_prey)
+        pred_prey_env._seed(seed=self.episode_seed)
+        self.n_actions = 0
+        self.cycle_n_actions_list = []
+        self.n_cycle_actions = 0
+
+    def record(self, action, is_last_step_of_cycle: bool) -> None:
+        # called at every step
+        if self.n_actions == len(self.action_array):
+            self.action_array = np.concatenate(
+                [self.action_array, np.zeros_like(self.action_array)]
+            )
+        self.action_array[self.n_actions] = action
+        self.n_actions += 1
+        if is_last_step_of_cycle:
+            self.cycle_n_actions_list.append(self.n_actions - self.n_cycle_actions)
+            self.n_cycle_actions = self.n_actions
+
+    def trace_path(self, episode_nr: int) -> str:
+        return os.path.join(self.directory, f"trace_{episode_nr:06d}.npz")
+
+    def save_episode(self, pred_prey_env) -> None:
+        # the completed cycles of the current episode, if any
+        if self.episode_seed is None:
+            return
+        np.savez_compressed(
+            self.trace_path(self.n_episodes),
+            seed=np.array(self.episode_seed, dtype=np.int64),
+            config_hash=np.frombuffer(
+                config_hash(self.init_kwargs).encode(), dtype=np.uint8
+            ),
+            init_kwargs=np.frombuffer(
+                json.dumps(self.init_kwargs).encode(), dtype=np.uint8
+            ),
+            pool_sizes=np.array(self.pool_sizes, dtype=np.int64),
+            cycle_n_actions=np.array(self.cycle_n_actions_list, dtype=np.uint16),
+            actions=pack_actions(self.action_array[: self.n_cycle_actions]),
+            # the world after the last cycle; unknown when the episode was left
+            # during a cycle
+            world_digest=np.frombuffer(
+                (
+                    world_digest(pred_prey_env)
+                    if self.n_actions == self.n_cycle_actions
+                    else ""
+                ).encode(),
+                dtype=np.uint8,
+            ),
+        )
+        self.n_episodes += 1
+        self.episode_seed = None
+
+    def close(self, pred_prey_env) -> None:
+        self.save_episode(pred_prey_env)
+
+
+class ActionTrace:
+    def __init__(self, path: str):
+        with np.load(path, allow_pickle=False) as arrays:
+            self.seed = int(arrays["seed"])
+            self.config_hash = arrays["config_hash"].tobytes().decode()
+            self.init_kwargs: Dict[str, Any] = json.loads(
+                arrays["init_kwargs"].tobytes()
+            )
+            # n_possible_predator and n_possible_prey at the start of the episode
+            self.pool_sizes = tuple(arrays["pool_sizes"].tolist())
+            self.cycle_n_actions: np.ndarray = arrays["cycle_n_actions"].astype(np.int64)
+            self.actions = unpack_actions(
+                arrays["actions"], int(self.cycle_n_actions.sum())
+            )
+            self.world_digest = arrays["world_digest"].tobytes().decode()
+
+    @property
+    def n_cycles(self) -> int:
+        return len(self.cycle_n_actions)
+
+
+def resimulate(
+    trace: ActionTrace,
+    env_fn: Optional[Callable[..., Any]] = None,
+    on_cycle: Optional[Callable[[Any], None]] = None,
+    **env_kwargs,
+):
+    """
+    Regenerates the episode of 'trace' in a new environment and returns it at
+    the end of the episode. 'env_kwargs' may only change arguments which do
+    not change the dynamics (e.g. render_mode="human" to watch the episode);
+    'on_cycle' is called with the environment after every cycle. Raises a
+    ValueError when the configuration or the final world differ from the
+    recorded ones.
+    """
+    if env_fn is None:
+        from environments.predpreygrass import PredPreyGrass as env_fn
+    init_kwargs = dict(trace.init_kwargs, **env_kwargs)
+    if config_hash(init_kwargs) != trace.config_hash:
+        raise ValueError("the configuration differs from the one of the trace")
+    # an episode after the growth of the agent pools starts with the grown pools
+    init_kwargs["n_possible_predator"], init_kwargs["n_possible_prey"] = trace.pool_sizes
+    pred_prey_env = env_fn(**init_kwargs)
+    pred_prey_env._seed(seed=trace.seed)
+    pred_prey_env.reset()
+    start = 0
+    for n_actions in trace.cycle_n_actions.tolist():
+        if n_actions != len(pred_prey_env.agent_name_list):
+            raise ValueError(
+                f"cycle {pred_prey_env.n_aec_cycles} of the trace has {n_actions} "
+                f"actions for {len(pred_prey_env.agent_name_list)} agents"
+            )
+        pred_prey_env.step_cycle(trace.actions[start : start + n_actions])
+        start += n_actions
+        if on_cycle is not None:
+            on_cycle(pred_prey_env)
+    if trace.world_digest and world_digest(pred_prey_env) != trace.world_digest:
+        raise ValueError("the regenerated episode differs from the recorded one")
+    return pred_prey_env
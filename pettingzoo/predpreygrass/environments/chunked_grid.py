@@ -0,0 +1,235 @@
+"""
+Sparse grid representations for very large worlds, which replace the dense
+(channel, x, y) arrays of 'PredPreyGrass' when it is created with a
+'chunk_size'. Their memory scales with the population instead of the area.
+
+'ChunkedGrid' stores the numeric model state in square tiles of chunk_size x
+chunk_size cells, which are only allocated when a cell of the tile is written;
+cells of missing tiles read as zero. 'SparseGridLocations' stores the agent
+instance per (channel, x, y) in a dict. Both support the indexing the engine
+uses on the dense arrays: single cells, channel views and, for the model
+state, windows (observations, halos of a decomposed world) and gathers with
+index arrays (action masks).
+"""
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+
+class ChunkedGridChannel:
+    # view on one channel of a grid, indexed by (x, y) like a 2D array
+    def __init__(self, grid, channel: int):
+        self.grid = grid
+        self.channel = channel
+        self.shape: Tuple[int, int] = grid.shape[1:]
+
+    def __getitem__(self, key):
+        x, y = key
+        return self.grid[self.channel, x, y]
+
+    def __setitem__(self, key, value) -> None:
+        x, y = key
+        self.grid[self.channel, x, y] = value
+
+
+class ChunkedGrid:
+    def __init__(
+        self, shape: Tuple[int, int, int], chunk_size: int, dtype: Any = np.float32
+    ):
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+        self.shape: Tuple[int, int, int] = tuple(shape)
+        self.chunk_size: int = chunk_size
+        self.dtype = np.dtype(dtype)
+        # number of tiles along y, to number the tiles
+        self.n_tiles_y: int = -(-self.shape[2] // chunk_size)
+        self.tile_dict: Dict[Tuple[int, int], np.ndarray] = {}
+
+    @property
+    def n_tiles(self) -> int:
+        return len(self.tile_dict)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(tile.nbytes for tile in self.tile_dict.values())
+
+    def tile(self, tile_x: int, tile_y: int) -> np.ndarray:
+        # the tile, allocated on first use
+        tile = self.tile_dict.get((tile_x, tile_y))
+        if tile is None:
+            tile = np.zeros(
+                (self.shape[0], self.chunk_size, self.chunk_size), dtype=self.dtype
+            )
+            self.tile_dict[(tile_x, tile_y)] = tile
+        return tile
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            return ChunkedGridChannel(self, key)
+        channel, x, y = key
+        if any(isinstance(index, np.ndarray) for index in key):
+            return self.gather(channel, x, y)
+        if any(isinstance(index, slice) for index in key):
+            return self.window(channel, x, y)
+        chunk_size = self.chunk_size
+        tile = self.tile_dict.get((x // chunk_size, y // chunk_size))
+        if tile is None:
+            return self.dtype.type(0)
+        return tile[channel, x % chunk_size, y % chunk_size]
+
+    def __setitem__(self, key, value) -> None:
+        channel, x, y = key
+        if any(isinstance(index, slice) for index in key):
+            self.set_window(channel, x, y, value)
+            return
+        chunk_size = self.chunk_size
+        self.tile(x // chunk_size, y // chunk_size)[
+            channel, x % chunk_size, y % chunk_size
+        ] = value
+
+    def window(self, channel_slice, x_slice: slice, y_slice: slice) -> np.ndarray:
+        # copy of a rectangular window, assembled from the tiles it overlaps
+        if not isinstance(channel_slice, slice):
+            return self.window(slice(channel_slice, channel_slice + 1), x_slice, y_slice)[0]
+        channel_lo, channel_hi, _ = channel_slice.indices(self.shape[0])
+        xlo, xhi, _ = x_slice.indices(self.shape[1])
+        ylo, yhi, _ = y_slice.indices(self.shape[2])
+        window = np.zeros(
+            (channel_hi - channel_lo, max(xhi - xlo, 0), max(yhi - ylo, 0)),
+            dtype=self.dtype,
+        )
+        chunk_size = self.chunk_size
+        for tile_x in range(xlo // chunk_size, (xhi - 1) // chunk_size + 1):
+            for tile_y in range(ylo // chunk_size, (yhi - 1) // chunk_size + 1):
+                tile = self.tile_dict.get((tile_x, tile_y))
+                if tile is None:
+                    continue
+                # overlap of the tile and the window, in grid coordinates
+                x_start = max(xlo, tile_x * chunk_size)
+                x_stop = min(xhi, (tile_x + 1) * chunk_size)
+                y_start = max(ylo, tile_y * chunk_size)
+                y_stop = min(yhi, (tile_y + 1) * chunk_size)
+                window[:, x_start - xlo : x_stop - xlo, y_start - ylo : y_stop - ylo] = tile[
+                    channel_lo:channel_hi,
+                    x_start - tile_x * chunk_size : x_stop - tile_x * chunk_size,
+                    y_start - tile_y * chunk_size : y_stop - tile_y * chunk_size,
+                ]
+        return window
+
+    def set_window(self, channel_slice, x_slice: slice, y_slice: slice, values) -> None:
+        # writes a rectangular window; tiles are only allocated for nonzero values
+        if not isinstance(channel_slice, slice):
+            channel_slice = slice(channel_slice, channel_slice + 1)
+            values = np.asarray(values)[None]
+        channel_lo, channel_hi, _ = channel_slice.indices(self.shape[0])
+        xlo, xhi, _ = x_slice.indices(self.shape[1])
+        ylo, yhi, _ = y_slice.indices(self.shape[2])
+        values = np.broadcast_to(
+            np.asarray(values, dtype=self.dtype),
+            (channel_hi - channel_lo, max(xhi - xlo, 0), max(yhi - ylo, 0)),
+        )
+        chunk_size = self.chunk_size
+        for tile_x in range(xlo // chunk_size, (xhi - 1) // chunk_size + 1):
+            for tile_y in range(ylo // chunk_size, (yhi - 1) // chunk_size + 1):
+                x_start = max(xlo, tile_x * chunk_size)
+                x_stop = min(xhi, (tile_x + 1) * chunk_size)
+                y_start = max(ylo, tile_y * chunk_size)
+                y_stop = min(yhi, (tile_y + 1) * chunk_size)
+                tile_values = values[
+                    :, x_start - xlo : x_stop - xlo, y_start - ylo : y_stop - ylo
+                ]
+                if (tile_x, tile_y) not in self.tile_dict and not tile_values.any():
+                    continue
+                self.tile(tile_x, tile_y)[
+                    channel_lo:channel_hi,
+                    x_start - tile_x * chunk_size : x_stop - tile_x * chunk_size,
+                    y_start - tile_y * chunk_size : y_stop - tile_y * chunk_size,
+                ] = tile_values
+
+    def gather(self, channel, x, y) -> np.ndarray:
+        # values at the (broadcast) index arrays, per tile
+        channel, x, y = np.broadcast_arrays(channel, x, y)
+        values = np.zeros(channel.shape, dtype=self.dtype)
+        chunk_size = self.chunk_size
+        tile_nr = (x // chunk_size) * self.n_tiles_y + y // chunk_size
+        for tile_nr_value in np.unique(tile_nr):
+            tile = self.tile_dict.get(divmod(int(tile_nr_value), self.n_tiles_y))
+            if tile is None:
+                continue
+            in_tile = tile_nr == tile_nr_value
+            values[in_tile] = tile[
+                channel[in_tile], x[in_tile] % chunk_size, y[in_tile] % chunk_size
+            ]
+        return values
+
+    def fill(self, value) -> None:
+        if value != 0:
+            raise ValueError("a chunked grid can only be filled with zeros")
+        self.tile_dict.clear()
+
+    def release_empty_tiles(self) -> None:
+        # frees the tiles which no longer hold any agent
+        for tile_key in [
+            tile_key for tile_key, tile in self.tile_dict.items() if not tile.any()
+        ]:
+            del self.tile_dict[tile_key]
+
+    def tiles(self) -> Tuple[np.ndarray, np.ndarray]:
+        # (tile_x, tile_y) per tile and the tiles stacked, e.g. to serialize
+        tile_keys = np.array(list(self.tile_dict), dtype=np.int64).reshape(-1, 2)
+        tiles = np.zeros(
+            (len(self.tile_dict), self.shape[0], self.chunk_size, self.chunk_size),
+            dtype=self.dtype,
+        )
+        for tile_nr, tile in enumerate(self.tile_dict.values()):
+            tiles[tile_nr] = tile
+        return tile_keys, tiles
+
+    def load_tiles(self, tile_keys: np.ndarray, tiles: np.ndarray) -> None:
+        self.tile_dict = {
+            (tile_x, tile_y): tile.copy()
+            for (tile_x, tile_y), tile in zip(tile_keys.tolist(), tiles)
+        }
+
+    def copy(self) -> "ChunkedGrid":
+        grid = ChunkedGrid(self.shape, self.chunk_size, self.dtype)
+        grid.tile_dict = {
+            tile_key: tile.copy() for tile_key, tile in self.tile_dict.items()
+        }
+        return grid
+
+    def __array__(self, dtype: Optional[Any] = None) -> np.ndarray:
+        # dense copy, only for small grids (e.g. debugging)
+        array = self.window(slice(None), slice(None), slice(None))
+        return array if dtype is None else array.astype(dtype)
+
+
+class SparseGridLocations:
+    # agent instance per (channel, x, y), None for empty cells
+    def __init__(self, shape: Tuple[int, int, int]):
+        self.shape: Tuple[int, int, int] = tuple(shape)
+        self.location_dict: Dict[Tuple[int, int, int], Any] = {}
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            return ChunkedGridChannel(self, key)
+        channel, x, y = key
+        return self.location_dict.get((channel, x, y))
+
+    def __setitem__(self, key, value) -> None:
+        if isinstance(key, slice):
+            # clears whole channels, like dense_array[channel_slice] = None
+            if value is not None:
+                raise ValueError("whole channels can only be cleared")
+            channel_lo, channel_hi, _ = key.indices(self.shape[0])
+            self.location_dict = {
+                location: agent_instance
+                for location, agent_instance in self.location_dict.items()
+                if not channel_lo <= location[0] < channel_hi
+            }
+            return
+        channel, x, y = key
+        if value is None:
+            self.location_dict.pop((channel, x, y), None)
+        else:
+            self.location_dict[(channel, x, y)] = value
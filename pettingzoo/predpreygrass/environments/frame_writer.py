@@ -0,0 +1,256 @@
+"""
+Recording of rendered frames to a file while the simulation runs: an animated
+GIF (.gif), an animated PNG (.png, .apng) or a zip archive of numbered PNG
+frames (.zip, frame_000000.png, ...), e.g. for videos of evaluation episodes.
+
+'FrameWriter.write' only queues a copy of the frame; a background thread
+encodes the frames and appends them to the file one by one, so a recording
+takes the memory of the queued frames (at most 'max_queued_frames') and of one
+frame being encoded, whatever the length of the episode. When the encoding
+falls behind by a full queue, 'write' waits for room. The compression by zlib
+and Pillow releases the GIL, so on a machine with more than one core the
+encoding runs next to the simulation.
+"""
+import io
+import os
+import queue
+import struct
+import threading
+import zipfile
+import zlib
+from typing import Optional
+
+import numpy as np
+
+png_signature = b"\x89PNG\r\n\x1a\n"
+
+
+def png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + chunk_type
+        + data
+        + struct.pack(">I", zlib.crc32(chunk_type + data))
+    )
+
+
+def png_header(frame: np.ndarray) -> bytes:
+    # IHDR of an 8 bit rgb image
+    height, width = frame.shape[:2]
+    return png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+
+def png_image_data(frame: np.ndarray, compression_level: int = 6) -> bytes:
+    # compressed scanlines of an (y, x, rgb) frame, each with filter type 0
+    height = frame.shape[0]
+    scanlines = np.zeros((height, 1 + frame[0].size), dtype=np.uint8)
+    scanlines[:, 1:] = frame.reshape(height, -1)
+    return zlib.compress(scanlines.tobytes(), compression_level)
+
+
+def png_bytes(frame: np.ndarray) -> bytes:
+    return (
+        png_signature
+        + png_header(frame)
+        + png_chunk(b"IDAT", png_image_data(frame))
+        + png_chunk(b"IEND", b"")
+    )
+
+
+class ApngStream:
+    # animated PNG: the number of frames in 'acTL' precedes the frames, it is
+    # written when the stream is closed
+    def __init__(self, path: str, fps: float):
+        self.file = open(path, "wb")
+        self.delay_ms = int(round(1000 / fps))
+        self.shape: Optional[tuple] = None
+        self.n_frames: int = 0
+        self.sequence_nr: int = 0
+        self.animation_control_position: int = 0
+
+    def write_frame(self, frame: np.ndarray) -> None:
+        if self.shape is None:
+            self.shape = frame.shape
+            self.file.write(png_signature + png_header(frame))
+            self.animation_control_position = self.file.tell()
+            self.file.write(png_chunk(b"acTL", struct.pack(">II", 0, 0)))
+        elif frame.shape != self.shape:
+            raise ValueError(f"frame of shape {frame.shape} in a stream of {self.shape}")
+        height, width = frame.shape[:2]
+        # full frame at (0, 0), replacing the previous one
+        self.file.write(
+            png_chunk(
+                b"fcTL",
+                struct.pack(
+                    ">IIIIIHHBB",
+                    self.sequence_nr,
+                    width,
+                    height,
+                    0,
+                    0,
+                    self.delay_ms,
+                    1000,
+                    0,
+                    0,
+                ),
+            )
+        )
+        self.sequence_nr += 1
+        image_data = png_image_data(frame)
+        if self.n_frames == 0:
+            # the first frame is the default image as well
+            self.file.write(png_chunk(b"IDAT", image_data))
+        else:
+            self.file.write(
+                png_chunk(b"fdAT", struct.pack(">I", self.sequence_nr) + image_data)
+            )
+            self.sequence_nr += 1
+        self.n_frames += 1
+
+    def close(self) -> None:
+        if self.shape is not None:
+            self.file.write(png_chunk(b"IEND", b""))
+            self.file.seek(self.animation_control_position)
+            self.file.write(png_chunk(b"acTL", struct.pack(">II", self.n_frames, 0)))
+        self.file.close()
+
+
+class GifStream:
+    # animated GIF: every frame is encoded by Pillow as a GIF of its own, of
+    # which the image (with its palette as local color table) is appended
+    def __init__(self, path: str, fps: float):
+        from PIL import Image
+
+        self.image_module = Image
+        self.file = open(path, "wb")
+        # in hundredths of a second
+        self.delay = int(round(100 / fps))
+        self.shape: Optional[tuple] = None
+
+    def write_frame(self, frame: np.ndarray) -> None:
+        if self.shape is None:
+            self.shape = frame.shape
+            height, width = frame.shape[:2]
+            # no global color table; looping forever
+            self.file.write(b"GIF89a" + struct.pack("<HHBBB", width, height, 0, 0, 0))
+            self.file.write(b"\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00")
+        elif frame.shape != self.shape:
+            raise ValueError(f"frame of shape {frame.shape} in a stream of {self.shape}")
+        buffer = io.BytesIO()
+        self.image_module.fromarray(frame).quantize(
+            method=self.image_module.Quantize.FASTOCTREE
+        ).save(buffer, format="GIF")
+        data = buffer.getvalue()
+        # skip the header, the screen descriptor with the global color table and
+        # the extensions up to the image descriptor
+        screen_flags = data[10]
+        color_table = b""
+        position = 13
+        if screen_flags & 0x80:
+            color_table_size = 3 << ((screen_flags & 0x07) + 1)
+            color_table = data[position : position + color_table_size]
+            position += color_table_size
+        while data[position] == 0x21:
+            position += 2
+            while data[position]:
+                position += data[position] + 1
+            position += 1
+        image_descriptor = bytearray(data[position : position + 10])
+        if not image_descriptor[9] & 0x80:
+            image_descriptor[9] = 0x80 | (image_descriptor[9] & 0x40) | (screen_flags & 0x07)
+            image_descriptor += color_table
+        # graphic control extension with the delay, then the image up to the
+        # trailer
+        self.file.write(b"\x21\xf9\x04\x00" + struct.pack("<H", self.delay) + b"\x00\x00")
+        self.file.write(bytes(image_descriptor) + data[position + 10 : -1])
+
+    def close(self) -> None:
+        if self.shape is not None:
+            self.file.write(b"\x3b")
+        self.file.close()
+
+
+class FrameArchive:
+    # zip archive of numbered PNG frames, stored without recompression
+    def __init__(self, path: str, fps: float):
+        self.zip_file = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED)
+        self.n_frames: int = 0
+
+    def write_frame(self, frame: np.ndarray) -> None:
+        self.zip_file.writestr(f"frame_{self.n_frames:06d}.png", png_bytes(frame))
+        self.n_frames += 1
+
+    def close(self) -> None:
+        self.zip_file.close()
+
+
+frame_stream_classes = {
+    ".gif": GifStream,
+    ".png": ApngStream,
+    ".apng": ApngStream,
+    ".zip": FrameArchive,
+}
+
+
+class FrameWriter:
+    def __init__(self, path: str, fps: float = 5, max_queued_frames: int = 16):
+        # the format follows from the extension of 'path'
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in frame_stream_classes:
+            raise ValueError(
+                f"frames can be written to {', '.join(frame_stream_classes)} files, "
+                f"not to {path}"
+            )
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.frame_stream = frame_stream_classes[extension](path, fps)
+        self.frame_queue: queue.Queue = queue.Queue(maxsize=max_queued_frames)
+        self.n_frames: int = 0
+        # the first error of the writing thread, raised by 'write' and 'close'
+        self.error: Optional[BaseException] = None
+        self.is_closed = False
+        self.thread = threading.Thread(
+            target=self.write_frames, name="FrameWriter", daemon=True
+        )
+        self.thread.start()
+
+    def write(self, frame: np.ndarray) -> None:
+        # queues a copy of an (y, x, rgb) frame
+        if self.error is not None:
+            raise self.error
+        self.frame_queue.put(np.array(frame, dtype=np.uint8, copy=True))
+        self.n_frames += 1
+
+    def write_frames(self) -> None:
+        # the writing thread, until the None of 'close'
+        while True:
+            frame = self.frame_queue.get()
+            if frame is None:
+                break
+            if self.error is None:
+                try:
+                    self.frame_stream.write_frame(frame)
+                except Exception as error:
+                    self.error = error
+        try:
+            self.frame_stream.close()
+        except Exception as error:
+            self.error = self.error or error
+
+    def close(self) -> None:
+        # writes the queued frames and completes the file
+        if self.is_closed:
+            return
+        self.is_closed = True
+        self.frame_queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self) -> "FrameWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
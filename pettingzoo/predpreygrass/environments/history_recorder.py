@@ -0,0 +1,222 @@
+"""
+World history of 'PredPreyGrass' on disk, to inspect evaluation runs afterwards
+without simulating them again.
+
+'HistoryRecorder' appends a record of the world after every reset and at the
+end of every cycle to preallocated NumPy memmap files (.npy) in a directory:
+the model state as uint8, the energy, age and agent type per agent_id_nr and
+the populations. An index (history.json) holds the constructor arguments of
+the environment and the first record of every episode. A record only copies
+arrays into the memmaps, the operating system writes them to the files.
+'RecordedHistory' opens a directory read-only, also while it is recorded.
+"""
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# dtype per recorded field
+history_field_dtypes: Dict[str, type] = {
+    "model_state": np.uint8,
+    "energy": np.float32,
+    "age": np.int32,
+    "agent_type": np.uint8,
+    "population": np.int32,
+}
+history_index_file_name = "history.json"
+
+
+class HistoryRecorder:
+    def __init__(
+        self,
+        directory: str,
+        pred_prey_env,
+        max_records: int,
+        n_agent_ids: Optional[int] = None,
+    ):
+        # room for 'max_records' records of 'n_agent_ids' agents, by default all
+        # agents the environment can have
+        if pred_prey_env.chunk_size is not None:
+            raise ValueError("only dense worlds (chunk_size=None) can be recorded")
+        if n_agent_ids is None:
+            n_agent_ids = len(pred_prey_env.agent_energy_array)
+            if pred_prey_env.grow_agent_pools:
+                if None in (
+                    pred_prey_env.max_n_possible_predator,
+                    pred_prey_env.max_n_possible_prey,
+                ):
+                    raise ValueError(
+                        "growing agent pools without caps need an explicit n_agent_ids"
+                    )
+                n_agent_ids = max(
+                    n_agent_ids,
+                    pred_prey_env.max_n_possible_predator
+                    + pred_prey_env.max_n_possible_prey
+                    + pred_prey_env.n_possible_grass,
+                )
+        self.directory = directory
+        self.max_records = max_records
+        self.n_agent_ids = n_agent_ids
+        self.init_kwargs = pred_prey_env.init_kwargs
+        self.n_records: int = 0
+        # records which did not fit in 'max_records'
+        self.n_dropped_records: int = 0
+        # first record of every episode
+        self.episode_start_list: List[int] = []
+        # agent type per agent_id_nr of the current episode, grows with the pools
+        self.agent_type_array = np.zeros(n_agent_ids, dtype=np.uint8)
+        self.n_typed_agent_ids: int = 0
+
+        os.makedirs(directory, exist_ok=True)
+        field_shapes = {
+            "model_state": pred_prey_env.model_state.shape,
+            "energy": (n_agent_ids,),
+            "age": (n_agent_ids,),
+            "agent_type": (n_agent_ids,),
+            "population": (3,),
+        }
+        self.memmaps: Dict[str, np.memmap] = {
+            field_name: np.lib.format.open_memmap(
+                os.path.join(directory, field_name + ".npy"),
+                mode="w+",
+                dtype=dtype,
+                shape=(max_records,) + tuple(field_shapes[field_name]),
+            )
+            for field_name, dtype in history_field_dtypes.items()
+        }
+        # plain array views on the memmaps: indexing a np.memmap is slower
+        self.fields: Dict[str, np.ndarray] = {
+            field_name: memmap.view(np.ndarray)
+            for field_name, memmap in self.memmaps.items()
+        }
+        self.write_index()
+
+    def start_episode(self, pred_prey_env) -> None:
+        # called after a reset: the reset world is the first record of the episode
+        self.episode_start_list.append(self.n_records)
+        self.n_typed_agent_ids = 0
+        self.agent_type_array.fill(0)
+        self.write_index()
+        self.record(pred_prey_env)
+
+    def record(self, pred_prey_env) -> None:
+        # called at the end of every cycle
+        if self.n_records == self.max_records:
+            self.n_dropped_records += 1
+            return
+        n_agent_ids = pred_prey_env.agent_id_counter
+        if n_agent_ids > self.n_agent_ids:
+            raise ValueError(
+                f"the history has room for {self.n_agent_ids} agents, the world has "
+                f"{n_agent_ids}: create the recorder with a larger n_agent_ids"
+            )
+        if n_agent_ids > self.n_typed_agent_ids:
+            # agents which were created since the last record
+            for agent_type_nr, agent_pool_list in [
+                (pred_prey_env.predator_type_nr, pred_prey_env.predator_pool_list),
+                (pred_prey_env.prey_type_nr, pred_prey_env.prey_pool_list),
+                (pred_prey_env.grass_type_nr, pred_prey_env.grass_pool_list),
+            ]:
+                for agent_instance in agent_pool_list:
+                    if agent_instance.agent_id_nr >= self.n_typed_agent_ids:
+                        self.agent_type_array[agent_instance.agent_id_nr] = agent_type_nr
+            self.n_typed_agent_ids = n_agent_ids
+
+        record_nr = self.n_records
+        fields = self.fields
+        np.copyto(
+            fields["model_state"][record_nr], pred_prey_env.model_state, casting="unsafe"
+        )
+        fields["energy"][record_nr, :n_agent_ids] = pred_prey_env.agent_energy_array[
+            :n_agent_ids
+        ]
+        fields["age"][record_nr, :n_agent_ids] = pred_prey_env.agent_age_array[
+            :n_agent_ids
+        ]
+        fields["agent_type"][record_nr] = self.agent_type_array
+        fields["population"][record_nr] = (
+            pred_prey_env.n_active_predator,
+            pred_prey_env.n_active_prey,
+            pred_prey_env.n_active_grass,
+        )
+        self.n_records += 1
+
+    def write_index(self) -> None:
+        index = {
+            "init_kwargs": self.init_kwargs,
+            "max_records": self.max_records,
+            "n_agent_ids": self.n_agent_ids,
+            "n_records": self.n_records,
+            "n_dropped_records": self.n_dropped_records,
+            "episode_start_list": self.episode_start_list,
+        }
+        # replaced at once, so readers never see a partly written index
+        index_path = os.path.join(self.directory, history_index_file_name)
+        with open(index_path + ".tmp", "w") as index_file:
+            json.dump(index, index_file)
+        os.replace(index_path + ".tmp", index_path)
+
+    def close(self) -> None:
+        for memmap in self.memmaps.values():
+            memmap.flush()
+        self.write_index()
+
+    def __enter__(self) -> "HistoryRecorder":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class RecordedHistory:
+    # read-only access to a recorded directory; the fields are memmaps of all
+    # records, so only the records which are read are loaded
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, history_index_file_name)) as index_file:
+            index = json.load(index_file)
+        self.init_kwargs: Dict = index["init_kwargs"]
+        self.n_records: int = index["n_records"]
+        self.n_dropped_records: int = index["n_dropped_records"]
+        # of a recording which is not closed (yet), the episode which is being
+        # recorded is left out
+        self.episode_start_array = np.array(
+            [
+                episode_start
+                for episode_start in index["episode_start_list"]
+                if episode_start < self.n_records
+            ],
+            dtype=np.int64,
+        )
+        self.fields: Dict[str, np.ndarray] = {
+            field_name: np.load(
+                os.path.join(directory, field_name + ".npy"), mmap_mode="r"
+            )[: self.n_records]
+            for field_name in history_field_dtypes
+        }
+
+    @property
+    def n_episodes(self) -> int:
+        return len(self.episode_start_array)
+
+    def episode_records(self, episode_nr: int) -> Tuple[int, int]:
+        # (first, end) record of an episode: record first + n is cycle n
+        start = int(self.episode_start_array[episode_nr])
+        if episode_nr + 1 < self.n_episodes:
+            return start, int(self.episode_start_array[episode_nr + 1])
+        return start, self.n_records
+
+    def record_nr(self, episode_nr: int, cycle: int) -> int:
+        start, end = self.episode_records(episode_nr)
+        if not 0 <= cycle < end - start:
+            raise IndexError(
+                f"episode {episode_nr} has cycles 0 to {end - start - 1}, got {cycle}"
+            )
+        return start + cycle
+
+    def record(self, record_nr: int) -> Dict[str, np.ndarray]:
+        # views on the fields of one record
+        return {
+            field_name: field[record_nr] for field_name, field in self.fields.items()
+        }
@@ -0,0 +1,148 @@
+"""
+Per agent kernels of the AEC step of 'PredPreyGrass': moving an agent on the
+occupancy grid of its type and writing its observation window. The loop kernels
+are compiled with Numba when it is importable; otherwise the NumPy kernels are
+used. Both compute the same results, so the backend only changes the speed. The
+compiled kernels release the GIL, so worlds stepped by several threads (see
+vec_env/thread_pool_vec_env.py) overlap in them.
+"""
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+kernel_backend_names = ("numba", "numpy")
+
+
+def move_agent_loops(
+    occupancy: np.ndarray, x: int, y: int, dx: int, dy: int
+) -> Tuple[int, int]:
+    # moves the agent at (x, y) by (dx, dy) and updates 'occupancy' (the
+    # model_state channel of its type); moves into the wall or into a cell
+    # occupied by the same type are turned into "stay"
+    x_new = x + dx
+    y_new = y + dy
+    if (
+        x_new < 0
+        or x_new >= occupancy.shape[0]
+        or y_new < 0
+        or y_new >= occupancy.shape[1]
+        or occupancy[x_new, y_new] > 0
+    ):
+        return x, y
+    occupancy[x, y] -= 1
+    occupancy[x_new, y_new] += 1
+    return x_new, y_new
+
+
+def write_observation_loops(
+    observation: np.ndarray,
+    model_state: np.ndarray,
+    x: int,
+    y: int,
+    obs_offset: int,
+    mask: int,
+) -> None:
+    # writes the (channel, x, y) observation window centered at (x, y): the
+    # absolute model state inside the grid, the wall channel outside the grid and
+    # zeros in the outer 'mask' squares
+    n_channels = observation.shape[0]
+    observation_size = observation.shape[1]
+    for i in range(observation_size):
+        x_grid = x - obs_offset + i
+        for j in range(observation_size):
+            y_grid = y - obs_offset + j
+            if (
+                i < mask
+                or i >= observation_size - mask
+                or j < mask
+                or j >= observation_size - mask
+            ):
+                for channel in range(n_channels):
+                    observation[channel, i, j] = 0.0
+            elif (
+                0 <= x_grid < model_state.shape[1] and 0 <= y_grid < model_state.shape[2]
+            ):
+                for channel in range(n_channels):
+                    observation[channel, i, j] = abs(model_state[channel, x_grid, y_grid])
+            else:
+                observation[0, i, j] = 1.0
+                for channel in range(1, n_channels):
+                    observation[channel, i, j] = 0.0
+
+
+def move_agent_numpy(
+    occupancy: np.ndarray, x: int, y: int, dx: int, dy: int
+) -> Tuple[int, int]:
+    # scalar work: the loop kernel is also the fastest in plain Python
+    return move_agent_loops(occupancy, x, y, dx, dy)
+
+
+def write_observation_numpy(
+    observation: np.ndarray,
+    model_state: np.ndarray,
+    x: int,
+    y: int,
+    obs_offset: int,
+    mask: int,
+) -> None:
+    n_channels = observation.shape[0]
+    observation_size = observation.shape[1]
+    x_grid_size, y_grid_size = model_state.shape[1], model_state.shape[2]
+    # window in the grid and its place in the observation
+    xlo, xhi = max(x - obs_offset, 0), min(x + obs_offset, x_grid_size - 1) + 1
+    ylo, yhi = max(y - obs_offset, 0), min(y + obs_offset, y_grid_size - 1) + 1
+    xolo, yolo = xlo - (x - obs_offset), ylo - (y - obs_offset)
+
+    observation.fill(0.0)
+    # wall channel filled with ones up front
+    observation[0].fill(1.0)
+    observation[:, xolo : xolo + xhi - xlo, yolo : yolo + yhi - ylo] = np.abs(
+        model_state[0:n_channels, xlo:xhi, ylo:yhi]
+    )
+    if mask > 0:
+        observation[:, :mask] = 0.0
+        observation[:, observation_size - mask :] = 0.0
+        observation[:, :, :mask] = 0.0
+        observation[:, :, observation_size - mask :] = 0.0
+
+
+def default_kernel_backend() -> str:
+    return "numpy" if numba is None else "numba"
+
+
+def kernels(kernel_backend: Optional[str] = None) -> Dict[str, Callable]:
+    # kernel functions of 'kernel_backend' ("numba" or "numpy"), by default Numba
+    # when it is importable
+    kernel_backend = kernel_backend or default_kernel_backend()
+    if kernel_backend not in kernel_backend_names:
+        raise ValueError(
+            f"unknown kernel backend '{kernel_backend}', use one of {kernel_backend_names}"
+        )
+    if kernel_backend == "numba":
+        if numba is None:
+            raise ValueError("the 'numba' kernel backend needs numba to be installed")
+        return numba_kernels()
+    return {
+        "move_agent": move_agent_numpy,
+        "write_observation": write_observation_numpy,
+    }
+
+
+_numba_kernels: Dict[str, Callable] = {}
+
+
+def numba_kernels() -> Dict[str, Callable]:
+    # compiled once per process, at the first call of every kernel
+    if not _numba_kernels:
+        _numba_kernels["move_agent"] = numba.njit(cache=True, nogil=True)(
+            move_agent_loops
+        )
+        _numba_kernels["write_observation"] = numba.njit(cache=True, nogil=True)(
+            write_observation_loops
+        )
+    return _numba_kernels
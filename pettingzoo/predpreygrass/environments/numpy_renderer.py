@@ -0,0 +1,191 @@
+"""
+Renderer of 'PredPreyGrass' frames for render_mode="rgb_array" with NumPy
+only, without pygame or a display: e.g. for training videos and frame
+datasets on headless machines. It shows the same picture as the pygame
+renderer of human mode, without the id labels and with slightly different
+rounding of the translucent colors.
+
+A frame is assembled from cell tiles. A cell looks like every other cell with
+the same key: its background tile (the tiles differ only at the grid border),
+the number of observation windows per type over each of its quarters and the
+agent type on top. Per frame only the tiles of the distinct keys are made, by
+one lookup of their pixels in a small color table per key, and then copied to
+their cells; pygame and per agent drawing are not involved.
+"""
+from typing import Optional
+
+import numpy as np
+
+# colors as in 'PredPreyGrass.render'
+background_color = (255, 255, 255)
+border_color = (192, 192, 192)
+grid_border_color = (255, 0, 0)
+grid_border_width = 5
+observation_alpha = 128 / 255
+
+
+class NumpyRenderer:
+    def __init__(self, pred_prey_env, cell_scale: Optional[int] = None):
+        self.pred_prey_env = pred_prey_env
+        if cell_scale is None:
+            cell_scale = pred_prey_env.cell_scale
+        self.cell_scale = cell_scale
+        x_grid_size = pred_prey_env.x_grid_size
+        y_grid_size = pred_prey_env.y_grid_size
+
+        # the grid as background color nrs per (y, x) pixel
+        self.palette = np.array(
+            [background_color, border_color, grid_border_color], dtype=np.float32
+        )
+        background = np.zeros(
+            (cell_scale * y_grid_size, cell_scale * x_grid_size), dtype=np.int64
+        )
+        for cell_border in [
+            slice(None, None, cell_scale),
+            slice(cell_scale - 1, None, cell_scale),
+        ]:
+            background[cell_border] = 1
+            background[:, cell_border] = 1
+        for grid_border in [
+            slice(None, grid_border_width),
+            slice(-grid_border_width, None),
+        ]:
+            background[grid_border] = 2
+            background[:, grid_border] = 2
+        background_tiles, background_tile_nrs = np.unique(
+            background.reshape(y_grid_size, cell_scale, x_grid_size, cell_scale)
+            .transpose(0, 2, 1, 3)
+            .reshape(-1, cell_scale, cell_scale),
+            axis=0,
+            return_inverse=True,
+        )
+        self.background_tile_nrs = background_tile_nrs.reshape(-1)
+
+        # observation windows are counted per half cell: a window of an odd
+        # range covers whole cells, one of an even range ends halfway a cell
+        self.observation_list = []
+        for agent_type_nr, observation_range, color in [
+            (
+                pred_prey_env.prey_type_nr,
+                pred_prey_env.obs_range_prey,
+                (72, 152, 255),
+            ),
+            (
+                pred_prey_env.predator_type_nr,
+                pred_prey_env.obs_range_predator,
+                (255, 152, 72),
+            ),
+        ]:
+            if int((pred_prey_env.max_observation_range - observation_range) / 2) == 0:
+                observation_range = pred_prey_env.max_observation_range
+            self.observation_list.append(
+                (agent_type_nr, observation_range, np.array(color, dtype=np.float32))
+            )
+
+        # agents are disks, drawn in this order: the last type in a cell is on
+        # top; agent nr 0 is no agent
+        self.agent_list = [
+            (pred_prey_env.grass_type_nr, (0, 128, 0)),  # green
+            (pred_prey_env.prey_type_nr, (0, 0, 255)),  # blue
+            (pred_prey_env.predator_type_nr, (255, 0, 0)),  # red
+        ]
+        self.agent_colors = np.array(
+            [(0, 0, 0)] + [color for _, color in self.agent_list], dtype=np.uint8
+        )
+        radius = int(cell_scale / 2.3)
+        offset = np.arange(cell_scale) - cell_scale // 2
+        disk = offset[:, None] ** 2 + offset[None, :] ** 2 <= radius**2
+
+        # per background tile, without and with an agent: the entry of every
+        # tile pixel in the color table of a key, 3 * quarter + background color
+        # nr (quarter n at (n // 2, n % 2)) or 12 for the agent
+        half_cells = np.arange(cell_scale) * 2 // cell_scale
+        quarters = 2 * half_cells[:, None] + half_cells[None, :]
+        color_nr_tiles = 3 * quarters + background_tiles
+        self.color_nr_tiles = np.stack(
+            [color_nr_tiles, np.where(disk, 12, color_nr_tiles)], axis=1
+        )
+
+    @staticmethod
+    def window_coverage(n_agents: np.ndarray, observation_range: int) -> np.ndarray:
+        # number of observation windows over every half cell, of the agents per
+        # (y, x) cell: the window of an agent at half cell c covers the half
+        # cells c - observation_range up to c + observation_range - 1
+        coverage = np.zeros(
+            (2 * n_agents.shape[0], 2 * n_agents.shape[1]), dtype=np.int64
+        )
+        coverage[1::2, 1::2] = n_agents
+        for axis in (0, 1):
+            n_half_cells = coverage.shape[axis]
+            cumulative = np.concatenate(
+                [
+                    np.zeros_like(coverage.take([0], axis=axis)),
+                    coverage.cumsum(axis=axis),
+                ],
+                axis=axis,
+            )
+            half_cells = np.arange(n_half_cells)
+            upper = np.minimum(half_cells + observation_range + 1, n_half_cells)
+            lower = np.maximum(half_cells - observation_range + 1, 0)
+            coverage = cumulative.take(upper, axis=axis) - cumulative.take(
+                lower, axis=axis
+            )
+        return coverage
+
+    def render(self) -> np.ndarray:
+        # (y, x, rgb) frame of the model state
+        model_state = np.asarray(self.pred_prey_env.model_state)
+        cell_scale = self.cell_scale
+        y_grid_size, x_grid_size = model_state.shape[2], model_state.shape[1]
+
+        # key per cell: background tile nr, windows per type and quarter, agent nr
+        cell_keys = np.empty((y_grid_size * x_grid_size, 10), dtype=np.int64)
+        cell_keys[:, 0] = self.background_tile_nrs
+        for type_nr, (agent_type_nr, observation_range, _) in enumerate(
+            self.observation_list
+        ):
+            coverage = self.window_coverage(
+                np.maximum(model_state[agent_type_nr].T, 0), observation_range
+            )
+            for quarter_nr in range(4):
+                cell_keys[:, 1 + 4 * type_nr + quarter_nr] = coverage[
+                    quarter_nr // 2 :: 2, quarter_nr % 2 :: 2
+                ].reshape(-1)
+        cell_keys[:, 9] = 0
+        for agent_nr, (agent_type_nr, _) in enumerate(self.agent_list):
+            cell_keys[model_state[agent_type_nr].T.reshape(-1) > 0, 9] = agent_nr + 1
+        # distinct keys, compared as raw bytes
+        _, key_cell_nrs, tile_nrs = np.unique(
+            cell_keys.view(np.dtype((np.void, cell_keys.itemsize * 10))).reshape(-1),
+            return_index=True,
+            return_inverse=True,
+        )
+        keys = cell_keys[key_cell_nrs]
+
+        # color table per key: the windows blended in per type, in drawing
+        # order; after n windows of color c with alpha a a pixel p is
+        # c + (p - c) * (1 - a) ** n, so per quarter offset + factor * p
+        offset = np.zeros((len(keys), 4, 1, 3), dtype=np.float32)
+        factor = np.ones((len(keys), 4, 1, 1), dtype=np.float32)
+        for type_nr, (_, _, color) in enumerate(self.observation_list):
+            type_factor = (1 - observation_alpha) ** keys[
+                :, 1 + 4 * type_nr : 5 + 4 * type_nr, None, None
+            ]
+            offset = color + (offset - color) * type_factor
+            factor = factor * type_factor
+        color_table = np.empty((len(keys), 13, 3), dtype=np.uint8)
+        color_table[:, :12] = (offset + factor * self.palette + 0.5).reshape(-1, 12, 3)
+        color_table[:, 12] = self.agent_colors[keys[:, 9]]
+
+        # 'take' along the first axis copies whole pixels, faster than indexing
+        tiles = np.take(
+            color_table.reshape(-1, 3),
+            13 * np.arange(len(keys))[:, None, None]
+            + self.color_nr_tiles[keys[:, 0], (keys[:, 9] > 0).astype(np.int64)],
+            axis=0,
+        )
+        return (
+            np.take(tiles, tile_nrs.reshape(y_grid_size, x_grid_size), axis=0)
+            .transpose(0, 2, 1, 3, 4)
+            .reshape(y_grid_size * cell_scale, x_grid_size * cell_scale, 3)
+        )
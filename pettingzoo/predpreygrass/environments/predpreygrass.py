@@ -1,12 +1,14 @@
 """
 pred/prey/grass PettingZoo multi-agent learning environment
 """
+import io
+import json
 import os
 import numpy as np
 import random
-from typing import List, Dict, Optional, TypeVar
+import time
+from typing import Any, List, Dict, Optional, Tuple, TypeVar
 import pygame
-from collections import defaultdict
 
 import gymnasium
 from gymnasium.utils import seeding, EzPickle
@@ -15,10 +17,66 @@ from pettingzoo import AECEnv
 from pettingzoo.utils import agent_selector
 
 from agents.discrete_agent import DiscreteAgent
+from environments.chunked_grid import ChunkedGrid, SparseGridLocations
+from environments.action_trace import ActionTraceRecorder
+from environments.frame_writer import FrameWriter
+from environments.history_recorder import HistoryRecorder
+from environments.kernels import default_kernel_backend, kernels
+from environments.numpy_renderer import NumpyRenderer
 from pettingzoo.utils.env import AgentID
 
 
+def grow_array(array: np.ndarray, length: int, fill_value=0) -> np.ndarray:
+    # copy of 'array' with 'length' entries along the first axis, new entries are
+    # set to 'fill_value'
+    grown_array = np.full((length,) + array.shape[1:], fill_value, dtype=array.dtype)
+    grown_array[: len(array)] = array
+    return grown_array
+
+
+def plain_init_kwarg(name: str, value: Any) -> Any:
+    # a constructor argument as a plain Python value, stored in 'init_kwargs' and
+    # serialized as JSON (see 'to_bytes', the action traces and the histories):
+    # numpy scalars (e.g. from a numpy-built configuration) become Python scalars
+    if isinstance(value, np.generic):
+        value = value.item()
+    elif isinstance(value, (tuple, list)):
+        value = type(value)(plain_init_kwarg(name, item) for item in value)
+    try:
+        json.dumps(value)
+    except TypeError:
+        raise ValueError(
+            f"argument {name}={value!r} of type {type(value).__name__} is not a "
+            "number, string, bool, None or a list of these"
+        ) from None
+    return value
+
+
 class PredPreyGrass:
+    # lookup tables which only depend on the parameters and are never written to:
+    # worlds with the same parameters can share one copy (see vec_env)
+    read_only_table_names = ("move_x_target_table", "move_y_target_table")
+    # integer counters of the world, stored in a snapshot (see 'snapshot')
+    snapshot_counter_names = (
+        "n_aec_cycles",
+        "agent_id_counter",
+        "world_version",
+        "n_possible_predator",
+        "n_possible_prey",
+        "n_active_predator",
+        "n_active_prey",
+        "n_active_grass",
+        "n_starved_predator",
+        "n_starved_prey",
+        "n_eaten_prey",
+        "n_born_predator",
+        "n_born_prey",
+    )
+    # per agent_id_nr records of the current cycle, cleared at its end
+    cycle_flag_array_names = ("eats_array", "eaten_array", "starves_array")
+    # rendering: beyond this number of changed items the whole grid is redrawn
+    max_dirty_rects = 64
+
     def __init__(
         self,
         x_grid_size: int = 16,
@@ -59,7 +117,23 @@ class PredPreyGrass:
         catch_prey_energy: float = 5.0,
         catch_grass_energy: float = 3.0,
         show_energy_chart: bool = True,
+        pad_observations: bool = True,
+        observation_history_length: int = 1,
+        grow_agent_pools: bool = False,
+        max_n_possible_predator: Optional[int] = None,
+        max_n_possible_prey: Optional[int] = None,
+        kernel_backend: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        x_region: Optional[Tuple[int, int]] = None,
+        render_every_n_cycles: int = 1,
+        render_fps: Optional[float] = None,
     ):
+        # constructor arguments, to serialize the environment (see 'to_bytes')
+        self.init_kwargs: Dict[str, Any] = {
+            name: plain_init_kwarg(name, value)
+            for name, value in locals().items()
+            if name != "self"
+        }
         self.x_grid_size = x_grid_size
         self.y_grid_size = y_grid_size
         self.max_cycles = max_cycles
@@ -98,6 +172,43 @@ class PredPreyGrass:
         self.step_reward_predator = step_reward_predator
         self.step_reward_prey = step_reward_prey
         self.step_reward_grass = step_reward_grass
+        # when False, observations keep the native per species shape
+        # (obs_range x obs_range) instead of being padded to max_observation_range
+        self.pad_observations = pad_observations
+        # number of most recent observations stacked along the channel axis
+        self.observation_history_length = observation_history_length
+        # when a birth finds no inactive agent of its type, the pool of that type
+        # grows with amortized doubling up to max_n_possible_* (None: no cap),
+        # instead of skipping the birth; n_possible_* is the initial pool size
+        self.grow_agent_pools = grow_agent_pools
+        self.max_n_possible_predator: Optional[int] = (
+            max_n_possible_predator if grow_agent_pools else n_possible_predator
+        )
+        self.max_n_possible_prey: Optional[int] = (
+            max_n_possible_prey if grow_agent_pools else n_possible_prey
+        )
+        # sparse world: the grids are stored in chunk_size x chunk_size tiles
+        # (see environments/chunked_grid.py) instead of dense arrays
+        self.chunk_size = chunk_size
+        # kernels of the agent moves and observations: "numba" (compiled) or
+        # "numpy", by default Numba when it is installed; the compiled kernels
+        # need dense grids
+        if chunk_size is not None:
+            if kernel_backend == "numba":
+                raise ValueError("the 'numba' kernel backend needs dense grids (no chunk_size)")
+            kernel_backend = "numpy"
+        self.kernel_backend: str = kernel_backend or default_kernel_backend()
+        kernel_functions = kernels(self.kernel_backend)
+        # columns [x_lo, x_hi) in which agents are placed at reset and at birth,
+        # by default the whole grid; a stripe of a decomposed world (see
+        # vec_env/decomposed_vec_env.py) only places agents in its own columns
+        self.x_region: Tuple[int, int] = (
+            (0, x_grid_size) if x_region is None else (int(x_region[0]), int(x_region[1]))
+        )
+        if not 0 <= self.x_region[0] < self.x_region[1] <= x_grid_size:
+            raise ValueError(f"x_region {x_region} is not a column range of the grid")
+        self.move_agent = kernel_functions["move_agent"]
+        self.write_observation_window = kernel_functions["write_observation"]
 
         # visualization
         # pygame screen position window
@@ -106,7 +217,23 @@ class PredPreyGrass:
             self.y_pygame_window,
         )
         self.screen = None
-        self.save_image_steps: bool = False
+        # human mode draws a frame at the end of every render_every_n_cycles-th
+        # cycle, at most render_fps frames per second (None: no limit); frames
+        # which come too early are skipped, the simulation never waits for them
+        self.render_every_n_cycles = render_every_n_cycles
+        self.render_fps = render_fps
+        self.next_render_time: float = 0.0
+        # grid without agents, drawn once per screen (see 'render')
+        self.grid_background: Optional[pygame.Surface] = None
+        # items and energy chart data of the last rendered frame
+        self.rendered_item_set: set = set()
+        self.rendered_energy_chart_data: Optional[tuple] = None
+        # renderer of the rgb_array frames, created at the first frame
+        self.numpy_renderer: Optional[NumpyRenderer] = None
+        # observation patches and id labels, by their look
+        self.item_surface_dict: Dict[tuple, pygame.Surface] = {}
+        # writer of the rendered frames (see 'record_frames')
+        self.frame_writer: Optional[FrameWriter] = None
         self.width_energy_chart: int = 1800 if self.show_energy_chart else 0
         self.height_energy_chart: int = self.cell_scale * self.y_grid_size
         if self.n_possible_predator > 18 or self.n_possible_prey > 24:
@@ -153,17 +280,29 @@ class PredPreyGrass:
         self.prey_name_list: List[AgentID] = []
         self.grass_name_list: List[AgentID] = []
         self.agent_name_list: List[AgentID] = []
+        # all possible agents per type, active or not, in the order of the name
+        # lists: the engine works on the instances, the names are only used by
+        # the (PettingZoo) API
+        self.predator_pool_list: List[DiscreteAgent] = []
+        self.prey_pool_list: List[DiscreteAgent] = []
+        self.grass_pool_list: List[DiscreteAgent] = []
+        self.agent_pool_list: List[DiscreteAgent] = []  # predators and prey
 
         # lookup record for agent instances per grid location
-        self.agent_instance_in_grid_location = np.empty(
-            (len(self.agent_type_name_list), x_grid_size, y_grid_size), dtype=object
-        )
-        for agent_type_nr in range(1, len(self.agent_type_name_list)):
-            self.agent_instance_in_grid_location[agent_type_nr] = np.full(
-                (self.x_grid_size, self.y_grid_size), None
+        if self.chunk_size is None:
+            self.agent_instance_in_grid_location = np.empty(
+                (len(self.agent_type_name_list), x_grid_size, y_grid_size), dtype=object
+            )
+            for agent_type_nr in range(1, len(self.agent_type_name_list)):
+                self.agent_instance_in_grid_location[agent_type_nr] = np.full(
+                    (self.x_grid_size, self.y_grid_size), None
+                )
+        else:
+            self.agent_instance_in_grid_location = SparseGridLocations(
+                (len(self.agent_type_name_list), x_grid_size, y_grid_size)
             )
 
-        # lookup record for agent instances per agent name
+        # lookup record for agent instances per agent name, for the API
         self.agent_name_to_instance_dict: Dict[AgentID, DiscreteAgent] = {}
 
         # creation agent name lists
@@ -185,19 +324,119 @@ class PredPreyGrass:
         # observations
         self.max_obs_offset: int = int((self.max_observation_range - 1) / 2)
         self.nr_observation_channels: int = len(self.agent_type_name_list)
-        obs_space = spaces.Box(
+        if self.pad_observations:
+            obs_range_predator_space = self.max_observation_range
+            obs_range_prey_space = self.max_observation_range
+        else:
+            obs_range_predator_space = self.obs_range_predator
+            obs_range_prey_space = self.obs_range_prey
+        self.obs_space_predator = spaces.Box(
             low=0,
             high=1,  # only one agent per cell per agent type observation channel
             shape=(
-                self.max_observation_range,
-                self.max_observation_range,
-                self.nr_observation_channels,
+                obs_range_predator_space,
+                obs_range_predator_space,
+                self.nr_observation_channels * self.observation_history_length,
+            ),
+            dtype=np.float32,
+        )
+        self.obs_space_prey = spaces.Box(
+            low=0,
+            high=1,
+            shape=(
+                obs_range_prey_space,
+                obs_range_prey_space,
+                self.nr_observation_channels * self.observation_history_length,
             ),
             dtype=np.float32,
         )
-        self.observation_space = [obs_space for _ in range(self.n_possible_agents)]  # type: ignore
+        self.observation_space = [  # type: ignore
+            self.obs_space_predator for _ in range(self.n_possible_predator)
+        ] + [self.obs_space_prey for _ in range(self.n_possible_prey)]
+
+        # preallocated observation tensor per learning agent type: every agent has a
+        # ring buffer of 'observation_history_length' frames which is stored twice
+        # (mirrored), so the frames in chronological order are always one contiguous
+        # slice that is returned as a stacked view without copying
+        # slot of every learning agent (indexed by agent_id_nr) in the observation
+        # tensor of its agent type, assigned when the agent is created
+        self.observation_slot_array: np.ndarray = np.zeros(
+            self.n_possible_agents + self.n_possible_grass, dtype=np.int64
+        )
+        self.observation_history_list: List[Optional[np.ndarray]] = [None] * len(
+            self.agent_type_name_list
+        )
+        self.observation_head_list: List[Optional[np.ndarray]] = [None] * len(
+            self.agent_type_name_list
+        )
+        # cycle of the newest frame per agent, -1 means no history (yet)
+        self.observation_cycle_list: List[Optional[np.ndarray]] = [None] * len(
+            self.agent_type_name_list
+        )
+        # world version of the newest frame per agent
+        self.observation_version_list: List[Optional[np.ndarray]] = [None] * len(
+            self.agent_type_name_list
+        )
+        for agent_type_nr, n_agents_type, obs_range_space in [
+            (self.predator_type_nr, self.n_possible_predator, obs_range_predator_space),
+            (self.prey_type_nr, self.n_possible_prey, obs_range_prey_space),
+        ]:
+            self.observation_history_list[agent_type_nr] = np.zeros(
+                (
+                    n_agents_type,
+                    2 * self.observation_history_length,
+                    self.nr_observation_channels,
+                    obs_range_space,
+                    obs_range_space,
+                ),
+                dtype=np.float32,
+            )
+            self.observation_head_list[agent_type_nr] = np.zeros(
+                n_agents_type, dtype=np.int64
+            )
+            self.observation_cycle_list[agent_type_nr] = np.full(
+                n_agents_type, -1, dtype=np.int64
+            )
+            self.observation_version_list[agent_type_nr] = np.full(
+                n_agents_type, -1, dtype=np.int64
+            )
         # end observations
 
+        # global state
+        # allocated once, so the read-only views returned by 'state' remain valid
+        # over resets (but not over growth of the agent pools); energy and age are
+        # indexed by agent_id_nr
+        n_state_agents = self.n_possible_agents + self.n_possible_grass
+        if self.chunk_size is None:
+            self.model_state: np.ndarray = np.zeros(
+                (self.nr_observation_channels, self.x_grid_size, self.y_grid_size),
+                dtype=np.float32,
+            )
+        else:
+            self.model_state = ChunkedGrid(
+                (self.nr_observation_channels, self.x_grid_size, self.y_grid_size),
+                self.chunk_size,
+                dtype=np.float32,
+            )
+        self.agent_energy_array: np.ndarray = np.zeros(n_state_agents, dtype=np.float64)
+        self.agent_age_array: np.ndarray = np.zeros(n_state_agents, dtype=np.int64)
+        # reward of the last step per agent_id_nr; 'agent_reward_dict' gives them
+        # by agent name
+        self.agent_reward_array: np.ndarray = np.zeros(n_state_agents, dtype=np.float64)
+        # records of the cycle per agent_id_nr: predators which eat a prey and prey
+        # which eat grass, prey and grass which are eaten and agents which starve
+        self.eats_array: np.ndarray = np.zeros(n_state_agents, dtype=bool)
+        self.eaten_array: np.ndarray = np.zeros(n_state_agents, dtype=bool)
+        self.starves_array: np.ndarray = np.zeros(n_state_agents, dtype=bool)
+        # agents which started in the last cycle: born at its end or activated at
+        # its boundary ('activate_agent'); possibly in the slot of an agent which
+        # died in the same cycle, so a slot which stays active can hold a new agent
+        self.born_array: np.ndarray = np.zeros(n_state_agents, dtype=bool)
+        # ids of the learning agents in 'agent_name_list' order
+        self.agent_id_nr_array: np.ndarray = np.arange(self.n_possible_agents)
+        self.create_state_views()
+        # end global state
+
         # actions
         self.motion_range: List[List[int]] = [
             [-1, 0],  # move left (in a pygame grid)
@@ -209,33 +448,52 @@ class PredPreyGrass:
         self.n_actions_agent: int = len(self.motion_range)
         action_space_agent = spaces.Discrete(self.n_actions_agent)
         self.action_space = [action_space_agent for _ in range(self.n_possible_agents)]
+        self.stay_action: int = self.motion_range.index([0, 0])
+        # move transition table: target cell per (x, y, action); moves into the wall
+        # are clipped to the own cell, which is occupied by the agent itself. A
+        # sparse world computes the targets per agent instead (see 'move_targets')
+        self.motion_array: np.ndarray = np.array(self.motion_range)
+        self.move_x_target_table: Optional[np.ndarray] = None
+        self.move_y_target_table: Optional[np.ndarray] = None
+        if self.chunk_size is None:
+            self.move_x_target_table = np.clip(
+                np.arange(self.x_grid_size)[:, None, None] + self.motion_array[:, 0],
+                0,
+                self.x_grid_size - 1,
+            ).repeat(self.y_grid_size, axis=1)
+            self.move_y_target_table = np.clip(
+                np.arange(self.y_grid_size)[None, :, None] + self.motion_array[:, 1],
+                0,
+                self.y_grid_size - 1,
+            ).repeat(self.x_grid_size, axis=0)
+            for table_name in self.read_only_table_names:
+                getattr(self, table_name).flags.writeable = False
+        # action mask per learning agent (indexed by agent_id_nr), updated at the
+        # end of every cycle; inactive agents can only "stay"; int8, as
+        # Discrete.sample(mask) of gymnasium requires
+        self.action_mask_array: np.ndarray = np.zeros(
+            (self.n_possible_agents, self.n_actions_agent), dtype=np.int8
+        )
         # end actions
 
-        # removal agents
-        self.prey_who_remove_grass_dict: Dict[AgentID, bool] = dict(
-            zip(self.prey_name_list, [False for _ in self.prey_name_list])
-        )
-        self.grass_to_be_removed_by_prey_dict: Dict[AgentID, bool] = dict(
-            zip(self.grass_name_list, [False for _ in self.grass_name_list])
-        )
-        self.predator_who_remove_prey_dict: Dict[AgentID, bool] = dict(
-            zip(self.predator_name_list, [False for _ in self.predator_name_list])
-        )
-        self.prey_to_be_removed_by_predator_dict: Dict[AgentID, bool] = dict(
-            zip(self.prey_name_list, [False for _ in self.prey_name_list])
-        )
-        self.predator_to_be_removed_by_starvation_dict: Dict[AgentID, bool] = dict(
-            zip(self.predator_name_list, [False for _ in self.predator_name_list])
-        )
-        self.prey_to_be_removed_by_starvation_dict: Dict[AgentID, bool] = dict(
-            zip(self.prey_name_list, [False for _ in self.prey_name_list])
-        )
-        # end removal agents
 
-        self.file_name: int = 0
         self.n_aec_cycles: int = 0
-
-    def reset(self):
+        # bumped by every mutation of the world, observations are only
+        # recomputed when the world changed since the last observation
+        self.world_version: int = 0
+        # records the world after every reset and cycle (see 'record_history')
+        self.history_recorder: Optional[HistoryRecorder] = None
+        # records the actions of every episode (see 'record_action_traces')
+        self.action_trace_recorder: Optional[ActionTraceRecorder] = None
+
+    def reset(self, rng=None):
+        # 'rng' (a random.Random) places the agents, by default the random of the
+        # environment (see '_seed')
+        if self.action_trace_recorder is not None:
+            if rng is not None:
+                raise ValueError("a traced episode is placed by the seed of its trace")
+            self.action_trace_recorder.start_episode(self)
+        rng = self.random if rng is None else rng
         # empty agent lists
         self.predator_instance_list = []
         self.prey_instance_list = []
@@ -259,69 +517,51 @@ class PredPreyGrass:
         self.n_active_prey = self.n_possible_prey
         self.n_active_grass = self.n_possible_grass
 
-        self.n_agent_type_list: List[int] = [
-            0,
-            self.n_possible_predator,
-            self.n_possible_prey,
-            self.n_possible_grass,
-        ]
-        self.obs_range_list: List[int] = [
-            0,
-            self.obs_range_predator,
-            self.obs_range_prey,
-            0,
-        ]
-        self.initial_energy_list: List[int] = [
-            0,
-            self.initial_energy_predator,
-            self.initial_energy_prey,
-            self.initial_energy_grass,
-        ]
-        self.energy_gain_per_step_list: List[int] = [
-            0,
-            self.energy_gain_per_step_predator,
-            self.energy_gain_per_step_prey,
-            self.energy_gain_per_step_grass,
-        ]
+        self.create_agent_type_lists()
+
+        # no observation history at the start of an episode
+        self.observation_cycle_list[self.predator_type_nr].fill(-1)
+        self.observation_cycle_list[self.prey_type_nr].fill(-1)
+        self.world_version += 1
 
         self.agent_id_counter = 0
         self.agent_name_to_instance_dict = {}
-        self.model_state: np.ndarray = np.zeros(
-            (self.nr_observation_channels, self.x_grid_size, self.y_grid_size),
-            dtype=np.float32,
+        # agent pools which have grown keep their size; the ids are renumbered
+        self.ensure_agent_id_capacity(
+            self.n_possible_predator + self.n_possible_prey + self.n_possible_grass
         )
+        self.model_state.fill(0.0)
+        self.agent_energy_array.fill(0.0)
+        self.agent_age_array.fill(0)
 
         # create agents of all types excluding "wall"-agents
         for agent_type_nr in range(1, len(self.agent_type_name_list)):
-            agent_type_name = self.agent_type_name_list[agent_type_nr]
-            # empty cell list: an array of tuples with the coordinates of empty cells, at initialization all cells are empty
-            empty_cell_list = [
-                (i, j) for i in range(self.x_grid_size) for j in range(self.y_grid_size)
-            ]
+            if self.chunk_size is None:
+                # empty cell list: an array of tuples with the coordinates of empty cells, at initialization all cells are empty
+                empty_cell_list = [
+                    (i, j) for i in range(*self.x_region) for j in range(self.y_grid_size)
+                ]
+            else:
+                # sparse world: distinct cells are sampled without listing all cells
+                initial_cell_list = [
+                    (self.x_region[0] + cell_nr // self.y_grid_size, cell_nr % self.y_grid_size)
+                    for cell_nr in rng.sample(
+                        range((self.x_region[1] - self.x_region[0]) * self.y_grid_size),
+                        self.n_agent_type_list[agent_type_nr],
+                    )
+                ]
             # intialize all possible agents of a certain type
-            for _ in range(self.n_agent_type_list[agent_type_nr]):
-                agent_id_nr = self.agent_id_counter
-                agent_name = agent_type_name + "_" + str(agent_id_nr)
-                self.agent_id_counter += 1
-                agent_instance = DiscreteAgent(
-                    agent_type_nr,
-                    agent_id_nr,
-                    agent_name,
-                    self.model_state[
-                        agent_type_nr
-                    ],  # needed to detect if a cell is allready occupied by an agent of the same type
-                    observation_range=self.obs_range_list[agent_type_nr],
-                    motion_range=self.motion_range,
-                    initial_energy=self.initial_energy_list[agent_type_nr],
-                    energy_gain_per_step=self.energy_gain_per_step_list[agent_type_nr],
-                )
+            for slot in range(self.n_agent_type_list[agent_type_nr]):
+                agent_instance = self.create_agent_instance(agent_type_nr, slot)
 
                 #  updates lists en records
-                xinit, yinit = random.choice(empty_cell_list)
-                empty_cell_list.remove(
-                    (xinit, yinit)
-                )  # occupied cell removed from empty_cell_list
-                self.agent_name_to_instance_dict[agent_name] = agent_instance
+                if self.chunk_size is None:
+                    xinit, yinit = rng.choice(empty_cell_list)
+                    empty_cell_list.remove(
+                        (xinit, yinit)
+                    )  # occupied cell removed from empty_cell_list
+                else:
+                    xinit, yinit = initial_cell_list[slot]
                 agent_instance.position = (xinit, yinit)
                 agent_instance.is_active = True
                 agent_instance.energy = self.initial_energy_list[agent_type_nr]
@@ -346,11 +586,12 @@ class PredPreyGrass:
         self.grass_name_list = self.create_agent_name_list_from_instance_list(
             self.grass_instance_list
         )
+        self.predator_pool_list = self.predator_instance_list[:]
+        self.prey_pool_list = self.prey_instance_list[:]
+        self.grass_pool_list = self.grass_instance_list[:]
 
         # deactivate agents which can be created later at runtime
-        predator_name: AgentID
-        for predator_name in self.predator_name_list:
-            predator_instance = self.agent_name_to_instance_dict[predator_name]
+        for predator_instance in self.predator_pool_list:
             if (
                 predator_instance.agent_id_nr >= self.n_initial_active_predator
             ):  # number of initial active predators
@@ -369,8 +610,7 @@ class PredPreyGrass:
                 predator_instance.is_active = False
                 predator_instance.energy = 0.0
 
-        for prey_name in self.prey_name_list:
-            prey_instance = self.agent_name_to_instance_dict[prey_name]
+        for prey_instance in self.prey_pool_list:
             if (
                 prey_instance.agent_id_nr
                 >= self.n_possible_predator + self.n_initial_active_prey
@@ -391,33 +631,19 @@ class PredPreyGrass:
                 prey_instance.energy = 0.0
 
         # removal agents set to false
-        self.prey_who_remove_grass_dict = dict(
-            zip(self.prey_name_list, [False for _ in self.prey_name_list])
-        )
-        self.grass_to_be_removed_by_prey_dict = dict(
-            zip(self.grass_name_list, [False for _ in self.grass_name_list])
-        )
-        self.predator_who_remove_prey_dict = dict(
-            zip(self.predator_name_list, [False for _ in self.predator_name_list])
-        )
-        self.prey_to_be_removed_by_predator_dict = dict(
-            zip(self.prey_name_list, [False for _ in self.prey_name_list])
-        )
-        self.prey_to_be_removed_by_starvation_dict = dict(
-            zip(self.prey_name_list, [False for _ in self.prey_name_list])
-        )
-        self.predator_to_be_removed_by_starvation_dict = dict(
-            zip(self.predator_name_list, [False for _ in self.predator_name_list])
-        )
+        self.clear_cycle_flags()
 
         # define the learning agents
         self.agent_instance_list = self.predator_instance_list + self.prey_instance_list
         self.agent_name_list = self.predator_name_list + self.prey_name_list
+        self.agent_pool_list = self.predator_pool_list + self.prey_pool_list
+        self.agent_id_nr_array = np.arange(len(self.agent_name_list))
 
-        self.agent_reward_dict: Dict[str, float] = dict(
-            zip(self.agent_name_list, [0.0 for _ in self.agent_name_list])
-        )
+        self.agent_reward_array.fill(0.0)
+        self.born_array.fill(False)
         self.n_aec_cycles = 0
+        # the first frame of an episode is not skipped
+        self.next_render_time = 0.0
 
         # time series of active agents
         self.n_active_predator_list = []
@@ -435,39 +661,28 @@ class PredPreyGrass:
         self.n_born_predator = 0
         self.n_born_prey = 0
 
+        self.update_action_masks()
+        if self.history_recorder is not None:
+            self.history_recorder.start_episode(self)
+
     def step(self, action, agent_instance, is_last_step_of_cycle):
+        self.world_version += 1
+        if self.action_trace_recorder is not None:
+            self.action_trace_recorder.record(
+                action if agent_instance.is_active else self.stay_action,
+                is_last_step_of_cycle,
+            )
         # Extract agent details
         if agent_instance.is_active:
             agent_type_nr = agent_instance.agent_type_nr
-            agent_name = agent_instance.agent_name
+            agent_id_nr = agent_instance.agent_id_nr
             agent_energy = agent_instance.energy
 
             # If the agent is a predator and it's alive
             if agent_type_nr == self.predator_type_nr:
                 if agent_energy > 0:  # If predator has energy
                     # Move the predator, update the model state and increase age
-                    self.agent_instance_in_grid_location[
-                        self.predator_type_nr,
-                        agent_instance.position[0],
-                        agent_instance.position[1],
-                    ] = None
-                    self.model_state[
-                        agent_type_nr,
-                        agent_instance.position[0],
-                        agent_instance.position[1],
-                    ] -= 1
-                    agent_instance.step(action)
-                    self.model_state[
-                        agent_type_nr,
-                        agent_instance.position[0],
-                        agent_instance.position[1],
-                    ] += 1
-                    self.agent_instance_in_grid_location[
-                        self.predator_type_nr,
-                        agent_instance.position[0],
-                        agent_instance.position[1],
-                    ] = agent_instance
-                    agent_instance.age += 1
+                    self.move_agent_instance(agent_instance, action)
                     (
                         x_new_position_predator,
                         y_new_position_predator,
@@ -484,39 +699,19 @@ class PredPreyGrass:
                         prey_instance_removed = self.agent_instance_in_grid_location[
                             self.prey_type_nr
                         ][(x_new_position_predator, y_new_position_predator)]
-                        self.predator_who_remove_prey_dict[agent_name] = True
-                        self.prey_to_be_removed_by_predator_dict[
-                            prey_instance_removed.agent_name
-                        ] = True
+                        # no instance: a ghost of a neighbouring stripe, which
+                        # cannot be eaten
+                        if prey_instance_removed is not None:
+                            self.eats_array[agent_id_nr] = True
+                            self.eaten_array[prey_instance_removed.agent_id_nr] = True
                 else:  # If predator has no energy, it starves to death
-                    self.predator_to_be_removed_by_starvation_dict[agent_name] = True
+                    self.starves_array[agent_id_nr] = True
 
             # If the agent is a prey and it's alive
             elif agent_type_nr == self.prey_type_nr:
                 if agent_energy > 0:  # If prey has energy
                     # Move the prey, update the model state and increase age
-                    self.agent_instance_in_grid_location[
-                        self.prey_type_nr,
-                        agent_instance.position[0],
-                        agent_instance.position[1],
-                    ] = None
-                    self.model_state[
-                        agent_type_nr,
-                        agent_instance.position[0],
-                        agent_instance.position[1],
-                    ] -= 1
-                    agent_instance.step(action)
-                    self.model_state[
-                        agent_type_nr,
-                        agent_instance.position[0],
-                        agent_instance.position[1],
-                    ] += 1
-                    self.agent_instance_in_grid_location[
-                        self.prey_type_nr,
-                        agent_instance.position[0],
-                        agent_instance.position[1],
-                    ] = agent_instance
-                    agent_instance.age += 1
+                    self.move_agent_instance(agent_instance, action)
                     x_new_position_prey, y_new_position_prey = agent_instance.position
                     if (
                         self.model_state[
@@ -529,24 +724,23 @@ class PredPreyGrass:
                         grass_instance_removed = self.agent_instance_in_grid_location[
                             self.grass_type_nr
                         ][(x_new_position_prey, y_new_position_prey)]
-                        grass_name_removed = grass_instance_removed.agent_name
-                        self.prey_who_remove_grass_dict[agent_name] = True
-                        self.grass_to_be_removed_by_prey_dict[grass_name_removed] = True
+                        if grass_instance_removed is not None:
+                            self.eats_array[agent_id_nr] = True
+                            self.eaten_array[grass_instance_removed.agent_id_nr] = True
                 else:  # prey starves to death
-                    self.prey_to_be_removed_by_starvation_dict[agent_name] = True
+                    self.starves_array[agent_id_nr] = True
 
         # reset rewards to zero in every single agent step
-        self.agent_reward_dict = dict(
-            zip(self.agent_name_list, [0.0 for _ in self.agent_name_list])
-        )
+        self.agent_reward_array.fill(0.0)
 
         if is_last_step_of_cycle:
             # removes agents, reap rewards, eventually regrows grass, 
             # create predators and prey at the end of the cycle
-            for predator_name in self.predator_name_list:
-                predator_instance = self.agent_name_to_instance_dict[predator_name]
+            self.born_array.fill(False)
+            for predator_instance in self.predator_pool_list:
                 if predator_instance.is_active:
-                    if self.predator_to_be_removed_by_starvation_dict[predator_name]:
+                    predator_id_nr = predator_instance.agent_id_nr
+                    if self.starves_array[predator_id_nr]:
                         # remove predator which is selected to starve to death from 
                         # self.predator_instance_list
                         self.predator_instance_list.remove(predator_instance)
@@ -563,27 +757,22 @@ class PredPreyGrass:
                             predator_instance.position[1],
                         ] -= 1
                         predator_instance.is_active = False
+                        self.reset_observation_history(predator_instance)
                         self.predator_age_list.append(predator_instance.age)
                         predator_instance.energy = 0.0
                         predator_instance.age = 0
-                        self.agent_reward_dict[
-                            predator_name
-                        ] += self.death_reward_predator
+                        self.agent_reward_array[predator_id_nr] += self.death_reward_predator
                     else:
                         # reap rewards for predator which removes prey
                         # energy gain per step equals reward but that is not necessarily so in general
-                        # self.agent_reward_dict[predator_name] += self.energy_gain_per_step_predator
-                        self.agent_reward_dict[
-                            predator_name
-                        ] += self.step_reward_predator
-                        self.agent_reward_dict[predator_name] += (
-                            self.catch_reward_prey
-                            * self.predator_who_remove_prey_dict[predator_name]
+                        # self.agent_reward_array[predator_id_nr] += self.energy_gain_per_step_predator
+                        self.agent_reward_array[predator_id_nr] += self.step_reward_predator
+                        self.agent_reward_array[predator_id_nr] += (
+                            self.catch_reward_prey * self.eats_array[predator_id_nr]
                         )
                         predator_instance.energy += self.energy_gain_per_step_predator
                         predator_instance.energy += (
-                            self.catch_prey_energy
-                            * self.predator_who_remove_prey_dict[predator_name]
+                            self.catch_prey_energy * self.eats_array[predator_id_nr]
                         )
                         # creates new predator agent when energy is above self.predator_creation_energy_threshold
                         if (
@@ -591,24 +780,16 @@ class PredPreyGrass:
                             and predator_instance.energy
                             > self.predator_creation_energy_threshold
                         ):
-                            non_active_predator_name_list = [
-                                predator_name
-                                for predator_name in self.predator_name_list
-                                if not self.agent_name_to_instance_dict[
-                                    predator_name
-                                ].is_active
-                            ]
+                            new_predator_instance = self.non_active_agent_instance(
+                                self.predator_type_nr
+                            )
                             # checks if there are non active predator agents available at all
-                            if len(non_active_predator_name_list) > 0:
+                            if new_predator_instance is not None:
                                 # "create" new predator agent (set attribute 'alive' to True)
-                                new_predator_name = non_active_predator_name_list[-1]
-                                new_predator_instance = (
-                                    self.agent_name_to_instance_dict[new_predator_name]
-                                )
                                 new_predator_instance.is_active = True
-                                self.predator_to_be_removed_by_starvation_dict[
-                                    new_predator_name
-                                ] = False
+                                self.born_array[new_predator_instance.agent_id_nr] = True
+                                self.reset_observation_history(new_predator_instance)
+                                self.starves_array[new_predator_instance.agent_id_nr] = False
                                 # part of parent energy transferred to child
                                 predator_instance.energy -= self.initial_energy_predator
                                 new_predator_instance.energy = (
@@ -624,10 +805,10 @@ class PredPreyGrass:
                                 # find a new random position for the new predator, which is not yet occupied by another predator
                                 position_found = False
                                 while not position_found:
-                                    x_new_position_predator = random.randint(
-                                        0, self.x_grid_size - 1
+                                    x_new_position_predator = self.random.randint(
+                                        self.x_region[0], self.x_region[1] - 1
                                     )
-                                    y_new_position_predator = random.randint(
+                                    y_new_position_predator = self.random.randint(
                                         0, self.y_grid_size - 1
                                     )
                                     if (
@@ -654,23 +835,20 @@ class PredPreyGrass:
                                     new_predator_instance.position[1],
                                 ] += 1
                                 # reproduction reward for parent predator
-                                self.agent_reward_dict[
-                                    predator_name
+                                self.agent_reward_array[
+                                    predator_id_nr
                                 ] += self.reproduction_reward_predator
 
-            for prey_name in self.prey_name_list:
-                prey_instance = self.agent_name_to_instance_dict[prey_name]
+            for prey_instance in self.prey_pool_list:
                 if prey_instance.is_active:
-                    if (
-                        self.prey_to_be_removed_by_predator_dict[prey_name]
-                        or self.prey_to_be_removed_by_starvation_dict[prey_name]
-                    ):
+                    prey_id_nr = prey_instance.agent_id_nr
+                    if self.eaten_array[prey_id_nr] or self.starves_array[prey_id_nr]:
                         # remove predator which is selected to starve to death or eaten from self.prey_instance_list
                         self.prey_instance_list.remove(prey_instance)
                         self.n_active_prey -= 1
-                        if self.prey_to_be_removed_by_starvation_dict[prey_name]:
+                        if self.starves_array[prey_id_nr]:
                             self.n_starved_prey += 1
-                        elif self.prey_to_be_removed_by_predator_dict[prey_name]:
+                        elif self.eaten_array[prey_id_nr]:
                             self.n_eaten_prey += 1
                         self.agent_instance_in_grid_location[
                             self.prey_type_nr,
@@ -683,23 +861,22 @@ class PredPreyGrass:
                             prey_instance.position[1],
                         ] -= 1
                         prey_instance.is_active = False
+                        self.reset_observation_history(prey_instance)
                         self.prey_age_list.append(prey_instance.age)
                         prey_instance.energy = 0.0
                         prey_instance.age = 0
-                        self.agent_reward_dict[prey_name] += self.death_reward_prey
+                        self.agent_reward_array[prey_id_nr] += self.death_reward_prey
 
                     else:
                         # reap rewards for predator which removes prey
                         # energy gain per step equals reward but that is not necessarily so in general
-                        self.agent_reward_dict[prey_name] += self.step_reward_prey
-                        self.agent_reward_dict[prey_name] += (
-                            self.catch_reward_grass
-                            * self.prey_who_remove_grass_dict[prey_name]
+                        self.agent_reward_array[prey_id_nr] += self.step_reward_prey
+                        self.agent_reward_array[prey_id_nr] += (
+                            self.catch_reward_grass * self.eats_array[prey_id_nr]
                         )
                         prey_instance.energy += self.energy_gain_per_step_prey
                         prey_instance.energy += (
-                            self.catch_grass_energy
-                            * self.prey_who_remove_grass_dict[prey_name]
+                            self.catch_grass_energy * self.eats_array[prey_id_nr]
                         )
                         # creates new prey agent when energy is above self.prey_creation_energy_threshold
                         if (
@@ -707,24 +884,16 @@ class PredPreyGrass:
                             and prey_instance.energy
                             > self.prey_creation_energy_threshold
                         ):
-                            non_active_prey_name_list = [
-                                prey_name
-                                for prey_name in self.prey_name_list
-                                if not self.agent_name_to_instance_dict[
-                                    prey_name
-                                ].is_active
-                            ]
+                            new_prey_instance = self.non_active_agent_instance(
+                                self.prey_type_nr
+                            )
                             # checks if there is a non active prey agent available
-                            if len(non_active_prey_name_list) > 0:
+                            if new_prey_instance is not None:
                                 # "create" new Prey agent (set attribute 'is_active' to True)
-                                new_prey_name = non_active_prey_name_list[-1]
-                                new_prey_instance = self.agent_name_to_instance_dict[
-                                    new_prey_name
-                                ]
                                 new_prey_instance.is_active = True
-                                self.prey_to_be_removed_by_starvation_dict[
-                                    new_prey_name
-                                ] = False
+                                self.born_array[new_prey_instance.agent_id_nr] = True
+                                self.reset_observation_history(new_prey_instance)
+                                self.starves_array[new_prey_instance.agent_id_nr] = False
                                 # parent energy transferred to child
                                 prey_instance.energy -= self.initial_energy_prey
                                 new_prey_instance.energy = self.initial_energy_prey
@@ -736,10 +905,10 @@ class PredPreyGrass:
                                 # find a new random position for the new prey, which is not yet occupied by another prey
                                 position_found = False
                                 while not position_found:
-                                    x_new_position_prey = random.randint(
-                                        0, self.x_grid_size - 1
+                                    x_new_position_prey = self.random.randint(
+                                        self.x_region[0], self.x_region[1] - 1
                                     )
-                                    y_new_position_prey = random.randint(
+                                    y_new_position_prey = self.random.randint(
                                         0, self.y_grid_size - 1
                                     )
                                     if (
@@ -767,16 +936,15 @@ class PredPreyGrass:
                                     new_prey_instance.position[1],
                                 ] += 1
                                 # reproduction reward for parent prey
-                                self.agent_reward_dict[
-                                    prey_name
+                                self.agent_reward_array[
+                                    prey_id_nr
                                 ] += self.reproduction_reward_prey
 
-            for grass_name in self.grass_name_list:
-                grass_instance = self.agent_name_to_instance_dict[grass_name]
+            for grass_instance in self.grass_pool_list:
                 # remove grass which gets eaten by a prey
                 grass_instance.energy += grass_instance.energy_gain_per_step
-                if self.grass_to_be_removed_by_prey_dict[grass_name]:
-                    # removes grass_name from 'grass_name_list'
+                if self.eaten_array[grass_instance.agent_id_nr]:
+                    # removes grass_instance from 'grass_instance_list'
                     self.grass_instance_list.remove(grass_instance)
                     self.n_active_grass -= 1
                     # self.agent_instance_in_grid_location[self.grass_type_nr,grass_instance.position[0],grass_instance.position[1]] = None
@@ -814,36 +982,188 @@ class PredPreyGrass:
             self.n_active_grass_list.insert(self.n_aec_cycles, self.n_active_grass)
 
             # reinit agents removal records to default at the end of the cycle
-            self.prey_who_remove_grass_dict = dict(
-                zip(self.prey_name_list, [False for _ in self.prey_name_list])
-            )
-            self.grass_to_be_removed_by_prey_dict = dict(
-                zip(self.grass_name_list, [False for _ in self.grass_name_list])
-            )
-            self.predator_who_remove_prey_dict = dict(
-                zip(self.predator_name_list, [False for _ in self.predator_name_list])
-            )
-            self.prey_to_be_removed_by_predator_dict = dict(
-                zip(self.prey_name_list, [False for _ in self.prey_name_list])
-            )
-            self.prey_to_be_removed_by_starvation_dict = dict(
-                zip(self.prey_name_list, [False for _ in self.prey_name_list])
-            )
-            self.predator_to_be_removed_by_starvation_dict = dict(
-                zip(self.predator_name_list, [False for _ in self.predator_name_list])
-            )
-            # end reinit agents removal records to default at the end of the cycle
+            self.clear_cycle_flags()
 
-        if self.render_mode == "human" and agent_instance.is_active:
-            self.render()
+            if self.chunk_size is not None:
+                self.model_state.release_empty_tiles()
+            self.update_action_masks()
+            if self.history_recorder is not None:
+                self.history_recorder.record(self)
+            if self.render_mode == "human":
+                self.render_cycle()
+
+    def render_cycle(self):
+        # human mode, at the end of a cycle: a frame when it is due (see
+        # render_every_n_cycles and render_fps); the end of an episode is always
+        # drawn
+        is_episode_end = self.is_terminated or self.is_truncated
+        if self.n_aec_cycles % self.render_every_n_cycles and not is_episode_end:
+            return
+        now = time.perf_counter()
+        if now < self.next_render_time and not is_episode_end:
+            return
+        if self.render_fps is not None:
+            self.next_render_time = now + 1 / self.render_fps
+        self.render()
+
+    def move_agent_instance(self, agent_instance, action):
+        agent_type_nr = agent_instance.agent_type_nr
+        x, y = agent_instance.position[0], agent_instance.position[1]
+        dx, dy = self.motion_range[action]
+        x_new, y_new = self.move_agent(self.model_state[agent_type_nr], x, y, dx, dy)
+        if (x_new, y_new) != (x, y):
+            self.agent_instance_in_grid_location[agent_type_nr, x, y] = None
+            self.agent_instance_in_grid_location[
+                agent_type_nr, x_new, y_new
+            ] = agent_instance
+            agent_instance.position = (x_new, y_new)
+        # the age is counted both per move (as DiscreteAgent.step did) and per step
+        agent_instance.age += 2
+
+    def step_cycle(self, actions):
+        # steps all learning agents of one (parallel) cycle in the AEC order of
+        # 'agent_name_list'; actions[i] is the action of agent_name_list[i]
+        agent_pool_list = self.agent_pool_list
+        n_agents = len(agent_pool_list)
+        for agent_nr, agent_instance in enumerate(agent_pool_list):
+            self.step(actions[agent_nr], agent_instance, agent_nr == n_agents - 1)
+
+    def clear_cycle_flags(self):
+        self.eats_array.fill(False)
+        self.eaten_array.fill(False)
+        self.starves_array.fill(False)
+
+    @property
+    def agent_reward_dict(self):
+        # the rewards of the last step by agent name, built for the API
+        return dict(
+            zip(self.agent_name_list, self.agent_reward_array[self.agent_id_nr_array].tolist())
+        )
+
+    def non_active_agent_instance(self, agent_type_nr):
+        # the last inactive agent of the pool of a learning agent type; when all are
+        # active the pool grows if it can, None otherwise
+        agent_pool_list = (
+            self.predator_pool_list
+            if agent_type_nr == self.predator_type_nr
+            else self.prey_pool_list
+        )
+        for agent_instance in reversed(agent_pool_list):
+            if not agent_instance.is_active:
+                return agent_instance
+        if self.grow_agent_pool(agent_type_nr):
+            # new (inactive) agents were added
+            return agent_pool_list[-1]
+        return None
+
+    def deactivate_agent(self, agent_instance):
+        # takes an active learning agent out of the world without a death, at a
+        # cycle boundary (e.g. to hand it over to another stripe)
+        agent_type_nr = agent_instance.agent_type_nr
+        x, y = agent_instance.position
+        self.agent_type_instance_list[agent_type_nr].remove(agent_instance)
+        if agent_type_nr == self.predator_type_nr:
+            self.n_active_predator -= 1
+        else:
+            self.n_active_prey -= 1
+        self.agent_instance_in_grid_location[agent_type_nr, x, y] = None
+        self.model_state[agent_type_nr, x, y] -= 1
+        agent_instance.is_active = False
+        self.reset_observation_history(agent_instance)
+        agent_instance.energy = 0.0
+        agent_instance.age = 0
+        self.world_version += 1
+
+    def activate_agent(self, agent_type_nr, position, energy, age):
+        # puts a learning agent with 'energy' and 'age' at the (free) 'position',
+        # at a cycle boundary, with an inactive instance of its type; returns the
+        # instance, or None when the pool has no inactive agent and cannot grow
+        agent_instance = self.non_active_agent_instance(agent_type_nr)
+        if agent_instance is None:
+            return None
+        agent_instance.is_active = True
+        self.born_array[agent_instance.agent_id_nr] = True
+        self.reset_observation_history(agent_instance)
+        agent_instance.energy = energy
+        agent_instance.age = age
+        agent_instance.position = (position[0], position[1])
+        self.agent_type_instance_list[agent_type_nr].append(agent_instance)
+        if agent_type_nr == self.predator_type_nr:
+            self.n_active_predator += 1
+        else:
+            self.n_active_prey += 1
+        self.agent_instance_in_grid_location[
+            agent_type_nr, position[0], position[1]
+        ] = agent_instance
+        self.model_state[agent_type_nr, position[0], position[1]] += 1
+        self.world_version += 1
+        return agent_instance
+
+    def relocate_agent(self, agent_instance, position):
+        # moves an active agent to the (free) 'position', outside of a step
+        agent_type_nr = agent_instance.agent_type_nr
+        x, y = agent_instance.position
+        self.agent_instance_in_grid_location[agent_type_nr, x, y] = None
+        self.model_state[agent_type_nr, x, y] -= 1
+        agent_instance.position = (position[0], position[1])
+        self.agent_instance_in_grid_location[
+            agent_type_nr, position[0], position[1]
+        ] = agent_instance
+        self.model_state[agent_type_nr, position[0], position[1]] += 1
+        self.world_version += 1
+
+    def random_free_cell(self, agent_type_nr, rng=None):
+        # random cell of 'x_region' without an agent of the type, as for births
+        rng = self.random if rng is None else rng
+        while True:
+            x = rng.randint(self.x_region[0], self.x_region[1] - 1)
+            y = rng.randint(0, self.y_grid_size - 1)
+            if self.model_state[agent_type_nr, x, y] == 0:
+                return x, y
+
+    def record_history(self, directory, max_records, n_agent_ids=None):
+        # records the world after every reset and at the end of every cycle into
+        # memmap files in 'directory' (see 'HistoryRecorder'), until 'close'
+        self.history_recorder = HistoryRecorder(
+            directory, self, max_records, n_agent_ids=n_agent_ids
+        )
+        return self.history_recorder
+
+    def record_action_traces(self, directory, seed=None):
+        # records the actions of every episode as a compact trace in 'directory'
+        # (see 'ActionTraceRecorder'), until 'close'; the episodes are seeded by
+        # the recorder, so 'resimulate' regenerates them
+        self.action_trace_recorder = ActionTraceRecorder(directory, seed=seed)
+        return self.action_trace_recorder
+
+    def record_frames(self, path, fps=None, max_queued_frames=16):
+        # writes every rendered frame to a .gif, .png (animated) or .zip file (see
+        # 'FrameWriter') in a background thread, until 'close'; by default at the
+        # render_fps of human mode
+        if fps is None:
+            fps = self.render_fps or 5
+        self.frame_writer = FrameWriter(path, fps=fps, max_queued_frames=max_queued_frames)
+        return self.frame_writer
 
     def close(self):
+        if self.frame_writer is not None:
+            self.frame_writer.close()
+            self.frame_writer = None
+        if self.action_trace_recorder is not None:
+            self.action_trace_recorder.close(self)
+            self.action_trace_recorder = None
+        if self.history_recorder is not None:
+            self.history_recorder.close()
+            self.history_recorder = None
         if self.screen is not None:
             pygame.quit()
             self.screen = None
 
     def _seed(self, seed=None):
         self.np_random, seed_ = seeding.np_random(seed)
+        # resets and births draw from 'random': the global random module, or a
+        # generator of its own once seeded, which makes episodes reproducible
+        self.random = random if seed is None else random.Random(seed)
         return [seed_]
 
     def create_agent_name_list_from_instance_list(self, _agent_instance_list):
@@ -867,7 +1187,10 @@ class PredPreyGrass:
     @property
     def is_no_prey_creation_possible(self):
         if self.n_active_prey == self.n_possible_prey:
-            return True
+            # a full pool can still grow up to its cap
+            return not self.grow_agent_pools or (
+                self.n_possible_prey == self.max_n_possible_prey
+            )
         return False
 
     @property
@@ -876,514 +1199,966 @@ class PredPreyGrass:
             return True
         return False
 
-    def observe(self, agent_name):
-        agent_instance = self.agent_name_to_instance_dict[agent_name]
+    @property
+    def is_terminated(self):
+        return self.is_no_prey or self.is_no_predator
 
-        xp, yp = agent_instance.position[0], agent_instance.position[1]
+    @property
+    def is_truncated(self):
+        return self.n_aec_cycles >= self.max_cycles
+
+    def update_action_masks(self):
+        # computes the action masks of all active learning agents at once: moves into
+        # the wall or into a cell occupied by the same agent type are turned into
+        # "stay" by DiscreteAgent.step and are masked out
+        self.action_mask_array.fill(0)
+        self.action_mask_array[:, self.stay_action] = 1
+        active_instance_list = self.predator_instance_list + self.prey_instance_list
+        if not active_instance_list:
+            return
+        agent_id_nr_array = np.array(
+            [agent_instance.agent_id_nr for agent_instance in active_instance_list]
+        )
+        agent_type_nr_array = np.array(
+            [agent_instance.agent_type_nr for agent_instance in active_instance_list]
+        )
+        position_array = np.array(
+            [agent_instance.position for agent_instance in active_instance_list]
+        )
+        x_target, y_target = self.move_targets(position_array)
+        is_free = self.model_state[agent_type_nr_array[:, None], x_target, y_target] == 0
+        is_free[:, self.stay_action] = True
+        self.action_mask_array[agent_id_nr_array] = is_free
+
+    def move_targets(self, position_array):
+        # target cells per action of the agents at 'position_array' (n, 2)
+        if self.move_x_target_table is not None:
+            return (
+                self.move_x_target_table[position_array[:, 0], position_array[:, 1]],
+                self.move_y_target_table[position_array[:, 0], position_array[:, 1]],
+            )
+        return (
+            np.clip(
+                position_array[:, 0, None] + self.motion_array[:, 0], 0, self.x_grid_size - 1
+            ),
+            np.clip(
+                position_array[:, 1, None] + self.motion_array[:, 1], 0, self.y_grid_size - 1
+            ),
+        )
 
-        observation = np.zeros(
-            (
-                self.nr_observation_channels,
-                self.max_observation_range,
-                self.max_observation_range,
+    def state(self):
+        # read-only views on the global state, no copies: they follow the
+        # environment, copy them to keep a snapshot
+        return self.state_views
+
+    def create_agent_type_lists(self):
+        # parameters per agent type, indexed by agent_type_nr
+        self.n_agent_type_list: List[int] = [
+            0,
+            self.n_possible_predator,
+            self.n_possible_prey,
+            self.n_possible_grass,
+        ]
+        self.obs_range_list: List[int] = [
+            0,
+            self.obs_range_predator,
+            self.obs_range_prey,
+            0,
+        ]
+        self.initial_energy_list: List[int] = [
+            0,
+            self.initial_energy_predator,
+            self.initial_energy_prey,
+            self.initial_energy_grass,
+        ]
+        self.energy_gain_per_step_list: List[int] = [
+            0,
+            self.energy_gain_per_step_predator,
+            self.energy_gain_per_step_prey,
+            self.energy_gain_per_step_grass,
+        ]
+
+    def create_space_lists(self):
+        # observation and action space per learning agent, in 'agent_name_list' order
+        self.observation_space = [  # type: ignore
+            self.obs_space_predator for _ in range(self.n_possible_predator)
+        ] + [self.obs_space_prey for _ in range(self.n_possible_prey)]
+        action_space_agent = self.action_space[0]
+        self.action_space = [action_space_agent for _ in range(self.n_possible_agents)]
+
+    def create_state_views(self):
+        # state space and read-only views on the global state arrays
+        n_state_agents = len(self.agent_energy_array)
+        state_spaces = {
+            "energy": spaces.Box(
+                low=-np.inf, high=np.inf, shape=(n_state_agents,), dtype=np.float64
             ),
-            dtype=np.float32,
+            "age": spaces.Box(
+                low=0,
+                high=np.iinfo(np.int64).max,
+                shape=(n_state_agents,),
+                dtype=np.int64,
+            ),
+        }
+        if self.chunk_size is None:
+            # a Box of a sparse world would allocate the dense grid twice
+            state_spaces["model_state"] = spaces.Box(
+                low=0, high=1, shape=self.model_state.shape, dtype=np.float32
+            )
+        self.state_space = spaces.Dict(state_spaces)
+        self.state_views: Dict[str, np.ndarray] = {}
+        for state_name, state_array in [
+            ("model_state", self.model_state),
+            ("energy", self.agent_energy_array),
+            ("age", self.agent_age_array),
+        ]:
+            if isinstance(state_array, ChunkedGrid):
+                # no dense view of a sparse world: the grid itself
+                self.state_views[state_name] = state_array
+                continue
+            state_view = state_array.view()
+            state_view.flags.writeable = False
+            self.state_views[state_name] = state_view
+
+    def ensure_agent_id_capacity(self, n_agent_ids):
+        # the arrays indexed by agent_id_nr are reallocated with at least double the
+        # capacity when 'n_agent_ids' ids do not fit; earlier views on them (state,
+        # action masks) then no longer follow the environment
+        capacity = len(self.agent_energy_array)
+        if n_agent_ids <= capacity:
+            return
+        capacity = max(n_agent_ids, 2 * capacity)
+        self.agent_energy_array = grow_array(self.agent_energy_array, capacity)
+        self.agent_age_array = grow_array(self.agent_age_array, capacity)
+        self.observation_slot_array = grow_array(self.observation_slot_array, capacity)
+        self.action_mask_array = grow_array(self.action_mask_array, capacity)
+        self.agent_reward_array = grow_array(self.agent_reward_array, capacity)
+        self.eats_array = grow_array(self.eats_array, capacity)
+        self.eaten_array = grow_array(self.eaten_array, capacity)
+        self.starves_array = grow_array(self.starves_array, capacity)
+        self.born_array = grow_array(self.born_array, capacity)
+        for agent_instance in self.agent_name_to_instance_dict.values():
+            agent_instance.energy_array = self.agent_energy_array
+            agent_instance.age_array = self.agent_age_array
+        self.create_state_views()
+
+    def create_agent_instance(self, agent_type_nr, slot):
+        # new agent with the next agent_id_nr, in observation slot 'slot' of its type
+        agent_id_nr = self.agent_id_counter
+        agent_name = self.agent_type_name_list[agent_type_nr] + "_" + str(agent_id_nr)
+        self.agent_id_counter += 1
+        self.observation_slot_array[agent_id_nr] = slot
+        agent_instance = DiscreteAgent(
+            agent_type_nr,
+            agent_id_nr,
+            agent_name,
+            self.model_state[
+                agent_type_nr
+            ],  # needed to detect if a cell is allready occupied by an agent of the same type
+            observation_range=self.obs_range_list[agent_type_nr],
+            motion_range=self.motion_range,
+            initial_energy=self.initial_energy_list[agent_type_nr],
+            energy_gain_per_step=self.energy_gain_per_step_list[agent_type_nr],
+            energy_array=self.agent_energy_array,
+            age_array=self.agent_age_array,
+        )
+        self.agent_name_to_instance_dict[agent_name] = agent_instance
+        return agent_instance
+
+    def grow_agent_pool(self, agent_type_nr):
+        # doubles the pool of (inactive) agents of a learning agent type, at most up
+        # to its cap; returns False if the pool cannot grow. The new agents get the
+        # next agent_id_nrs, after the grass
+        if agent_type_nr == self.predator_type_nr:
+            agent_name_list = self.predator_name_list
+            agent_pool_list = self.predator_pool_list
+            max_n_possible = self.max_n_possible_predator
+        else:
+            agent_name_list = self.prey_name_list
+            agent_pool_list = self.prey_pool_list
+            max_n_possible = self.max_n_possible_prey
+        n_possible = len(agent_name_list)
+        n_new = max(n_possible, 1)
+        if max_n_possible is not None:
+            n_new = min(n_new, max_n_possible - n_possible)
+        if not self.grow_agent_pools or n_new <= 0:
+            return False
+
+        self.ensure_agent_id_capacity(self.agent_id_counter + n_new)
+        n_grown = n_possible + n_new
+        self.observation_history_list[agent_type_nr] = grow_array(
+            self.observation_history_list[agent_type_nr], n_grown
+        )
+        self.observation_head_list[agent_type_nr] = grow_array(
+            self.observation_head_list[agent_type_nr], n_grown
+        )
+        self.observation_cycle_list[agent_type_nr] = grow_array(
+            self.observation_cycle_list[agent_type_nr], n_grown, -1
+        )
+        self.observation_version_list[agent_type_nr] = grow_array(
+            self.observation_version_list[agent_type_nr], n_grown, -1
+        )
+        for slot in range(n_possible, n_grown):
+            agent_instance = self.create_agent_instance(agent_type_nr, slot)
+            agent_instance.is_active = False
+            agent_instance.energy = 0.0
+            # extended in place: the end of cycle loops also visit the new agents
+            agent_name_list.append(agent_instance.agent_name)
+            agent_pool_list.append(agent_instance)
+
+        if agent_type_nr == self.predator_type_nr:
+            self.n_possible_predator = n_grown
+        else:
+            self.n_possible_prey = n_grown
+        self.n_agent_type_list[agent_type_nr] = n_grown
+        self.n_possible_agents = self.n_possible_predator + self.n_possible_prey
+        self.agent_name_list = self.predator_name_list + self.prey_name_list
+        self.agent_pool_list = self.predator_pool_list + self.prey_pool_list
+        self.agent_id_nr_array = np.array(
+            [agent_instance.agent_id_nr for agent_instance in self.agent_pool_list]
+        )
+        self.create_space_lists()
+        if self.n_possible_predator > 18 or self.n_possible_prey > 24:
+            # too many agents to display in energy chart
+            self.show_energy_chart = False
+        return True
+
+    def snapshot(self):
+        # the world after a reset as a dict of numpy arrays (copies), which 'restore'
+        # puts back into an environment with the same constructor arguments
+        agent_instances = sorted(
+            self.agent_name_to_instance_dict.values(),
+            key=lambda agent_instance: agent_instance.agent_id_nr,
         )
-        # wall channel  filled with ones up front
-        observation[0].fill(1.0)
 
-        xlo, xhi, ylo, yhi, xolo, xohi, yolo, yohi = self.obs_clip(xp, yp)
+        def id_array(agent_instance_list):
+            return np.array(
+                [agent_instance.agent_id_nr for agent_instance in agent_instance_list],
+                dtype=np.int64,
+            )
 
-        observation[0 : self.nr_observation_channels, xolo:xohi, yolo:yohi] = np.abs(
-            self.model_state[0 : self.nr_observation_channels, xlo:xhi, ylo:yhi]
+        snapshot = {
+            "counters": np.array(
+                [getattr(self, name) for name in self.snapshot_counter_names],
+                dtype=np.int64,
+            ),
+            "agent_energy": self.agent_energy_array.copy(),
+            "agent_age": self.agent_age_array.copy(),
+            "observation_slot": self.observation_slot_array.copy(),
+            "action_mask": self.action_mask_array.copy(),
+            # per agent_id_nr
+            "agent_type": np.array(
+                [agent_instance.agent_type_nr for agent_instance in agent_instances],
+                dtype=np.int64,
+            ),
+            "agent_position": np.array(
+                [
+                    (agent_instance.position[0], agent_instance.position[1])
+                    for agent_instance in agent_instances
+                ],
+                dtype=np.int64,
+            ).reshape(-1, 2),
+            "agent_is_active": np.array(
+                [agent_instance.is_active for agent_instance in agent_instances],
+                dtype=bool,
+            ),
+            "agent_rewards": self.agent_reward_array.copy(),
+            "n_active_predator_list": np.array(self.n_active_predator_list, dtype=np.int64),
+            "n_active_prey_list": np.array(self.n_active_prey_list, dtype=np.int64),
+            "n_active_grass_list": np.array(self.n_active_grass_list, dtype=np.int64),
+            "predator_age_list": np.array(self.predator_age_list, dtype=np.int64),
+            "prey_age_list": np.array(self.prey_age_list, dtype=np.int64),
+        }
+        if self.chunk_size is None:
+            snapshot["model_state"] = self.model_state.copy()
+        else:
+            (
+                snapshot["model_state_tile_keys"],
+                snapshot["model_state_tiles"],
+            ) = self.model_state.tiles()
+        for agent_type_name in ["predator", "prey", "grass"]:
+            # possible agents and active agents, in list order
+            snapshot[agent_type_name + "_names"] = id_array(
+                getattr(self, agent_type_name + "_pool_list")
+            )
+            snapshot[agent_type_name + "_instances"] = id_array(
+                getattr(self, agent_type_name + "_instance_list")
+            )
+        for flag_array_name in self.cycle_flag_array_names:
+            snapshot[flag_array_name] = getattr(self, flag_array_name).copy()
+        for agent_type_nr in [self.predator_type_nr, self.prey_type_nr]:
+            agent_type_name = self.agent_type_name_list[agent_type_nr]
+            for observation_name, observation_list in [
+                ("observation_history", self.observation_history_list),
+                ("observation_head", self.observation_head_list),
+                ("observation_cycle", self.observation_cycle_list),
+                ("observation_version", self.observation_version_list),
+            ]:
+                snapshot[observation_name + "_" + agent_type_name] = observation_list[
+                    agent_type_nr
+                ].copy()
+        return snapshot
+
+    def restore(self, snapshot):
+        # puts back a world of 'snapshot'; agent instances with the same name are
+        # reused, the others are created
+        for name, value in zip(self.snapshot_counter_names, snapshot["counters"]):
+            setattr(self, name, int(value))
+        self.n_possible_agents = self.n_possible_predator + self.n_possible_prey
+        self.create_agent_type_lists()
+        self.create_space_lists()
+        self.ensure_agent_id_capacity(len(snapshot["agent_energy"]))
+
+        agent_name_to_instance_dict = self.agent_name_to_instance_dict
+        self.agent_name_to_instance_dict = {}
+        agent_id_counter = self.agent_id_counter
+        agent_instances = []
+        for agent_id_nr, (agent_type_nr, position, is_active) in enumerate(
+            zip(
+                snapshot["agent_type"].tolist(),
+                snapshot["agent_position"].tolist(),
+                snapshot["agent_is_active"].tolist(),
+            )
+        ):
+            agent_name = self.agent_type_name_list[agent_type_nr] + "_" + str(agent_id_nr)
+            agent_instance = agent_name_to_instance_dict.get(agent_name)
+            if agent_instance is None:
+                self.agent_id_counter = agent_id_nr
+                agent_instance = self.create_agent_instance(
+                    agent_type_nr, snapshot["observation_slot"][agent_id_nr]
+                )
+            else:
+                self.agent_name_to_instance_dict[agent_name] = agent_instance
+            agent_instance.position = (position[0], position[1])
+            agent_instance.is_active = is_active
+            agent_instances.append(agent_instance)
+        self.agent_id_counter = agent_id_counter
+
+        # after the creation of the agents, which sets their initial energy
+        if self.chunk_size is None:
+            self.model_state[:] = snapshot["model_state"]
+        else:
+            self.model_state.load_tiles(
+                snapshot["model_state_tile_keys"], snapshot["model_state_tiles"]
+            )
+        for array, snapshot_array in [
+            (self.agent_energy_array, snapshot["agent_energy"]),
+            (self.agent_age_array, snapshot["agent_age"]),
+            (self.observation_slot_array, snapshot["observation_slot"]),
+            (self.action_mask_array, snapshot["action_mask"]),
+            (self.agent_reward_array, snapshot["agent_rewards"]),
+        ] + [
+            (getattr(self, flag_array_name), snapshot[flag_array_name])
+            for flag_array_name in self.cycle_flag_array_names
+        ]:
+            array.fill(0)
+            array[: len(snapshot_array)] = snapshot_array
+        # a restored world starts without births
+        self.born_array.fill(False)
+
+        for agent_type_name in ["predator", "prey", "grass"]:
+            agent_pool_list = [
+                agent_instances[agent_id_nr]
+                for agent_id_nr in snapshot[agent_type_name + "_names"].tolist()
+            ]
+            setattr(self, agent_type_name + "_pool_list", agent_pool_list)
+            setattr(
+                self,
+                agent_type_name + "_name_list",
+                [agent_instance.agent_name for agent_instance in agent_pool_list],
+            )
+            setattr(
+                self,
+                agent_type_name + "_instance_list",
+                [
+                    agent_instances[agent_id_nr]
+                    for agent_id_nr in snapshot[agent_type_name + "_instances"].tolist()
+                ],
+            )
+        self.agent_type_instance_list = [
+            [],
+            self.predator_instance_list,
+            self.prey_instance_list,
+            self.grass_instance_list,
+        ]
+        self.agent_instance_list = self.predator_instance_list + self.prey_instance_list
+        self.agent_name_list = self.predator_name_list + self.prey_name_list
+        self.agent_pool_list = self.predator_pool_list + self.prey_pool_list
+        self.agent_id_nr_array = np.array(
+            [agent_instance.agent_id_nr for agent_instance in self.agent_pool_list]
         )
 
+        # grass keeps its grid location when eaten, predators and prey only when active
+        self.agent_instance_in_grid_location[1:] = None
+        for agent_instance in (
+            self.predator_instance_list + self.prey_instance_list + self.grass_pool_list
+        ):
+            self.agent_instance_in_grid_location[
+                agent_instance.agent_type_nr,
+                agent_instance.position[0],
+                agent_instance.position[1],
+            ] = agent_instance
+
+        for list_name in [
+            "n_active_predator_list",
+            "n_active_prey_list",
+            "n_active_grass_list",
+            "predator_age_list",
+            "prey_age_list",
+        ]:
+            setattr(self, list_name, snapshot[list_name].tolist())
+        for agent_type_nr in [self.predator_type_nr, self.prey_type_nr]:
+            agent_type_name = self.agent_type_name_list[agent_type_nr]
+            for observation_name, observation_list in [
+                ("observation_history", self.observation_history_list),
+                ("observation_head", self.observation_head_list),
+                ("observation_cycle", self.observation_cycle_list),
+                ("observation_version", self.observation_version_list),
+            ]:
+                observation_list[agent_type_nr] = snapshot[
+                    observation_name + "_" + agent_type_name
+                ].copy()
+
+    def to_bytes(self):
+        # compact binary serialization without pickle (numpy .npz): the constructor
+        # arguments and, after a reset, the world (see 'snapshot')
+        arrays = {
+            "init_kwargs": np.frombuffer(
+                json.dumps(self.init_kwargs).encode(), dtype=np.uint8
+            )
+        }
+        if self.agent_name_to_instance_dict:
+            for name, array in self.snapshot().items():
+                arrays["world_" + name] = array
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            pred_prey_env = cls(**json.loads(arrays["init_kwargs"].tobytes()))
+            snapshot = {
+                name[len("world_") :]: arrays[name]
+                for name in arrays.files
+                if name.startswith("world_")
+            }
+        if snapshot:
+            pred_prey_env.restore(snapshot)
+        return pred_prey_env
+
+    def observation_slot(self, agent_instance):
+        # index of the agent in the observation tensor of its agent type
+        return self.observation_slot_array[agent_instance.agent_id_nr]
+
+    def reset_observation_history(self, agent_instance):
+        # cheap: the history is only cleared at the next observation of the agent
+        self.observation_cycle_list[agent_instance.agent_type_nr][
+            self.observation_slot(agent_instance)
+        ] = -1
+
+    def observe(self, agent_name):
+        return self.observe_agent(self.agent_name_to_instance_dict[agent_name])
+
+    def observe_agent(self, agent_instance):
+        # returns a view of the last 'observation_history_length' observations
+        # (oldest first) stacked along the channel axis; the view is overwritten by
+        # later observations of the agent, copy it to keep it
+        agent_type_nr = agent_instance.agent_type_nr
+        slot = self.observation_slot(agent_instance)
+        history = self.observation_history_list[agent_type_nr][slot]
+        head_array = self.observation_head_list[agent_type_nr]
+        cycle_array = self.observation_cycle_list[agent_type_nr]
+        version_array = self.observation_version_list[agent_type_nr]
+        history_length = self.observation_history_length
+        head = head_array[slot]
+
+        if cycle_array[slot] != self.n_aec_cycles:
+            if cycle_array[slot] < 0:
+                # new episode, new born or removed agent: empty history
+                history.fill(0.0)
+                head = 0
+            else:
+                # the mirror of the previous frame may hold a later observation of
+                # its cycle (see below): restore the first observation of that cycle
+                history[head + history_length] = history[head]
+                head = (head + 1) % history_length
+            head_array[slot] = head
+            cycle_array[slot] = self.n_aec_cycles
+            version_array[slot] = self.world_version
+            observation = history[head]
+            self.write_observation(observation, agent_instance)
+            history[head + history_length] = observation
+        elif version_array[slot] != self.world_version:
+            # the world changed within the cycle: only refresh the mirrored copy of
+            # the newest frame, which is the last frame of the returned view, so the
+            # history keeps the first observation of every cycle (the parallel
+            # wrapper observes after the cycle and again before each agent steps)
+            version_array[slot] = self.world_version
+            self.write_observation(history[head + history_length], agent_instance)
+
+        stacked_observation = history[head + 1 : head + 1 + history_length]
+        return stacked_observation.reshape(
+            (history_length * self.nr_observation_channels,)
+            + stacked_observation.shape[2:]
+        )
+
+    def write_observation(self, observation, agent_instance):
+        # writes the current observation of agent_instance into 'observation'
+        xp, yp = agent_instance.position[0], agent_instance.position[1]
+
+        if not self.pad_observations:
+            # native per species observation shape, no masked border to compute
+            self.write_observation_window(
+                observation,
+                self.model_state,
+                xp,
+                yp,
+                int((agent_instance.observation_range - 1) / 2),
+                0,
+            )
+            return
+
         observation_range_agent = agent_instance.observation_range
-        max = self.max_observation_range
         # mask is number of 'outer squares' of an observation surface set to zero
-        mask = int((max - observation_range_agent) / 2)
-        if (
-            mask > 0
-        ):  # observation_range agent is smaller than default max_observation_range
-            for j in range(mask):
-                for i in range(self.nr_observation_channels):
-                    observation[i][j, 0:max] = 0
-                    observation[i][max - 1 - j, 0:max] = 0
-                    observation[i][0:max, j] = 0
-                    observation[i][0:max, max - 1 - j] = 0
-            return observation
-        elif mask == 0:
-            return observation
-        else:
+        mask = int((self.max_observation_range - observation_range_agent) / 2)
+        if mask < 0:
             raise Exception(
                 "Error: observation_range_agent larger than max_observation_range"
             )
+        self.write_observation_window(
+            observation, self.model_state, xp, yp, self.max_obs_offset, mask
+        )
 
-    def obs_clip(self, x, y):
-        xld = x - self.max_obs_offset
-        xhd = x + self.max_obs_offset
-        yld = y - self.max_obs_offset
-        yhd = y + self.max_obs_offset
+    def obs_clip(self, x, y, obs_offset=None):
+        if obs_offset is None:
+            obs_offset = self.max_obs_offset
+        xld = x - obs_offset
+        xhd = x + obs_offset
+        yld = y - obs_offset
+        yhd = y + obs_offset
         xlo, xhi, ylo, yhi = (
             np.clip(xld, 0, self.x_grid_size - 1),
             np.clip(xhd, 0, self.x_grid_size - 1),
             np.clip(yld, 0, self.y_grid_size - 1),
             np.clip(yhd, 0, self.y_grid_size - 1),
         )
-        xolo, yolo = abs(np.clip(xld, -self.max_obs_offset, 0)), abs(
-            np.clip(yld, -self.max_obs_offset, 0)
+        xolo, yolo = abs(np.clip(xld, -obs_offset, 0)), abs(
+            np.clip(yld, -obs_offset, 0)
         )
         xohi, yohi = xolo + (xhi - xlo), yolo + (yhi - ylo)
         return xlo, xhi + 1, ylo, yhi + 1, xolo, xohi + 1, yolo, yohi + 1
 
-    def render(self):
-        def draw_grid_model():
-            # Draw grid and borders
-            for x in range(self.x_grid_size):
-                for y in range(self.y_grid_size):
-                    cell_pos = pygame.Rect(
-                        self.cell_scale * x,
-                        self.cell_scale * y,
-                        self.cell_scale,
-                        self.cell_scale,
-                    )
-                    cell_color = (255, 255, 255)
-                    pygame.draw.rect(self.screen, cell_color, cell_pos)
-
-                    border_pos = pygame.Rect(
-                        self.cell_scale * x,
-                        self.cell_scale * y,
-                        self.cell_scale,
-                        self.cell_scale,
-                    )
-                    border_color = (192, 192, 192)
-                    pygame.draw.rect(self.screen, border_color, border_pos, 1)
-
-            # Draw red border around total grid
-            border_pos = pygame.Rect(
-                0,
-                0,
-                self.cell_scale * self.x_grid_size,
-                self.cell_scale * self.y_grid_size,
-            )
-            border_color = (255, 0, 0)
-            pygame.draw.rect(self.screen, border_color, border_pos, 5)
-
-        def draw_predator_observations():
-            for predator_instance in self.predator_instance_list:
-                position = predator_instance.position
-                x = position[0]
-                y = position[1]
-                mask = int(
-                    (self.max_observation_range - predator_instance.observation_range)
-                    / 2
-                )
-                if mask == 0:
-                    patch = pygame.Surface(
-                        (
-                            self.cell_scale * self.max_observation_range,
-                            self.cell_scale * self.max_observation_range,
-                        )
-                    )
-                    patch.set_alpha(128)
-                    patch.fill((255, 152, 72))
-                    ofst = self.max_observation_range / 2.0
-                    self.screen.blit(
-                        patch,
-                        (
-                            self.cell_scale * (x - ofst + 1 / 2),
-                            self.cell_scale * (y - ofst + 1 / 2),
-                        ),
-                    )
-                else:
-                    patch = pygame.Surface(
-                        (
-                            self.cell_scale * predator_instance.observation_range,
-                            self.cell_scale * predator_instance.observation_range,
-                        )
-                    )
-                    patch.set_alpha(128)
-                    patch.fill((255, 152, 72))
-                    ofst = predator_instance.observation_range / 2.0
-                    self.screen.blit(
-                        patch,
-                        (
-                            self.cell_scale * (x - ofst + 1 / 2),
-                            self.cell_scale * (y - ofst + 1 / 2),
-                        ),
-                    )
-
-        def draw_prey_observations():
-            for prey_instance in self.prey_instance_list:
-                position = prey_instance.position
-                x = position[0]
-                y = position[1]
-                # this hopefully can be improved with rllib..
-                mask = int(
-                    (self.max_observation_range - prey_instance.observation_range) / 2
-                )
-                if mask == 0:
-                    patch = pygame.Surface(
-                        (
-                            self.cell_scale * self.max_observation_range,
-                            self.cell_scale * self.max_observation_range,
-                        )
-                    )
-                    patch.set_alpha(128)
-                    patch.fill((72, 152, 255))
-                    ofst = self.max_observation_range / 2.0
-                    self.screen.blit(
-                        patch,
-                        (
-                            self.cell_scale * (x - ofst + 1 / 2),
-                            self.cell_scale * (y - ofst + 1 / 2),
-                        ),
-                    )
-                else:
-                    patch = pygame.Surface(
-                        (
-                            self.cell_scale * prey_instance.observation_range,
-                            self.cell_scale * prey_instance.observation_range,
-                        )
-                    )
-                    patch.set_alpha(128)
-                    patch.fill((72, 152, 255))
-                    ofst = prey_instance.observation_range / 2.0
-                    self.screen.blit(
-                        patch,
-                        (
-                            self.cell_scale * (x - ofst + 1 / 2),
-                            self.cell_scale * (y - ofst + 1 / 2),
-                        ),
-                    )
-
-        def draw_predator_instances():
-            for predator_instance in self.predator_instance_list:
-                position = predator_instance.position
-                x = position[0]
-                y = position[1]
-
-                center = (
-                    int(self.cell_scale * x + self.cell_scale / 2),
-                    int(self.cell_scale * y + self.cell_scale / 2),
+    def draw_grid_model(self):
+        # Draw grid and borders
+        for x in range(self.x_grid_size):
+            for y in range(self.y_grid_size):
+                cell_pos = pygame.Rect(
+                    self.cell_scale * x,
+                    self.cell_scale * y,
+                    self.cell_scale,
+                    self.cell_scale,
                 )
-
-                col = (255, 0, 0)  # red
-
-                pygame.draw.circle(self.screen, col, center, int(self.cell_scale / 2.3))  # type: ignore
-
-        def draw_prey_instances():
-            for prey_instance in self.prey_instance_list:
-                position = prey_instance.position
-                x = position[0]
-                y = position[1]
-
-                center = (
-                    int(self.cell_scale * x + self.cell_scale / 2),
-                    int(self.cell_scale * y + self.cell_scale / 2),
+                cell_color = (255, 255, 255)
+                pygame.draw.rect(self.screen, cell_color, cell_pos)
+
+                border_pos = pygame.Rect(
+                    self.cell_scale * x,
+                    self.cell_scale * y,
+                    self.cell_scale,
+                    self.cell_scale,
                 )
+                border_color = (192, 192, 192)
+                pygame.draw.rect(self.screen, border_color, border_pos, 1)
 
-                col = (0, 0, 255)  # blue
-
-                pygame.draw.circle(self.screen, col, center, int(self.cell_scale / 2.3))  # type: ignore
+        # Draw red border around total grid
+        border_pos = pygame.Rect(
+            0,
+            0,
+            self.cell_scale * self.x_grid_size,
+            self.cell_scale * self.y_grid_size,
+        )
+        border_color = (255, 0, 0)
+        pygame.draw.rect(self.screen, border_color, border_pos, 5)
+
+    # the grid is drawn as items: hashable tuples in drawing order, so that
+    # 'render' can compare two frames item by item and only redraw the
+    # rectangles where items appeared or disappeared
+    def observation_items(self, position_list, observation_range, color):
+        # translucent observation windows centered at 'position_list'
+        mask = int((self.max_observation_range - observation_range) / 2)
+        if mask == 0:
+            observation_range = self.max_observation_range
+        ofst = observation_range / 2.0
+        return [
+            (
+                "observation",
+                self.cell_scale * (x - ofst + 1 / 2),
+                self.cell_scale * (y - ofst + 1 / 2),
+                observation_range,
+                color,
+            )
+            for x, y in position_list
+        ]
 
-        def draw_grass_instances():
-            for grass_instance in self.grass_instance_list:
-                position = grass_instance.position
-                x = position[0]
-                y = position[1]
+    def agent_items(self, position_list, color):
+        return [
+            (
+                "agent",
+                int(self.cell_scale * x + self.cell_scale / 2),
+                int(self.cell_scale * y + self.cell_scale / 2),
+                color,
+            )
+            for x, y in position_list
+        ]
 
-                center = (
-                    int(self.cell_scale * x + self.cell_scale / 2),
-                    int(self.cell_scale * y + self.cell_scale / 2),
+    def id_nr_items(self, position_id_nr_lists):
+        # 'position_id_nr_lists': (position_list, id_nr_list) per agent type
+        items = []
+        for position_list, id_nr_list in position_id_nr_lists:
+            # one label per cell
+            for (x, y), id_nr in dict(zip(position_list, id_nr_list)).items():
+                items.append(
+                    (
+                        "id_nr",
+                        self.cell_scale * x + self.cell_scale // 6,
+                        self.cell_scale * y
+                        + self.cell_scale // 1.2
+                        - self.cell_scale // 2,
+                        str(id_nr),
+                    )
                 )
-                col = (0, 128, 0)  # green
-                pygame.draw.circle(self.screen, col, center, int(self.cell_scale / 2.3))  # type: ignore
-
-        def draw_agent_instance_id_nrs():
-            font = pygame.font.SysFont("Comic Sans MS", self.cell_scale * 2 // 3)
-
-            predator_positions = defaultdict(int)
-            prey_positions = defaultdict(int)
-            grass_positions = defaultdict(int)
-
-            for predator_instance in self.predator_instance_list:
-                prey_position = predator_instance.position
-                x = prey_position[0]
-                y = prey_position[1]
-                predator_positions[(x, y)] = predator_instance.agent_id_nr
-
-            for prey_instance in self.prey_instance_list:
-                prey_position = prey_instance.position
-                x = prey_position[0]
-                y = prey_position[1]
-                prey_positions[(x, y)] = prey_instance.agent_id_nr
-
-            for grass_instance in self.grass_instance_list:
-                grass_position = grass_instance.position
-                x = grass_position[0]
-                y = grass_position[1]
-                grass_positions[(x, y)] = grass_instance.agent_id_nr
-
-            for x, y in predator_positions:
-                (pos_x, pos_y) = (
-                    self.cell_scale * x + self.cell_scale // 6,
-                    self.cell_scale * y + self.cell_scale // 1.2,
+        return items
+
+    def item_surface(self, item):
+        # observation patches and id labels, rendered once
+        surface = self.item_surface_dict.get(item[3:])
+        if surface is None:
+            if item[0] == "observation":
+                _, _, _, observation_range, color = item
+                surface = pygame.Surface(
+                    (
+                        self.cell_scale * observation_range,
+                        self.cell_scale * observation_range,
+                    )
                 )
+                surface.set_alpha(128)
+                surface.fill(color)
+            else:
+                font = pygame.font.SysFont("Comic Sans MS", self.cell_scale * 2 // 3)
+                surface = font.render(item[3], False, (255, 255, 0))
+            self.item_surface_dict[item[3:]] = surface
+        return surface
+
+    def item_rect(self, item):
+        # covers the pixels of the item, with a margin for the rounding of the
+        # float positions
+        if item[0] == "agent":
+            radius = int(self.cell_scale / 2.3)
+            return pygame.Rect(
+                item[1] - radius - 1, item[2] - radius - 1, 2 * radius + 3, 2 * radius + 3
+            )
+        width, height = self.item_surface(item).get_size()
+        return pygame.Rect(int(item[1]) - 1, int(item[2]) - 1, width + 2, height + 2)
 
-                predator_id_nr__text = str(predator_positions[(x, y)])
-
-                predator_text = font.render(predator_id_nr__text, False, (255, 255, 0))
+    def draw_item(self, item):
+        if item[0] == "agent":
+            _, x, y, color = item
+            pygame.draw.circle(self.screen, color, (x, y), int(self.cell_scale / 2.3))  # type: ignore
+        else:
+            self.screen.blit(self.item_surface(item), (item[1], item[2]))
 
-                self.screen.blit(predator_text, (pos_x, pos_y - self.cell_scale // 2))
+    def draw_observations(self, position_list, observation_range, color):
+        for item in self.observation_items(position_list, observation_range, color):
+            self.draw_item(item)
 
-            for x, y in prey_positions:
-                (pos_x, pos_y) = (
-                    self.cell_scale * x + self.cell_scale // 6,
-                    self.cell_scale * y + self.cell_scale // 1.2,
-                )
+    def draw_agents(self, position_list, color):
+        for item in self.agent_items(position_list, color):
+            self.draw_item(item)
 
-                prey_id_nr__text = str(prey_positions[(x, y)])
+    def draw_agent_id_nrs(self, position_id_nr_lists):
+        for item in self.id_nr_items(position_id_nr_lists):
+            self.draw_item(item)
 
-                prey_text = font.render(prey_id_nr__text, False, (255, 255, 0))
+    def draw_energy_chart(
+        self, predator_energy_list, predator_id_nr_list, prey_energy_list, prey_id_nr_list
+    ):
+        # white canvas, relative position of energy chart within pygame window
+        x_position_energy_chart = self.cell_scale * self.x_grid_size
+        y_position_energy_chart = 0  # self.y_pygame_window
+        pos = pygame.Rect(
+            x_position_energy_chart,
+            y_position_energy_chart,
+            self.width_energy_chart,
+            self.height_energy_chart,
+        )
+        color = (255, 255, 255)  # white background
+        pygame.draw.rect(self.screen, color, pos)  # type: ignore
+
+        # Constants
+        BLACK = (0, 0, 0)
+        RED = (255, 0, 0)
+        BLUE = (0, 0, 255)
+
+        # one font for all labels
+        font = pygame.font.Font(None, 30)
+
+        # Create data array predators and prey
+        data_predators = predator_energy_list
+        data_prey = prey_energy_list
+
+        # postion and size parameters energy chart
+        width_energy_chart = self.width_energy_chart  # = 1800
+
+        max_energy_value_chart = 30
+        bar_width = 20
+        offset_bars = 20
+        x_screenposition = 0  # x_axis screen position?
+        y_screenposition = 50
+        y_axis_height = 500
+        x_axis_width = width_energy_chart - 120  # = 1680
+        x_screenposition_prey_bars = 1450
+        title_x = 1400
+        title_y = 20
+
+        # Draw y-axis
+        y_axis_x = (
+            x_screenposition
+            + (width_energy_chart - (bar_width * len(data_predators))) // 2
+            - 10
+        )
+        y_axis_y = y_screenposition  # 50
+        # x-axis
+        x_axis_x = (
+            x_screenposition
+            + (width_energy_chart - (bar_width * len(data_predators))) // 2
+        )
+        x_axis_y = y_screenposition + y_axis_height  # 50 + 500 = 550
+        x_start_prey_bars = x_screenposition_prey_bars + x_screenposition
+        x_start_predator_bars = x_axis_x
+        predator_legend_x = x_start_predator_bars
+        predator_legend_y = y_screenposition + 550
+        prey_legend_x = x_start_prey_bars
+        prey_legend_y = y_screenposition + 550
+        title_font_size = 30
+        predator_legend_font_size = 30
+        prey_legend_font_size = 30
+
+        # Draw chart title
+        chart_title = "Energy levels agents"
+        title_color = BLACK  # black
+        title_font = pygame.font.Font(None, title_font_size)
+        title_text = title_font.render(chart_title, True, title_color)
+        self.screen.blit(title_text, (title_x, title_y))
+        # Draw legend title for predators
+        predator_legend_title = "Predators"
+        predator_legend_color = RED
+        predator_legend_font = pygame.font.Font(None, predator_legend_font_size)
+        predator_legend_text = predator_legend_font.render(
+            predator_legend_title, True, predator_legend_color
+        )
+        self.screen.blit(
+            predator_legend_text, (predator_legend_x, predator_legend_y)
+        )
+        # Draw legend title for prey
+        prey_legend_title = "Prey"
+        prey_legend_color = BLUE
+        prey_legend_font = pygame.font.Font(None, prey_legend_font_size)
+        prey_legend_text = prey_legend_font.render(
+            prey_legend_title, True, prey_legend_color
+        )
+        self.screen.blit(prey_legend_text, (prey_legend_x, prey_legend_y))
 
-                self.screen.blit(prey_text, (pos_x, pos_y - self.cell_scale // 2))
+        # Draw y-axis
+        y_axis_color = BLACK
+        pygame.draw.rect(
+            self.screen, y_axis_color, (y_axis_x, y_axis_y, 5, y_axis_height)
+        )
+        # Draw x-axis
+        x_axis_color = BLACK
+        pygame.draw.rect(
+            self.screen, x_axis_color, (x_axis_x, x_axis_y, x_axis_width, 5)
+        )
 
-            for x, y in grass_positions:
-                (pos_x, pos_y) = (
-                    self.cell_scale * x + self.cell_scale // 6,
-                    self.cell_scale * y + self.cell_scale // 1.2,
-                )
+        # Draw predator bars
+        for i, value in enumerate(data_predators):
+            bar_height = (value / max_energy_value_chart) * y_axis_height
+            bar_x = x_start_predator_bars + i * (bar_width + offset_bars)
+            bar_y = y_screenposition + y_axis_height - bar_height
 
-                grass_id_nr__text = str(grass_positions[(x, y)])
+            color = (255, 0, 0)  # red
 
-                grass_text = font.render(grass_id_nr__text, False, (255, 255, 0))
+            pygame.draw.rect(
+                self.screen, color, (bar_x, bar_y, bar_width, bar_height)
+            )
 
-                self.screen.blit(grass_text, (pos_x, pos_y - self.cell_scale // 2))
+        # Draw tick labels predators on x-axis
+        for i, predator_id_nr in enumerate(predator_id_nr_list):
+            label = str(predator_id_nr)
+            label_x = x_axis_x + i * (bar_width + offset_bars)
+            label_y = x_axis_y + 10
+            label_color = (255, 0, 0)  # red
+            text = font.render(label, True, label_color)
+            self.screen.blit(text, (label_x, label_y))
 
-        def draw_white_canvas_energy_chart():
-            # relative position of energy chart within pygame window
-            x_position_energy_chart = self.cell_scale * self.x_grid_size
-            y_position_energy_chart = 0  # self.y_pygame_window
-            pos = pygame.Rect(
-                x_position_energy_chart,
-                y_position_energy_chart,
-                self.width_energy_chart,
-                self.height_energy_chart,
-            )
-            color = (255, 255, 255)  # white background
-            pygame.draw.rect(self.screen, color, pos)  # type: ignore
-
-        def draw_bar_chart_energy():
-            # Constants
-            BLACK = (0, 0, 0)
-            RED = (255, 0, 0)
-            BLUE = (0, 0, 255)
-
-            # Create data array predators and prey
-            data_predators = [
-                self.agent_name_to_instance_dict[name].energy
-                for name in self.predator_name_list
-            ]
-            data_prey = [
-                self.agent_name_to_instance_dict[name].energy
-                for name in self.prey_name_list
-            ]
+        # Draw prey bars
+        for i, value in enumerate(data_prey):
+            bar_height = (value / max_energy_value_chart) * y_axis_height
+            bar_x = x_start_prey_bars + i * (bar_width + offset_bars)
+            bar_y = y_screenposition + y_axis_height - bar_height
 
-            # postion and size parameters energy chart
-            width_energy_chart = self.width_energy_chart  # = 1800
-
-            max_energy_value_chart = 30
-            bar_width = 20
-            offset_bars = 20
-            x_screenposition = 0  # x_axis screen position?
-            y_screenposition = 50
-            y_axis_height = 500
-            x_axis_width = width_energy_chart - 120  # = 1680
-            x_screenposition_prey_bars = 1450
-            title_x = 1400
-            title_y = 20
-
-            # Draw y-axis
-            y_axis_x = (
-                x_screenposition
-                + (width_energy_chart - (bar_width * len(data_predators))) // 2
-                - 10
-            )
-            y_axis_y = y_screenposition  # 50
-            # x-axis
-            x_axis_x = (
-                x_screenposition
-                + (width_energy_chart - (bar_width * len(data_predators))) // 2
-            )
-            x_axis_y = y_screenposition + y_axis_height  # 50 + 500 = 550
-            x_start_prey_bars = x_screenposition_prey_bars + x_screenposition
-            x_start_predator_bars = x_axis_x
-            predator_legend_x = x_start_predator_bars
-            predator_legend_y = y_screenposition + 550
-            prey_legend_x = x_start_prey_bars
-            prey_legend_y = y_screenposition + 550
-            title_font_size = 30
-            predator_legend_font_size = 30
-            prey_legend_font_size = 30
-
-            # Draw chart title
-            chart_title = "Energy levels agents"
-            title_color = BLACK  # black
-            title_font = pygame.font.Font(None, title_font_size)
-            title_text = title_font.render(chart_title, True, title_color)
-            self.screen.blit(title_text, (title_x, title_y))
-            # Draw legend title for predators
-            predator_legend_title = "Predators"
-            predator_legend_color = RED
-            predator_legend_font = pygame.font.Font(None, predator_legend_font_size)
-            predator_legend_text = predator_legend_font.render(
-                predator_legend_title, True, predator_legend_color
-            )
-            self.screen.blit(
-                predator_legend_text, (predator_legend_x, predator_legend_y)
-            )
-            # Draw legend title for prey
-            prey_legend_title = "Prey"
-            prey_legend_color = BLUE
-            prey_legend_font = pygame.font.Font(None, prey_legend_font_size)
-            prey_legend_text = prey_legend_font.render(
-                prey_legend_title, True, prey_legend_color
-            )
-            self.screen.blit(prey_legend_text, (prey_legend_x, prey_legend_y))
+            color = (0, 0, 255)  # blue
 
-            # Draw y-axis
-            y_axis_color = BLACK
             pygame.draw.rect(
-                self.screen, y_axis_color, (y_axis_x, y_axis_y, 5, y_axis_height)
+                self.screen, color, (bar_x, bar_y, bar_width, bar_height)
             )
-            # Draw x-axis
-            x_axis_color = BLACK
+
+        # Draw tick labels prey on x-axis
+        for i, prey_id_nr in enumerate(prey_id_nr_list):
+            label = str(prey_id_nr)
+            label_x = x_start_prey_bars + i * (bar_width + offset_bars)
+            label_y = x_axis_y + 10
+            label_color = BLUE
+            text = font.render(label, True, label_color)
+            self.screen.blit(text, (label_x, label_y))
+
+        # Draw tick points on y-axis
+        num_ticks = max_energy_value_chart + 1
+        tick_spacing = y_axis_height // (num_ticks - 1)
+        for i in range(num_ticks):
+            tick_x = y_axis_x - 5
+            tick_y = y_screenposition + y_axis_height - i * tick_spacing
+            tick_width = 10
+            tick_height = 2
+            tick_color = (0, 0, 0)  # black
             pygame.draw.rect(
-                self.screen, x_axis_color, (x_axis_x, x_axis_y, x_axis_width, 5)
+                self.screen, tick_color, (tick_x, tick_y, tick_width, tick_height)
             )
 
-            # Draw predator bars
-            for i, value in enumerate(data_predators):
-                bar_height = (value / max_energy_value_chart) * y_axis_height
-                bar_x = x_start_predator_bars + i * (bar_width + offset_bars)
-                bar_y = y_screenposition + y_axis_height - bar_height
-
-                color = (255, 0, 0)  # red
-
-                pygame.draw.rect(
-                    self.screen, color, (bar_x, bar_y, bar_width, bar_height)
-                )
-
-            # Draw tick labels predators on x-axis
-            for i, predator_name in enumerate(self.predator_name_list):
-                predator_instance = self.agent_name_to_instance_dict[predator_name]
-                label = str(predator_instance.agent_id_nr)
-                label_x = x_axis_x + i * (bar_width + offset_bars)
-                label_y = x_axis_y + 10
-                label_color = (255, 0, 0)  # red
-                font = pygame.font.Font(None, 30)
+            # Draw tick labels every 5 ticks
+            if i % 5 == 0:
+                label = str(i)
+                label_x = tick_x - 30
+                label_y = tick_y - 5
+                label_color = (0, 0, 0)  # black
                 text = font.render(label, True, label_color)
                 self.screen.blit(text, (label_x, label_y))
 
-            # Draw prey bars
-            for i, value in enumerate(data_prey):
-                bar_height = (value / max_energy_value_chart) * y_axis_height
-                bar_x = x_start_prey_bars + i * (bar_width + offset_bars)
-                bar_y = y_screenposition + y_axis_height - bar_height
-
-                color = (0, 0, 255)  # blue
-
-                pygame.draw.rect(
-                    self.screen, color, (bar_x, bar_y, bar_width, bar_height)
-                )
-
-            # Draw tick labels prey on x-axis
-            for i, prey_name in enumerate(self.prey_name_list):
-                prey_instance = self.agent_name_to_instance_dict[prey_name]
-                label = str(prey_instance.agent_id_nr)
-                label_x = x_start_prey_bars + i * (bar_width + offset_bars)
-                label_y = x_axis_y + 10
-                label_color = BLUE
-                font = pygame.font.Font(None, 30)
-                text = font.render(label, True, label_color)
-                self.screen.blit(text, (label_x, label_y))
-
-            # Draw tick points on y-axis
-            num_ticks = max_energy_value_chart + 1
-            tick_spacing = y_axis_height // (num_ticks - 1)
-            for i in range(num_ticks):
-                tick_x = y_axis_x - 5
-                tick_y = y_screenposition + y_axis_height - i * tick_spacing
-                tick_width = 10
-                tick_height = 2
-                tick_color = (0, 0, 0)  # black
-                pygame.draw.rect(
-                    self.screen, tick_color, (tick_x, tick_y, tick_width, tick_height)
-                )
+    def render(self):
+        def position_list(agent_instance_list):
+            return [agent_instance.position for agent_instance in agent_instance_list]
 
-                # Draw tick labels every 5 ticks
-                if i % 5 == 0:
-                    label = str(i)
-                    label_x = tick_x - 30
-                    label_y = tick_y - 5
-                    label_color = (0, 0, 0)  # black
-                    font = pygame.font.Font(None, 30)
-                    text = font.render(label, True, label_color)
-                    self.screen.blit(text, (label_x, label_y))
+        def id_nr_list(agent_instance_list):
+            return [agent_instance.agent_id_nr for agent_instance in agent_instance_list]
 
         if self.render_mode is None:
             gymnasium.logger.warn(
                 "You are calling render method without specifying any render mode."
             )
             return
+        if self.render_mode == "rgb_array":
+            # built with NumPy from the model state, without pygame
+            if self.numpy_renderer is None:
+                self.numpy_renderer = NumpyRenderer(self)
+            frame = self.numpy_renderer.render()
+            if self.frame_writer is not None:
+                self.frame_writer.write(frame)
+            return frame
 
         if self.screen is None:
-            if self.render_mode == "human":
-                pygame.display.init()
-                self.screen = pygame.display.set_mode(
-                    (
-                        self.cell_scale * self.x_grid_size + self.width_energy_chart,
-                        self.cell_scale * self.y_grid_size,
-                    )
-                )
-                pygame.display.set_caption("PredPreyGrass - create agents")
-            else:
-                self.screen = pygame.Surface(
-                    (
-                        self.cell_scale * self.x_grid_size,
-                        self.cell_scale * self.y_grid_size,
-                    )
+            self.grid_background = None
+            self.rendered_item_set = set()
+            self.rendered_energy_chart_data = None
+            if not pygame.get_init():
+                # deferred from the construction: only rendering environments need pygame
+                pygame.init()
+            pygame.display.init()
+            self.screen = pygame.display.set_mode(
+                (
+                    self.cell_scale * self.x_grid_size + self.width_energy_chart,
+                    self.cell_scale * self.y_grid_size,
                 )
+            )
+            pygame.display.set_caption("PredPreyGrass - create agents")
+
+        grid_rect = pygame.Rect(
+            0, 0, self.cell_scale * self.x_grid_size, self.cell_scale * self.y_grid_size
+        )
+        item_list = (
+            self.observation_items(
+                position_list(self.prey_instance_list), self.obs_range_prey, (72, 152, 255)
+            )
+            + self.observation_items(
+                position_list(self.predator_instance_list),
+                self.obs_range_predator,
+                (255, 152, 72),
+            )
+            + self.agent_items(position_list(self.grass_instance_list), (0, 128, 0))  # green
+            + self.agent_items(position_list(self.prey_instance_list), (0, 0, 255))  # blue
+            + self.agent_items(position_list(self.predator_instance_list), (255, 0, 0))  # red
+            + self.id_nr_items(
+                [
+                    (position_list(agent_instance_list), id_nr_list(agent_instance_list))
+                    for agent_instance_list in [
+                        self.predator_instance_list,
+                        self.prey_instance_list,
+                        self.grass_instance_list,
+                    ]
+                ]
+            )
+        )
+        item_set = set(item_list)
+        if self.grid_background is None:
+            # the static grid is drawn once, then blitted
+            self.draw_grid_model()
+            self.grid_background = self.screen.subsurface(grid_rect).copy()
+            dirty_rect_list = [grid_rect]
+        else:
+            # only where items appeared or disappeared
+            dirty_rect_list = [
+                self.item_rect(item).clip(grid_rect)
+                for item in item_set.symmetric_difference(self.rendered_item_set)
+            ]
+            if len(dirty_rect_list) > self.max_dirty_rects:
+                dirty_rect_list = [grid_rect]
+        item_rect_list = [self.item_rect(item) for item in item_list]
+        for dirty_rect in dirty_rect_list:
+            # the background and all items over the rectangle, in drawing order;
+            # items never reach beyond the grid (where the energy chart is)
+            self.screen.set_clip(dirty_rect)
+            self.screen.blit(self.grid_background, dirty_rect, dirty_rect)
+            for item_nr in dirty_rect.collidelistall(item_rect_list):
+                self.draw_item(item_list[item_nr])
+        self.screen.set_clip(None)
+        self.rendered_item_set = item_set
 
-        draw_grid_model()
-        draw_prey_observations()
-        draw_predator_observations()
-        draw_grass_instances()
-        draw_prey_instances()
-        draw_predator_instances()
-        draw_agent_instance_id_nrs()
         if self.show_energy_chart:
-            draw_white_canvas_energy_chart()
-            draw_bar_chart_energy()
-
-        observation = pygame.surfarray.pixels3d(self.screen)
-        new_observation = np.copy(observation)
-        del observation
-        if self.render_mode == "human":
-            pygame.event.pump()
-            pygame.display.update()
-            if self.save_image_steps:
-                self.file_name += 1
-                print(str(self.file_name) + ".png saved")
-                directory = "./assets/images/"
-                pygame.image.save(self.screen, directory + str(self.file_name) + ".png")
+            energy_chart_data = (
+                [predator_instance.energy for predator_instance in self.predator_pool_list],
+                id_nr_list(self.predator_pool_list),
+                [prey_instance.energy for prey_instance in self.prey_pool_list],
+                id_nr_list(self.prey_pool_list),
+            )
+            if energy_chart_data != self.rendered_energy_chart_data:
+                self.draw_energy_chart(*energy_chart_data)
+                self.rendered_energy_chart_data = energy_chart_data
+                dirty_rect_list.append(
+                    pygame.Rect(
+                        grid_rect.width,
+                        0,
+                        self.width_energy_chart,
+                        self.screen.get_height(),
+                    )
+                )
 
-        return (
-            np.transpose(new_observation, axes=(1, 0, 2))
-            if self.render_mode == "rgb_array"
-            else None
-        )
+        pygame.event.pump()
+        pygame.display.update(dirty_rect_list)
+        if self.frame_writer is not None:
+            self.frame_writer.write(
+                np.frombuffer(
+                    pygame.image.tobytes(self.screen, "RGB"), dtype=np.uint8
+                ).reshape(self.screen.get_height(), self.screen.get_width(), 3)
+            )
 
 
 class raw_env(AECEnv, EzPickle):
@@ -1398,26 +2173,56 @@ class raw_env(AECEnv, EzPickle):
         EzPickle.__init__(self, *args, **kwargs)
 
         self.render_mode = kwargs.get("render_mode")
-        pygame.init()
         self.closed = False
 
+        # human mode is limited to metadata["render_fps"] unless render_fps is given
         self.pred_prey_env = PredPreyGrass(
-            *args, **kwargs
+            *args, **dict({"render_fps": self.metadata["render_fps"]}, **kwargs)
         )  #  this calls the code from PredPreyGrass
 
         self.agents = self.pred_prey_env.agent_name_list
 
         self.possible_agents = self.agents[:]
-
-
+        self.state_space = self.pred_prey_env.state_space
+
+    def __reduce__(self):
+        # pickled as the compact serialization of the environment (see
+        # 'PredPreyGrass.to_bytes') instead of the constructor arguments
+        return (raw_env.from_bytes, (self.pred_prey_env.to_bytes(),))
+
+    @classmethod
+    def from_bytes(cls, data):
+        # an environment restored from 'to_bytes' continues at the start of an AEC
+        # cycle, with zero rewards
+        env = cls.__new__(cls)
+        env.pred_prey_env = PredPreyGrass.from_bytes(data)
+        EzPickle.__init__(env, **env.pred_prey_env.init_kwargs)
+        env.render_mode = env.pred_prey_env.render_mode
+        env.closed = False
+        env.agents = env.pred_prey_env.agent_name_list
+        env.possible_agents = env.agents[:]
+        env.state_space = env.pred_prey_env.state_space
+        if env.pred_prey_env.agent_name_to_instance_dict:
+            env.start_agent_cycle()
+        return env
+
+    def to_bytes(self):
+        return self.pred_prey_env.to_bytes()
 
     def reset(self, seed=None, options=None):
         if seed is not None:
             self.pred_prey_env._seed(seed=seed)
+        self.pred_prey_env.reset()  # this calls reset from PredPreyGrass
+        self.start_agent_cycle()
+
+    def start_agent_cycle(self):
+        # AEC bookkeeping of the agents of the environment
         self.steps = 0
-        self.agents = self.possible_agents
+        # grown agent pools keep their size over resets, with renumbered agents
+        self.agents = self.pred_prey_env.agent_name_list[:]
 
         self.possible_agents = self.agents[:]
+        self.state_space = self.pred_prey_env.state_space
         self.agent_name_to_index_mapping = dict(
             zip(self.agents, list(range(self.num_agents)))
         )
@@ -1432,10 +2237,44 @@ class raw_env(AECEnv, EzPickle):
         self._cumulative_rewards = dict(zip(self.agents, [(0) for _ in self.agents]))
         self.terminations = dict(zip(self.agents, [False for _ in self.agents]))
         self.truncations = dict(zip(self.agents, [False for _ in self.agents]))
-        self.infos = dict(zip(self.agents, [{} for _ in self.agents]))
+        # the action masks are views on the action mask array of the environment
+        # and follow the environment without reassigning the infos
+        self.infos = self.action_mask_infos()
         self._agent_selector.reinit(self.agents)
         self.agent_selection = self._agent_selector.next()
-        self.pred_prey_env.reset()  # this calls reset from PredPreyGrass
+
+    def action_mask_infos(self):
+        return {
+            agent_name: {"action_mask": self.pred_prey_env.action_mask_array[agent_id_nr]}
+            for agent_name, agent_id_nr in zip(
+                self.agents, self.pred_prey_env.agent_id_nr_array
+            )
+        }
+
+    def add_grown_agents(self):
+        # the agent pools of the environment grew at the end of the cycle: the new
+        # (inactive) agents join from the next cycle on
+        new_agent_name_list = [
+            agent_name
+            for agent_name in self.pred_prey_env.agent_name_list
+            if agent_name not in self.rewards
+        ]
+        self.agents = self.pred_prey_env.agent_name_list[:]
+        self.possible_agents = self.agents[:]
+        self.agent_name_to_index_mapping = dict(
+            zip(self.agents, list(range(self.num_agents)))
+        )
+        self.action_spaces = dict(zip(self.agents, self.pred_prey_env.action_space))  # type: ignore
+        self.observation_spaces = dict(zip(self.agents, self.pred_prey_env.observation_space))  # type: ignore
+        for agent_name in new_agent_name_list:
+            self.rewards[agent_name] = 0
+            self._cumulative_rewards[agent_name] = 0
+            self.terminations[agent_name] = False
+            self.truncations[agent_name] = False
+        # the action mask array may have been reallocated
+        self.infos = self.action_mask_infos()
+        self.state_space = self.pred_prey_env.state_space
+        self._agent_selector.reinit(self.agents)
 
     def close(self):
         if not self.closed:
@@ -1456,35 +2295,50 @@ class raw_env(AECEnv, EzPickle):
         agent = self.agent_selection
         agent_instance = self.pred_prey_env.agent_name_to_instance_dict[agent]
         self.pred_prey_env.step(action, agent_instance, self._agent_selector.is_last())
+        if len(self.pred_prey_env.agent_name_list) > len(self.agents):
+            self.add_grown_agents()
 
-        for k in self.terminations:
-            if self.pred_prey_env.n_aec_cycles >= self.pred_prey_env.max_cycles:
-                self.truncations[k] = True
-            else:
-                self.terminations[k] = (
-                    self.pred_prey_env.is_no_prey or self.pred_prey_env.is_no_predator
-                )
+        # the same for all agents: evaluated once per step
+        if self.pred_prey_env.is_truncated:
+            self.truncations = dict.fromkeys(self.terminations, True)
+        else:
+            self.terminations = dict.fromkeys(
+                self.terminations, self.pred_prey_env.is_terminated
+            )
 
-        for agent_name in self.agents:
-            self.rewards[agent_name] = self.pred_prey_env.agent_reward_dict[agent_name]
+        # string keys only here, at the API
+        self.rewards = dict(
+            zip(
+                self.agents,
+                self.pred_prey_env.agent_reward_array[
+                    self.pred_prey_env.agent_id_nr_array
+                ].tolist(),
+            )
+        )
         self.steps += 1
         self._cumulative_rewards[
             self.agent_selection
         ] = 0  # cannot be left out for proper rewards
         self.agent_selection = self._agent_selector.next()
         self._accumulate_rewards()  # cannot be left out for proper rewards
-        if self.render_mode == "human":
-            self.render()
 
     def observe(self, agent_name):
         agent_instance = self.pred_prey_env.agent_name_to_instance_dict[agent_name]
-        obs = self.pred_prey_env.observe(agent_name)
-        observation = np.swapaxes(obs, 2, 0)  # type: ignore
         # return observation of only zeros if agent is not alive
         if not agent_instance.is_active:
-            observation = np.zeros(observation.shape)
+            return np.zeros(
+                self.observation_spaces[agent_name].shape, dtype=np.float32
+            )
+        obs = self.pred_prey_env.observe(agent_name)
+        # the environment returns a view on its observation tensor; PettingZoo
+        # consumers keep observations (e.g. supersuit's terminal_observation),
+        # so hand out a copy
+        observation = np.swapaxes(obs, 2, 0).copy()  # type: ignore
         return observation
 
+    def state(self):
+        return self.pred_prey_env.state()
+
     def observation_space(self, agent: str):  # must remain
         return self.observation_spaces[agent]
 
@@ -25,6 +25,7 @@ from matplotlib import pyplot as plt
 from matplotlib.ticker import MaxNLocator  # for integer ticks
 
 import os
+from collections import defaultdict
 from statistics import mean, stdev
 from typing import List
 
@@ -34,8 +35,31 @@ from stable_baselines3 import PPO
 
 def eval(env_fn, num_episodes: int = 100, render_mode: str | None = None, **env_kwargs):
     # Evaluate a trained agent vs a random agent
-    raw_env = env_fn.raw_env(render_mode=render_mode, **env_kwargs)
-    model = PPO.load(loaded_policy)
+    if per_species_models:
+        # models trained per species with "train_sb3_vector_ppo_per_species.py"
+        # on native (unpadded) observation shapes
+        raw_env = env_fn.raw_env(
+            render_mode=render_mode, pad_observations=False, **env_kwargs
+        )
+        species_models = {
+            "predator": PPO.load(loaded_policy + "_predator"),
+            "prey": PPO.load(loaded_policy + "_prey"),
+        }
+    else:
+        raw_env = env_fn.raw_env(render_mode=render_mode, **env_kwargs)
+        model = PPO.load(loaded_policy)
+    if record_history:
+        # every cycle of every episode, to inspect afterwards (see "Recorded histories")
+        raw_env.pred_prey_env.record_history(
+            output_directory + "history/",
+            max_records=num_episodes * (raw_env.pred_prey_env.max_cycles + 1),
+        )
+    if record_action_traces:
+        # seeded episodes which "environments/action_trace.py" regenerates
+        raw_env.pred_prey_env.record_action_traces(output_directory + "traces/", seed=0)
+    if record_frames and render_mode is not None:
+        # streamed to the file while the episodes are watched
+        raw_env.pred_prey_env.record_frames(output_directory + "frames.gif")
     cumulative_rewards = {agent: 0 for agent in raw_env.possible_agents}
 
     from pettingzoo.utils import agent_selector  # on top of file gives error unbound(?)
@@ -55,9 +79,12 @@ def eval(env_fn, num_episodes: int = 100, render_mode: str | None = None, **env_
         predator_name_list = raw_env.pred_prey_env.predator_name_list
         prey_name_list = raw_env.pred_prey_env.prey_name_list
         agent_name_list = raw_env.pred_prey_env.agent_name_list
-        cumulative_rewards = {agent: 0 for agent in agent_name_list}
-        cumulative_rewards_predator = {agent: 0 for agent in predator_name_list}
-        cumulative_rewards_prey = {agent: 0 for agent in prey_name_list}
+        # defaultdicts: agents of grown agent pools join during the episode
+        cumulative_rewards = defaultdict(int, {agent: 0 for agent in agent_name_list})
+        cumulative_rewards_predator = defaultdict(
+            int, {agent: 0 for agent in predator_name_list}
+        )
+        cumulative_rewards_prey = defaultdict(int, {agent: 0 for agent in prey_name_list})
         n_aec_cycles = 0
         for agent in raw_env.agent_iter():
             observation, reward, termination, truncation, info = raw_env.last()
@@ -72,6 +99,10 @@ def eval(env_fn, num_episodes: int = 100, render_mode: str | None = None, **env_
                 if raw_env.pred_prey_env.is_no_predator:
                     predator_extinct_at_termination[i] = 1
             else:
+                if per_species_models:
+                    model = species_models[
+                        "predator" if agent in predator_name_list else "prey"
+                    ]
                 action = model.predict(observation, deterministic=False)[0]
             raw_env.step(action)
             if agent_selector.is_last():  # called at end of cycle
@@ -215,6 +246,14 @@ if __name__ == "__main__":
     output_directory = script_directory + "/output/"
     loaded_policy = output_directory + model_file_name
     eval_model_only = True
+    # set to True for models trained with "train_sb3_vector_ppo_per_species.py"
+    per_species_models = False
+    # record the world of every cycle of the evaluation into "output/history/"
+    record_history = False
+    # record a compact action trace of every evaluation episode into "output/traces/"
+    record_action_traces = False
+    # record the frames of the watched episodes into "output/frames.gif"
+    record_frames = False
     watch_grid_model = not eval_model_only
     # save parameters to file
     if eval_model_only:
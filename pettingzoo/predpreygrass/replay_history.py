@@ -0,0 +1,243 @@
+"""
+Replay viewer of a world history recorded with 'PredPreyGrass.record_history'
+(for instance by "evaluate_from_file.py" with record_history = True). The grid
+and the energy chart are drawn by the drawing code of the environment, fed from
+the recorded arrays instead of the agents; below them a chart shows the
+populations of the episode. No model or simulation is needed.
+
+- run: python replay_history.py [history directory], by default
+  "output/history/" next to this file
+- space: play/pause, right/left: one cycle forwards/backwards (while playing:
+  play forwards/backwards), up/down: double/halve the playing speed (cycles per
+  frame), page down/page up: next/previous episode, home/end: first/last cycle
+  of the episode, e: show/hide the energy chart, f: frame rate limit on/off
+- click or drag in the population chart: seek to that cycle
+"""
+import os
+import sys
+from typing import Optional
+
+import numpy as np
+import pygame
+
+from environments.history_recorder import RecordedHistory
+from environments.predpreygrass import PredPreyGrass
+
+
+class ReplayViewer:
+    population_chart_height = 200
+    population_chart_margin = 10
+    population_colors = [(255, 0, 0), (0, 0, 255), (0, 128, 0)]  # predator, prey, grass
+
+    def __init__(self, directory: str, fps: int = 30, cell_scale: Optional[int] = None):
+        self.history = RecordedHistory(directory)
+        if self.history.n_episodes == 0:
+            raise ValueError(f"no recorded episodes in {directory}")
+        init_kwargs = dict(self.history.init_kwargs)
+        init_kwargs["render_mode"] = "human"
+        if cell_scale is not None:
+            init_kwargs["cell_scale"] = cell_scale
+        # only used to draw: never reset or stepped
+        self.pred_prey_env = PredPreyGrass(**init_kwargs)
+        self.fps = fps
+        self.is_fps_limited = True
+        self.show_energy_chart = self.pred_prey_env.show_energy_chart
+
+        pred_prey_env = self.pred_prey_env
+        self.grid_width = pred_prey_env.cell_scale * pred_prey_env.x_grid_size
+        self.grid_height = pred_prey_env.cell_scale * pred_prey_env.y_grid_size
+        pygame.init()
+        self.screen = pygame.display.set_mode(
+            (
+                self.grid_width + pred_prey_env.width_energy_chart,
+                self.grid_height + self.population_chart_height,
+            )
+        )
+        pygame.display.set_caption("PredPreyGrass - replay " + directory)
+        pred_prey_env.screen = self.screen
+        self.font = pygame.font.Font(None, 24)
+        self.clock = pygame.time.Clock()
+
+        # the grid is the same in every frame: drawn once
+        pred_prey_env.draw_grid_model()
+        self.grid_background = self.screen.subsurface(
+            (0, 0, self.grid_width, self.grid_height)
+        ).copy()
+
+        self.episode_nr = 0
+        self.cycle = 0
+        self.is_playing = False
+        # cycles per frame, negative to play backwards
+        self.speed = 1
+        self.population_chart: Optional[pygame.Surface] = None
+        self.seek(0, 0)
+
+    @property
+    def n_cycles(self) -> int:
+        # records of the current episode, the reset included
+        start, end = self.history.episode_records(self.episode_nr)
+        return end - start
+
+    def seek(self, episode_nr: int, cycle: int) -> None:
+        episode_nr = min(max(episode_nr, 0), self.history.n_episodes - 1)
+        if episode_nr != self.episode_nr or self.population_chart is None:
+            self.episode_nr = episode_nr
+            self.population_chart = self.draw_population_chart()
+        self.cycle = min(max(cycle, 0), self.n_cycles - 1)
+
+    def draw_population_chart(self) -> pygame.Surface:
+        # populations of the whole episode, drawn once per episode
+        width, height = self.screen.get_width(), self.population_chart_height
+        margin = self.population_chart_margin
+        chart = pygame.Surface((width, height))
+        chart.fill((255, 255, 255))
+        start, end = self.history.episode_records(self.episode_nr)
+        population = np.asarray(self.history.fields["population"][start:end])
+        max_population = max(int(population.max()), 1)
+        x = margin + np.arange(end - start) * (width - 2 * margin) / max(end - start - 1, 1)
+        for population_nr, color in enumerate(self.population_colors):
+            y = height - margin - population[:, population_nr] * (
+                height - 4 * margin
+            ) / max_population
+            if end - start > 1:
+                pygame.draw.lines(chart, color, False, np.stack([x, y], axis=1).tolist(), 2)
+        pygame.draw.line(chart, (0, 0, 0), (0, 0), (width, 0), 2)
+        return chart
+
+    def chart_cycle(self, x: int) -> int:
+        margin = self.population_chart_margin
+        fraction = (x - margin) / max(self.screen.get_width() - 2 * margin, 1)
+        return int(round(fraction * (self.n_cycles - 1)))
+
+    def draw(self) -> None:
+        pred_prey_env = self.pred_prey_env
+        record = self.history.record(self.history.record_nr(self.episode_nr, self.cycle))
+        model_state = record["model_state"]
+        # cells of the agents per type; the agent ids per cell are not recorded
+        position_lists = {
+            agent_type_nr: np.argwhere(model_state[agent_type_nr] > 0).tolist()
+            for agent_type_nr in [
+                pred_prey_env.predator_type_nr,
+                pred_prey_env.prey_type_nr,
+                pred_prey_env.grass_type_nr,
+            ]
+        }
+
+        self.screen.fill((0, 0, 0))
+        self.screen.blit(self.grid_background, (0, 0))
+        # observation windows at the border stay within the grid
+        self.screen.set_clip((0, 0, self.grid_width, self.grid_height))
+        pred_prey_env.draw_observations(
+            position_lists[pred_prey_env.prey_type_nr],
+            pred_prey_env.obs_range_prey,
+            (72, 152, 255),
+        )
+        pred_prey_env.draw_observations(
+            position_lists[pred_prey_env.predator_type_nr],
+            pred_prey_env.obs_range_predator,
+            (255, 152, 72),
+        )
+        self.screen.set_clip(None)
+        for agent_type_nr, color in [
+            (pred_prey_env.grass_type_nr, (0, 128, 0)),
+            (pred_prey_env.prey_type_nr, (0, 0, 255)),
+            (pred_prey_env.predator_type_nr, (255, 0, 0)),
+        ]:
+            pred_prey_env.draw_agents(position_lists[agent_type_nr], color)
+        if self.show_energy_chart:
+            agent_type = record["agent_type"]
+            predator_id_nrs = np.flatnonzero(agent_type == pred_prey_env.predator_type_nr)
+            prey_id_nrs = np.flatnonzero(agent_type == pred_prey_env.prey_type_nr)
+            pred_prey_env.draw_energy_chart(
+                record["energy"][predator_id_nrs].tolist(),
+                predator_id_nrs.tolist(),
+                record["energy"][prey_id_nrs].tolist(),
+                prey_id_nrs.tolist(),
+            )
+
+        # population chart with the current cycle
+        self.screen.blit(self.population_chart, (0, self.grid_height))
+        margin = self.population_chart_margin
+        x = margin + self.cycle * (self.screen.get_width() - 2 * margin) / max(
+            self.n_cycles - 1, 1
+        )
+        pygame.draw.line(
+            self.screen,
+            (0, 0, 0),
+            (x, self.grid_height),
+            (x, self.grid_height + self.population_chart_height),
+        )
+        n_predator, n_prey, n_grass = record["population"].tolist()
+        text = (
+            f"episode {self.episode_nr + 1}/{self.history.n_episodes}  "
+            f"cycle {self.cycle}/{self.n_cycles - 1}  "
+            f"predators {n_predator}  prey {n_prey}  grass {n_grass}  "
+            f"speed {self.speed}  {self.clock.get_fps():.0f} fps"
+        )
+        self.screen.blit(
+            self.font.render(text, True, (0, 0, 0)),
+            (margin, self.grid_height + margin),
+        )
+        pygame.display.update()
+
+    def handle_event(self, event) -> bool:
+        # False when the viewer is closed
+        if event.type == pygame.QUIT:
+            return False
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_ESCAPE:
+                return False
+            elif event.key == pygame.K_SPACE:
+                self.is_playing = not self.is_playing
+            elif event.key in (pygame.K_RIGHT, pygame.K_LEFT):
+                direction = 1 if event.key == pygame.K_RIGHT else -1
+                if self.is_playing:
+                    self.speed = direction * abs(self.speed)
+                else:
+                    self.seek(self.episode_nr, self.cycle + direction)
+            elif event.key == pygame.K_UP:
+                self.speed *= 2
+            elif event.key == pygame.K_DOWN and abs(self.speed) > 1:
+                self.speed //= 2
+            elif event.key == pygame.K_PAGEDOWN:
+                self.seek(self.episode_nr + 1, 0)
+            elif event.key == pygame.K_PAGEUP:
+                self.seek(self.episode_nr - 1, 0)
+            elif event.key == pygame.K_HOME:
+                self.seek(self.episode_nr, 0)
+            elif event.key == pygame.K_END:
+                self.seek(self.episode_nr, self.n_cycles - 1)
+            elif event.key == pygame.K_e:
+                self.show_energy_chart = (
+                    not self.show_energy_chart and self.pred_prey_env.width_energy_chart > 0
+                )
+            elif event.key == pygame.K_f:
+                self.is_fps_limited = not self.is_fps_limited
+        elif event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEMOTION):
+            x, y = event.pos
+            is_pressed = event.type == pygame.MOUSEBUTTONDOWN or event.buttons[0]
+            if is_pressed and y >= self.grid_height:
+                self.seek(self.episode_nr, self.chart_cycle(x))
+        return True
+
+    def run(self) -> None:
+        is_running = True
+        while is_running:
+            for event in pygame.event.get():
+                is_running = is_running and self.handle_event(event)
+            if self.is_playing:
+                cycle = self.cycle + self.speed
+                if not 0 <= cycle < self.n_cycles:
+                    self.is_playing = False
+                self.seek(self.episode_nr, cycle)
+            self.draw()
+            self.clock.tick(self.fps if self.is_fps_limited else 0)
+        pygame.quit()
+
+
+if __name__ == "__main__":
+    script_directory = os.path.dirname(os.path.abspath(__file__))
+    history_directory = (
+        sys.argv[1] if len(sys.argv) > 1 else script_directory + "/output/history/"
+    )
+    ReplayViewer(history_directory).run()
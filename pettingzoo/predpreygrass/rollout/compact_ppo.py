@@ -0,0 +1,201 @@
+"""
+PPO which skips the dead agent slots of 'PredPreyGrassVecEnv' (see
+'active_rows'). The policy only runs on the rows of living agents, and only their
+transitions are sampled for training. An agent slot whose agent dies ends the
+episode of that agent; a slot which is filled again by a newborn agent starts a
+new one. An agent can die and its slot be filled by a newborn at the end of the
+same cycle, so the row stays active: such rows are reported by 'born_rows' and
+are treated as an episode end of the dead agent, like a done, so the return of
+the death does not bootstrap from the value of the newborn. On a vector
+environment without 'active_rows' the standard collection of PPO is used.
+"""
+from typing import Generator, Optional
+
+import numpy as np
+import torch as th
+from gymnasium import spaces
+from stable_baselines3 import PPO
+from stable_baselines3.common.buffers import RolloutBuffer
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.type_aliases import RolloutBufferSamples
+from stable_baselines3.common.utils import obs_as_tensor
+from stable_baselines3.common.vec_env import VecEnv
+
+from rollout.species_ppo import policy_actions
+
+
+class ActiveRowsRolloutBuffer(RolloutBuffer):
+    """
+    Rollout buffer which also records per step which rows were active. Returns
+    and advantages do not bootstrap from, and minibatches do not contain,
+    inactive rows.
+    """
+
+    def reset(self) -> None:
+        self.active = np.zeros((self.buffer_size, self.n_envs), dtype=bool)
+        super().reset()
+
+    def add(self, *args, active: Optional[np.ndarray] = None, **kwargs) -> None:
+        self.active[self.pos] = True if active is None else active
+        super().add(*args, **kwargs)
+
+    def compute_returns_and_advantage(
+        self,
+        last_values: th.Tensor,
+        dones: np.ndarray,
+        last_active: Optional[np.ndarray] = None,
+    ) -> None:
+        # a row which is inactive at the next step is terminal at this step
+        last_active = np.ones(self.n_envs, dtype=bool) if last_active is None else last_active
+        last_values = last_values.clone().cpu().numpy().flatten()
+
+        last_gae_lam = 0
+        for step in reversed(range(self.buffer_size)):
+            if step == self.buffer_size - 1:
+                next_non_terminal = (1.0 - dones) * last_active
+                next_values = last_values
+            else:
+                next_non_terminal = (1.0 - self.episode_starts[step + 1]) * self.active[
+                    step + 1
+                ]
+                next_values = self.values[step + 1]
+            delta = (
+                self.rewards[step]
+                + self.gamma * next_values * next_non_terminal
+                - self.values[step]
+            )
+            last_gae_lam = (
+                delta + self.gamma * self.gae_lambda * next_non_terminal * last_gae_lam
+            )
+            self.advantages[step] = last_gae_lam * self.active[step]
+        self.returns = self.advantages + self.values
+
+    def get(
+        self, batch_size: Optional[int] = None
+    ) -> Generator[RolloutBufferSamples, None, None]:
+        assert self.full, ""
+        if not self.generator_ready:
+            for tensor in [
+                "observations",
+                "actions",
+                "values",
+                "log_probs",
+                "advantages",
+                "returns",
+                "active",
+            ]:
+                self.__dict__[tensor] = self.swap_and_flatten(self.__dict__[tensor])
+            self.generator_ready = True
+        # only the transitions of active rows, compacted
+        indices = np.random.permutation(np.flatnonzero(self.active))
+        if batch_size is None:
+            batch_size = len(indices)
+
+        start_idx = 0
+        while start_idx < len(indices):
+            yield self._get_samples(indices[start_idx : start_idx + batch_size])
+            start_idx += batch_size
+
+
+class CompactPPO(PPO):
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("rollout_buffer_class", ActiveRowsRolloutBuffer)
+        super().__init__(*args, **kwargs)
+
+    def collect_rollouts(
+        self,
+        env: VecEnv,
+        callback: BaseCallback,
+        rollout_buffer: RolloutBuffer,
+        n_rollout_steps: int,
+    ) -> bool:
+        if not hasattr(env, "active_rows"):
+            return super().collect_rollouts(env, callback, rollout_buffer, n_rollout_steps)
+        assert self._last_obs is not None, "No previous observation was provided"
+        # switch to eval mode (this affects batch norm / dropout)
+        self.policy.set_training_mode(False)
+
+        n_steps = 0
+        n_active_samples = 0
+        rollout_buffer.reset()
+        callback.on_rollout_start()
+        # the env has not been stepped since the last rollout
+        active = env.active_rows()
+
+        while n_steps < n_rollout_steps:
+            active_row_array = np.flatnonzero(active)
+            # dead slots: no inference, their (ignored) action is 0
+            actions = np.zeros(env.num_envs, dtype=np.int64)
+            values = th.zeros(env.num_envs, device=self.device)
+            log_probs = th.zeros(env.num_envs, device=self.device)
+            if len(active_row_array) > 0:
+                row_actions, row_values, row_log_probs = policy_actions(
+                    self, self._last_obs[active_row_array]
+                )
+                actions[active_row_array] = row_actions
+                values[active_row_array] = row_values.flatten()
+                log_probs[active_row_array] = row_log_probs
+
+            new_obs, rewards, dones, infos = env.step(actions)
+            self.num_timesteps += env.num_envs
+            n_active_samples += len(active_row_array)
+
+            # give access to local variables
+            callback.update_locals(locals())
+            if not callback.on_step():
+                return False
+
+            self._update_info_buffer(infos)
+            n_steps += 1
+
+            if isinstance(self.action_space, spaces.Discrete):
+                # reshape in case of discrete action
+                actions = actions.reshape(-1, 1)
+            # handle timeout by bootstraping with value function, living agents only
+            for idx in active_row_array[dones[active_row_array]]:
+                if infos[idx].get("terminal_observation") is not None and infos[
+                    idx
+                ].get("TimeLimit.truncated", False):
+                    terminal_obs = self.policy.obs_to_tensor(
+                        infos[idx]["terminal_observation"]
+                    )[0]
+                    with th.no_grad():
+                        terminal_value = self.policy.predict_values(terminal_obs)[0]
+                    rewards[idx] += self.gamma * terminal_value
+
+            rollout_buffer.add(
+                self._last_obs,
+                actions,
+                rewards,
+                self._last_episode_starts,
+                values,
+                log_probs,
+                active=active,
+            )
+            self._last_obs = new_obs
+            # a slot filled again in the cycle of the death starts a new episode
+            if hasattr(env, "born_rows"):
+                dones = dones | env.born_rows()
+            self._last_episode_starts = dones
+            active = env.active_rows()
+
+        last_values = th.zeros(env.num_envs, device=self.device)
+        active_row_array = np.flatnonzero(active)
+        if len(active_row_array) > 0:
+            with th.no_grad():
+                # compute value for the last timestep
+                last_values[active_row_array] = self.policy.predict_values(
+                    obs_as_tensor(new_obs[active_row_array], self.device)
+                ).flatten()
+        rollout_buffer.compute_returns_and_advantage(
+            last_values=last_values, dones=dones, last_active=active
+        )
+        self.logger.record(
+            "rollout/active_row_fraction",
+            n_active_samples / (n_rollout_steps * env.num_envs),
+        )
+
+        callback.update_locals(locals())
+        callback.on_rollout_end()
+
+        return True
@@ -0,0 +1,120 @@
+"""
+PPO with a pipelined rollout collection on a double buffered vector environment
+('vec_env.double_buffered_vec_env'). As soon as one group of worlds has stepped,
+the policy computes its next actions and the group is stepped again
+asynchronously, while the other group is still stepping. So env stepping and
+policy inference overlap. On any other vector environment the standard
+collection of PPO is used.
+
+The actions of a step are computed while the other group steps, so the two
+groups cannot share the noise resampling of gSDE at a step: 'use_sde' is
+rejected. When a callback aborts the rollout, the aborted step and the steps in
+flight are stored in the rollout buffer, so '_last_obs' and
+'_last_episode_starts' match the environment when it is used again.
+"""
+import numpy as np
+import torch as th
+from stable_baselines3 import PPO
+from stable_baselines3.common.buffers import RolloutBuffer
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.vec_env import VecEnv
+
+from rollout.species_ppo import finish_rollout, policy_actions, store_transition
+from vec_env.double_buffered_vec_env import (
+    PredPreyGrassDoubleBufferedVecEnv,
+    concatenate_step_results,
+)
+
+
+def concatenate_policy_outputs(policy_outputs):
+    # actions, values and log probabilities of the groups, in row order
+    return (
+        np.concatenate([output[0] for output in policy_outputs]),
+        th.cat([output[1] for output in policy_outputs]),
+        th.cat([output[2] for output in policy_outputs]),
+    )
+
+
+class PipelinedPPO(PPO):
+    def _step_group_async(
+        self, env: PredPreyGrassDoubleBufferedVecEnv, group_nr: int, group_obs
+    ):
+        actions, values, log_probs = policy_actions(self, group_obs)
+        env.groups[group_nr].step_async(actions)
+        return actions, values, log_probs
+
+    def collect_rollouts(
+        self,
+        env: VecEnv,
+        callback: BaseCallback,
+        rollout_buffer: RolloutBuffer,
+        n_rollout_steps: int,
+    ) -> bool:
+        if not isinstance(env, PredPreyGrassDoubleBufferedVecEnv):
+            return super().collect_rollouts(env, callback, rollout_buffer, n_rollout_steps)
+        assert self._last_obs is not None, "No previous observation was provided"
+        if self.use_sde:
+            raise ValueError(
+                "use_sde is not supported by the pipelined rollout collection of a "
+                "double buffered vector environment"
+            )
+        # switch to eval mode (this affects batch norm / dropout)
+        self.policy.set_training_mode(False)
+
+        n_steps = 0
+        rollout_buffer.reset()
+        callback.on_rollout_start()
+
+        # policy outputs of the steps in flight per group
+        in_flight = [
+            self._step_group_async(env, group_nr, self._last_obs[rows])
+            for group_nr, rows in enumerate(env.group_rows)
+        ]
+        while n_steps < n_rollout_steps:
+            step_results = []
+            policy_outputs = []
+            for group_nr, group in enumerate(env.groups):
+                step_result = group.step_wait()
+                step_results.append(step_result)
+                policy_outputs.append(in_flight[group_nr])
+                in_flight[group_nr] = None
+                if n_steps + 1 < n_rollout_steps:
+                    # the other group is still stepping during this inference
+                    in_flight[group_nr] = self._step_group_async(
+                        env, group_nr, step_result[0]
+                    )
+            new_obs, rewards, dones, infos = concatenate_step_results(step_results)
+            actions, values, log_probs = concatenate_policy_outputs(policy_outputs)
+
+            self.num_timesteps += env.num_envs
+
+            # give access to local variables
+            callback.update_locals(locals())
+            if not callback.on_step():
+                # store this step and the steps in flight (of all groups or of
+                # none), which leaves the model in step with the env
+                store_transition(
+                    self, actions, values, log_probs, new_obs, rewards, dones, infos
+                )
+                if in_flight[0] is not None:
+                    new_obs, rewards, dones, infos = concatenate_step_results(
+                        [group.step_wait() for group in env.groups]
+                    )
+                    actions, values, log_probs = concatenate_policy_outputs(in_flight)
+                    self.num_timesteps += env.num_envs
+                    store_transition(
+                        self, actions, values, log_probs, new_obs, rewards, dones, infos
+                    )
+                return False
+
+            n_steps += 1
+            store_transition(
+                self, actions, values, log_probs, new_obs, rewards, dones, infos
+            )
+
+        finish_rollout(self, new_obs, dones)
+
+        callback.update_locals(locals())
+        callback.on_rollout_end()
+
+        return True
@@ -0,0 +1,184 @@
+"""
+Trains one stable_baselines3 PPO model per species in lockstep on the
+species vector environments of 'vec_env.species_vec_env'. Every step the
+actions of all species are submitted before any species collects its
+results, so the shared worlds are stepped exactly once per step.
+"""
+import sys
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import torch as th
+from gymnasium import spaces
+from stable_baselines3 import PPO
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.utils import obs_as_tensor, safe_mean
+
+
+def policy_actions(model: PPO, obs: np.ndarray):
+    # actions, values and log probabilities of the current policy for 'obs'
+    with th.no_grad():
+        obs_tensor = obs_as_tensor(obs, model.device)
+        actions, values, log_probs = model.policy(obs_tensor)
+    return actions.cpu().numpy(), values, log_probs
+
+
+def store_transition(
+    model: PPO, actions, values, log_probs, new_obs, rewards, dones, infos
+) -> None:
+    # mirrors the bookkeeping of OnPolicyAlgorithm.collect_rollouts after env.step
+    model._update_info_buffer(infos)
+    if isinstance(model.action_space, spaces.Discrete):
+        # reshape in case of discrete action
+        actions = actions.reshape(-1, 1)
+    # handle timeout by bootstraping with value function
+    for idx, done in enumerate(dones):
+        if (
+            done
+            and infos[idx].get("terminal_observation") is not None
+            and infos[idx].get("TimeLimit.truncated", False)
+        ):
+            terminal_obs = model.policy.obs_to_tensor(
+                infos[idx]["terminal_observation"]
+            )[0]
+            with th.no_grad():
+                terminal_value = model.policy.predict_values(terminal_obs)[0]
+            rewards[idx] += model.gamma * terminal_value
+    model.rollout_buffer.add(
+        model._last_obs,
+        actions,
+        rewards,
+        model._last_episode_starts,
+        values,
+        log_probs,
+    )
+    model._last_obs = new_obs
+    model._last_episode_starts = dones
+
+
+def finish_rollout(model: PPO, new_obs, dones) -> None:
+    with th.no_grad():
+        # compute value for the last timestep
+        values = model.policy.predict_values(obs_as_tensor(new_obs, model.device))
+    model.rollout_buffer.compute_returns_and_advantage(last_values=values, dones=dones)
+
+
+def dump_logs(model: PPO, iteration: int) -> None:
+    # same records as OnPolicyAlgorithm.learn
+    time_elapsed = max(
+        (time.time_ns() - model.start_time) / 1e9, sys.float_info.epsilon
+    )
+    fps = int((model.num_timesteps - model._num_timesteps_at_start) / time_elapsed)
+    model.logger.record("time/iterations", iteration, exclude="tensorboard")
+    if len(model.ep_info_buffer) > 0 and len(model.ep_info_buffer[0]) > 0:
+        model.logger.record(
+            "rollout/ep_rew_mean",
+            safe_mean([ep_info["r"] for ep_info in model.ep_info_buffer]),
+        )
+        model.logger.record(
+            "rollout/ep_len_mean",
+            safe_mean([ep_info["l"] for ep_info in model.ep_info_buffer]),
+        )
+    model.logger.record("time/fps", fps)
+    model.logger.record("time/time_elapsed", int(time_elapsed), exclude="tensorboard")
+    model.logger.record(
+        "time/total_timesteps", model.num_timesteps, exclude="tensorboard"
+    )
+    model.logger.dump(step=model.num_timesteps)
+
+
+def learn_species(
+    models: Dict[str, PPO],
+    total_timesteps: int,
+    callbacks: Optional[Dict[str, BaseCallback]] = None,
+    log_interval: int = 1,
+    progress_bar: bool = False,
+) -> Dict[str, PPO]:
+    """
+    Collects rollouts for all species models in lockstep and trains each model
+    on its own rollout buffer. 'total_timesteps' is the total number of agent
+    steps over all species, divided over the models by their number of rows.
+    """
+    species_name_list = list(models.keys())
+    n_steps = models[species_name_list[0]].n_steps
+    if any(model.n_steps != n_steps for model in models.values()):
+        raise ValueError("all species models must have the same n_steps")
+    callbacks = callbacks or {}
+    n_rows_total = sum(model.env.num_envs for model in models.values())
+
+    species_callbacks = {}
+    species_total_timesteps = {}
+    for species_nr, species_name in enumerate(species_name_list):
+        model = models[species_name]
+        species_total_timesteps[species_name], species_callbacks[
+            species_name
+        ] = model._setup_learn(
+            total_timesteps * model.env.num_envs // n_rows_total,
+            callbacks.get(species_name),
+            True,
+            "PPO_" + species_name,
+            progress_bar and species_nr == 0,
+        )
+        species_callbacks[species_name].on_training_start(locals(), globals())
+
+    iteration = 0
+    while all(
+        models[species_name].num_timesteps < species_total_timesteps[species_name]
+        for species_name in species_name_list
+    ):
+        for species_name in species_name_list:
+            model = models[species_name]
+            # switch to eval mode (this affects batch norm / dropout)
+            model.policy.set_training_mode(False)
+            model.rollout_buffer.reset()
+            species_callbacks[species_name].on_rollout_start()
+
+        continue_training = True
+        for _ in range(n_steps):
+            step_data = {}
+            for species_name in species_name_list:
+                model = models[species_name]
+                actions, values, log_probs = policy_actions(model, model._last_obs)
+                model.env.step_async(actions)
+                step_data[species_name] = (actions, values, log_probs)
+            for species_name in species_name_list:
+                model = models[species_name]
+                new_obs, rewards, dones, infos = model.env.step_wait()
+                model.num_timesteps += model.env.num_envs
+                callback = species_callbacks[species_name]
+                actions, values, log_probs = step_data[species_name]
+                callback.update_locals(
+                    dict(
+                        actions=actions,
+                        new_obs=new_obs,
+                        rewards=rewards,
+                        dones=dones,
+                        infos=infos,
+                    )
+                )
+                if not callback.on_step():
+                    continue_training = False
+                store_transition(
+                    model, actions, values, log_probs, new_obs, rewards, dones, infos
+                )
+            if not continue_training:
+                break
+        if not continue_training:
+            break
+
+        iteration += 1
+        for species_name in species_name_list:
+            model = models[species_name]
+            finish_rollout(model, model._last_obs, model._last_episode_starts)
+            species_callbacks[species_name].on_rollout_end()
+            model._update_current_progress_remaining(
+                model.num_timesteps, species_total_timesteps[species_name]
+            )
+            if log_interval is not None and iteration % log_interval == 0:
+                dump_logs(model, iteration)
+            model.train()
+
+    for species_name in species_name_list:
+        species_callbacks[species_name].on_training_end()
+    return models
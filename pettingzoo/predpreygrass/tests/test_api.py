@@ -0,0 +1,61 @@
+"""
+PettingZoo API test of 'raw_env', including the sampling of actions with the
+action masks of the infos, for the main configurations of the environment, and
+pickling as done at the start of worker processes.
+
+Run from pettingzoo/predpreygrass with 'python -m pytest tests'.
+"""
+import os
+import pickle
+import sys
+
+import numpy as np
+import pytest
+from pettingzoo.test import api_test
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import environments.predpreygrass as predpreygrass
+from config.config_pettingzoo_benchmark_2 import env_kwargs
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        dict(),
+        dict(pad_observations=False),
+        dict(grow_agent_pools=True, max_n_possible_predator=30, max_n_possible_prey=40),
+    ],
+)
+def test_api(kwargs):
+    env = predpreygrass.raw_env(
+        render_mode=None, **dict(env_kwargs, max_cycles=200, **kwargs)
+    )
+    api_test(env, num_cycles=300)
+
+
+def test_action_masks_can_sample_actions():
+    env = predpreygrass.raw_env(render_mode=None, **dict(env_kwargs, max_cycles=50))
+    env.reset(seed=1)
+    for agent in env.agent_iter():
+        _, _, termination, truncation, info = env.last()
+        action_mask = info["action_mask"]
+        action = env.action_space(agent).sample(action_mask)
+        assert action_mask[action] == 1
+        env.step(None if termination or truncation else action)
+    env.close()
+
+
+def test_pickle_with_numpy_arguments():
+    # e.g. a configuration built with numpy
+    env = predpreygrass.raw_env(
+        render_mode=None, **dict(env_kwargs, max_cycles=np.int64(100))
+    )
+    env.reset(seed=2)
+    unpickled_env = pickle.loads(pickle.dumps(env))
+    assert unpickled_env.pred_prey_env.init_kwargs["max_cycles"] == 100
+    np.testing.assert_array_equal(
+        unpickled_env.observe(unpickled_env.agent_selection),
+        env.observe(env.agent_selection),
+    )
+    with pytest.raises(ValueError, match="max_cycles"):
+        predpreygrass.raw_env(render_mode=None, **dict(env_kwargs, max_cycles=object()))
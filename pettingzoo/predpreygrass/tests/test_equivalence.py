@@ -0,0 +1,264 @@
+"""
+Equivalence tests of the faster paths of the environment against the paths
+they replace or mirror: the Numba and NumPy kernels, the memoized
+observations, the native vector environment and the SuperSuit conversion, the
+chunked and the dense world, and the re-simulation of action traces.
+
+Run from pettingzoo/predpreygrass with 'python -m pytest tests'. The Numba
+tests are skipped when numba is not installed.
+"""
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import environments.predpreygrass as predpreygrass
+from config.config_pettingzoo_benchmark_2 import env_kwargs
+from environments import kernels as kernel_module
+from environments.chunked_grid import ChunkedGrid
+from environments.action_trace import ActionTrace, resimulate, world_digest
+from vec_env.predpreygrass_vec_env import PredPreyGrassVecEnv
+
+test_env_kwargs = dict(env_kwargs, max_cycles=300)
+
+kernel_backend_params = [
+    "numpy",
+    pytest.param(
+        "numba",
+        marks=pytest.mark.skipif(
+            kernel_module.numba is None, reason="numba is not installed"
+        ),
+    ),
+]
+
+
+def aec_episode(seed, **kwargs):
+    # observations and rewards of a seeded AEC episode with random actions
+    env = predpreygrass.raw_env(render_mode=None, **dict(test_env_kwargs, **kwargs))
+    env.reset(seed=seed)
+    rng = np.random.default_rng(seed)
+    observation_list, reward_list = [], []
+    for agent in env.agent_iter():
+        observation, reward, termination, truncation, _ = env.last()
+        observation_list.append(observation.copy())
+        reward_list.append(reward)
+        env.step(None if termination or truncation else int(rng.integers(5)))
+    env.close()
+    return observation_list, reward_list
+
+
+def run_cycles(pred_prey_env, n_cycles, seed):
+    # observations of the active agents and rewards per cycle, random actions
+    rng = np.random.default_rng(seed)
+    record_list = []
+    for _ in range(n_cycles):
+        if pred_prey_env.is_terminated or pred_prey_env.is_truncated:
+            break
+        pred_prey_env.step_cycle(rng.integers(0, 5, len(pred_prey_env.agent_pool_list)))
+        observations = [
+            pred_prey_env.observe_agent(agent_instance).copy()
+            for agent_instance in pred_prey_env.agent_pool_list
+            if agent_instance.is_active
+        ]
+        record_list.append(
+            (
+                np.array(observations),
+                pred_prey_env.agent_reward_array[pred_prey_env.agent_id_nr_array].copy(),
+            )
+        )
+    return record_list
+
+
+@pytest.mark.parametrize("kernel_backend", kernel_backend_params)
+def test_move_agent_kernel(kernel_backend):
+    move_agent = kernel_module.kernels(kernel_backend)["move_agent"]
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        occupancy = (rng.random((9, 7)) < 0.4).astype(np.int64)
+        x, y = int(rng.integers(9)), int(rng.integers(7))
+        occupancy[x, y] = 1
+        dx, dy = [(0, 0), (-1, 0), (1, 0), (0, -1), (0, 1)][rng.integers(5)]
+        expected_occupancy = occupancy.copy()
+        expected = kernel_module.move_agent_loops(expected_occupancy, x, y, dx, dy)
+        assert move_agent(occupancy, x, y, dx, dy) == expected
+        np.testing.assert_array_equal(occupancy, expected_occupancy)
+
+
+@pytest.mark.parametrize("kernel_backend", kernel_backend_params)
+def test_write_observation_kernel(kernel_backend):
+    write_observation = kernel_module.kernels(kernel_backend)["write_observation"]
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        # negative cells are ghost agents, observed as their absolute value
+        model_state = rng.integers(-2, 3, (4, 11, 8)).astype(np.float64)
+        observation_size = int(rng.choice([3, 5, 7]))
+        obs_offset = (observation_size - 1) // 2
+        mask = int(rng.integers(obs_offset + 1))
+        x, y = int(rng.integers(11)), int(rng.integers(8))
+        expected = np.full((4, observation_size, observation_size), -1.0)
+        kernel_module.write_observation_loops(
+            expected, model_state, x, y, obs_offset, mask
+        )
+        observation = np.full_like(expected, -1.0)
+        write_observation(observation, model_state, x, y, obs_offset, mask)
+        np.testing.assert_array_equal(observation, expected)
+
+
+@pytest.mark.parametrize("pad_observations", [True, False])
+@pytest.mark.parametrize("kernel_backend", kernel_backend_params)
+def test_kernel_backends_give_same_episode(kernel_backend, pad_observations):
+    expected_observations, expected_rewards = aec_episode(
+        3, kernel_backend="numpy", pad_observations=pad_observations
+    )
+    observations, rewards = aec_episode(
+        3, kernel_backend=kernel_backend, pad_observations=pad_observations
+    )
+    assert rewards == expected_rewards
+    for observation, expected_observation in zip(observations, expected_observations):
+        np.testing.assert_array_equal(observation, expected_observation)
+
+
+@pytest.mark.parametrize("observation_history_length", [1, 3])
+def test_memoized_observations_are_current(observation_history_length):
+    # within a cycle the world changes after every agent: the newest frame of
+    # every observation equals a freshly written one, also when observed again
+    env = predpreygrass.raw_env(
+        render_mode=None,
+        observation_history_length=observation_history_length,
+        **test_env_kwargs,
+    )
+    env.reset(seed=5)
+    pred_prey_env = env.pred_prey_env
+    rng = np.random.default_rng(5)
+    for agent in env.agent_iter(max_iter=3000):
+        _, _, termination, truncation, _ = env.last()
+        for agent_instance in pred_prey_env.agent_pool_list[::3]:
+            if not agent_instance.is_active:
+                continue
+            for _ in range(2):
+                observation = pred_prey_env.observe_agent(agent_instance)
+                newest_frame = observation[-pred_prey_env.nr_observation_channels :]
+                fresh_frame = np.zeros_like(newest_frame)
+                pred_prey_env.write_observation(fresh_frame, agent_instance)
+                np.testing.assert_array_equal(newest_frame, fresh_frame)
+        env.step(None if termination or truncation else int(rng.integers(5)))
+    env.close()
+
+
+def test_vec_env_equals_supersuit_conversion():
+    # unseeded worlds draw from the global random module, in world order in both
+    ss = pytest.importorskip("supersuit")
+    from pettingzoo.utils.conversions import parallel_wrapper_fn
+
+    num_envs = 2
+    parallel_env = parallel_wrapper_fn(predpreygrass.raw_env)(
+        render_mode=None, **test_env_kwargs
+    )
+    # the conversion needs the spaces of a reset environment
+    parallel_env.reset()
+    supersuit_vec_env = ss.concat_vec_envs_v1(
+        ss.pettingzoo_env_to_vec_env_v1(parallel_env),
+        num_envs,
+        num_cpus=0,
+        base_class="stable_baselines3",
+    )
+    vec_env = PredPreyGrassVecEnv(predpreygrass, num_envs=num_envs, **test_env_kwargs)
+    assert vec_env.num_envs == supersuit_vec_env.num_envs
+
+    results = []
+    for current_vec_env in (supersuit_vec_env, vec_env):
+        random.seed(11)
+        rng = np.random.default_rng(11)
+        step_list = [current_vec_env.reset().copy()]
+        for _ in range(200):
+            observations, rewards, dones, _ = current_vec_env.step(
+                rng.integers(0, 5, current_vec_env.num_envs)
+            )
+            step_list.append((observations.copy(), rewards.copy(), dones.copy()))
+        results.append(step_list)
+        current_vec_env.close()
+
+    supersuit_steps, native_steps = results
+    np.testing.assert_array_equal(native_steps[0], supersuit_steps[0])
+    for native_step, supersuit_step in zip(native_steps[1:], supersuit_steps[1:]):
+        for native_array, supersuit_array in zip(native_step, supersuit_step):
+            np.testing.assert_array_equal(native_array, supersuit_array)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 16])
+def test_chunked_world_equals_dense_world(chunk_size):
+    dense_env = predpreygrass.PredPreyGrass(**test_env_kwargs)
+    dense_env._seed(seed=2)
+    dense_env.reset()
+    chunked_env = predpreygrass.PredPreyGrass(chunk_size=chunk_size, **test_env_kwargs)
+    chunked_env._seed(seed=2)
+    chunked_env.reset()
+    # the same initial state, with the model state split into tiles, and the
+    # same draws for the births
+    snapshot = dense_env.snapshot()
+    model_state = snapshot.pop("model_state")
+    chunked_grid = ChunkedGrid(model_state.shape, chunk_size, model_state.dtype)
+    chunked_grid.set_window(slice(None), slice(None), slice(None), model_state)
+    (
+        snapshot["model_state_tile_keys"],
+        snapshot["model_state_tiles"],
+    ) = chunked_grid.tiles()
+    chunked_env.restore(snapshot)
+    dense_env._seed(seed=4)
+    chunked_env._seed(seed=4)
+
+    dense_records = run_cycles(dense_env, 200, seed=4)
+    chunked_records = run_cycles(chunked_env, 200, seed=4)
+    assert len(chunked_records) == len(dense_records)
+    for (chunked_observations, chunked_rewards), (dense_observations, dense_rewards) in zip(
+        chunked_records, dense_records
+    ):
+        np.testing.assert_array_equal(chunked_observations, dense_observations)
+        np.testing.assert_array_equal(chunked_rewards, dense_rewards)
+    n_agent_ids = dense_env.agent_id_counter
+    np.testing.assert_array_equal(
+        chunked_env.agent_energy_array[:n_agent_ids],
+        dense_env.agent_energy_array[:n_agent_ids],
+    )
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        dict(max_cycles=400),
+        dict(
+            max_cycles=300,
+            grow_agent_pools=True,
+            max_n_possible_predator=24,
+            max_n_possible_prey=32,
+        ),
+    ],
+)
+def test_resimulated_traces_equal_recorded_episodes(tmp_path, kwargs):
+    env = predpreygrass.raw_env(render_mode=None, **dict(test_env_kwargs, **kwargs))
+    env.pred_prey_env.record_action_traces(str(tmp_path), seed=7)
+    rng = np.random.default_rng(7)
+    digest_list = []
+    for _ in range(3):
+        env.reset()
+        for agent in env.agent_iter():
+            _, _, termination, truncation, _ = env.last()
+            env.step(None if termination or truncation else int(rng.integers(5)))
+        digest_list.append(world_digest(env.pred_prey_env))
+    env.close()
+
+    trace_paths = sorted(tmp_path.glob("*.npz"))
+    assert len(trace_paths) == 3
+    for trace_path, digest in zip(trace_paths, digest_list):
+        trace = ActionTrace(str(trace_path))
+        assert trace.world_digest == digest
+        assert world_digest(resimulate(trace)) == digest
+
+    # a changed action changes the episode
+    trace = ActionTrace(str(trace_paths[0]))
+    trace.actions = (trace.actions + 1) % 5
+    with pytest.raises(ValueError):
+        resimulate(trace)
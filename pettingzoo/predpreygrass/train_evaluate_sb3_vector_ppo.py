@@ -15,6 +15,7 @@ from config.config_pettingzoo import (
 )
 
 import os
+from collections import defaultdict
 import time
 import sys
 import shutil
@@ -138,9 +139,12 @@ def eval(env_fn, num_episodes: int = 100, render_mode: str | None = None, **env_
         predator_name_list = raw_env.pred_prey_env.predator_name_list
         prey_name_list = raw_env.pred_prey_env.prey_name_list
         agent_name_list = raw_env.pred_prey_env.agent_name_list
-        cumulative_rewards = {agent: 0 for agent in agent_name_list}
-        cumulative_rewards_predator = {agent: 0 for agent in predator_name_list}
-        cumulative_rewards_prey = {agent: 0 for agent in prey_name_list}
+        # defaultdicts: agents of grown agent pools join during the episode
+        cumulative_rewards = defaultdict(int, {agent: 0 for agent in agent_name_list})
+        cumulative_rewards_predator = defaultdict(
+            int, {agent: 0 for agent in predator_name_list}
+        )
+        cumulative_rewards_prey = defaultdict(int, {agent: 0 for agent in prey_name_list})
         n_aec_cycles = 0
         for agent in raw_env.agent_iter():
             observation, reward, termination, truncation, info = raw_env.last()
@@ -19,10 +19,15 @@ import time
 import sys
 import shutil
 
-import supersuit as ss
 from stable_baselines3 import PPO
 from stable_baselines3.ppo import MlpPolicy
-from pettingzoo.utils.conversions import parallel_wrapper_fn
+
+from vec_env.shared_memory_vec_env import PredPreyGrassSharedMemoryVecEnv
+from vec_env.thread_pool_vec_env import PredPreyGrassThreadPoolVecEnv
+from vec_env.predpreygrass_vec_env import sample_world_parameters
+from vec_env.double_buffered_vec_env import PredPreyGrassDoubleBufferedVecEnv
+from rollout.pipelined_ppo import PipelinedPPO
+from rollout.compact_ppo import CompactPPO
 
 from stable_baselines3.common.callbacks import BaseCallback
 from stable_baselines3.common import logger
@@ -44,30 +49,52 @@ class SampleLoggerCallback(BaseCallback):
         return True  # Continue training
  
 def train(env_fn, steps: int = 10_000, seed: int | None = 0, **env_kwargs):
-    parallel_env = parallel_wrapper_fn(env_fn.raw_env)
-
-    # Train a single model to play as each agent in a parallel environment
-    raw_parallel_env = parallel_env(render_mode=None, **env_kwargs)
-    raw_parallel_env.reset(seed=seed)
-
-    print(f"Starting training on {str(raw_parallel_env.metadata['name'])}.")
+    print(f"Starting training on {str(env_fn.raw_env.metadata['name'])}.")
     if parameter_variation:
         print(
             "Tuning " + parameter_variation_parameter_string + ": ",
             env_kwargs[parameter_variation_parameter_string],
         )
-    # create parallel environments by concatenating multiple copies of the base environment
-    #
+    # create a vector environment of multiple copies of the base environment;
+    # every agent slot of every copy is a row of the vector environment
     num_vec_envs_concatenated = 8
-    raw_parallel_env = ss.pettingzoo_env_to_vec_env_v1(raw_parallel_env)
-    raw_parallel_env = ss.concat_vec_envs_v1(
-        raw_parallel_env,
-        num_vec_envs_concatenated,
-        num_cpus=8,
-        base_class="stable_baselines3",
-    )
+    # domain randomization: every copy gets its own sampled parameters
+    world_parameters = None
+    if world_parameter_ranges is not None:
+        world_parameters = sample_world_parameters(
+            world_parameter_ranges, num_vec_envs_concatenated, seed=seed
+        )
+        print("World parameters: ", world_parameters)
+    vec_env_class = {
+        "process": PredPreyGrassSharedMemoryVecEnv,
+        "thread": PredPreyGrassThreadPoolVecEnv,
+    }[vec_env_backend]
+    if pipelined_rollout:
+        # two groups of worlds: one steps while the policy acts for the other
+        raw_parallel_env = PredPreyGrassDoubleBufferedVecEnv(
+            env_fn,
+            num_envs=num_vec_envs_concatenated,
+            num_workers=8,
+            vec_env_class=vec_env_class,
+            world_parameters=world_parameters,
+            initial_state_bank_size=initial_state_bank_size,
+            **env_kwargs,
+        )
+        ppo_class = PipelinedPPO
+    else:
+        raw_parallel_env = vec_env_class(
+            env_fn,
+            num_envs=num_vec_envs_concatenated,
+            num_workers=8,
+            world_parameters=world_parameters,
+            initial_state_bank_size=initial_state_bank_size,
+            **env_kwargs,
+        )
+        # dead agent slots are skipped by inference and training
+        ppo_class = CompactPPO if skip_dead_slots else PPO
+    raw_parallel_env.seed(seed)
 
-    model = PPO(
+    model = ppo_class(
         MlpPolicy,
         raw_parallel_env,
         verbose=0,  # 0 for no output, 1 for info messages, 2 for debug messages, 3 deafult
@@ -94,6 +121,18 @@ if __name__ == "__main__":
     env_fn = predpreygrass
     training_steps = int(training_steps_string)
     parameter_variation = False
+    # overlap env stepping and policy inference (see rollout/pipelined_ppo.py)
+    pipelined_rollout = False
+    # "process": worlds in worker processes, "thread": worlds in a thread pool
+    vec_env_backend = "process"
+    # only living agents consume training samples (see rollout/compact_ppo.py)
+    skip_dead_slots = False
+    # (low, high) per parameter of 'world_parameter_names' in vec_env/predpreygrass_vec_env.py,
+    # e.g. dict(n_initial_active_prey=(8, 16), catch_grass_energy=(2.0, 4.0))
+    world_parameter_ranges = None
+    # initial states in stock per world, so auto-resets only copy a state (see
+    # vec_env/initial_state_bank.py); 0 resets the worlds in place
+    initial_state_bank_size = 0
     parameter_variation_parameter_string = "n_initial_active_prey"
     if parameter_variation:
         parameter_variation_scenarios = [8, 10, 12, 14, 16]
@@ -0,0 +1,386 @@
+"""
+Spatial domain decomposition of one large world over worker processes. The grid
+is split into stripes of columns, one per worker; every worker runs an engine
+with the whole grid (with a 'chunk_size', only the tiles it uses are allocated)
+but owns, places and steps only the agents of its stripe.
+
+Every cycle the workers exchange through shared memory:
+- migrants: agents which moved into a neighbouring stripe are handed over at
+  the end of the cycle, with their energy and age;
+- halos: the outer 'halo_width' columns of every stripe (by default
+  max_obs_offset) are copied into the model state of its neighbours as "ghost"
+  agents, so observations, action masks and blocked moves near a boundary see
+  the agents on the other side. Ghosts have no agent instance and cannot be
+  eaten.
+
+The stripes are stepped concurrently, not in one AEC order, so the dynamics at
+the boundaries differ from a single engine: interactions across a boundary take
+effect one cycle later, and a migrant whose cell was taken in the meantime, or
+for which the receiving pool is full, is bounced back into its old stripe.
+"""
+import importlib
+import inspect
+import random
+from multiprocessing.connection import Connection
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+from vec_env.predpreygrass_vec_env import PredPreyGrassWorlds, world_kwargs
+from vec_env.shared_memory_vec_env import (
+    PredPreyGrassSharedMemoryVecEnv,
+    attach_shared_buffers,
+    serve_worlds,
+)
+
+# sides of a stripe: towards lower x and towards higher x
+LEFT, RIGHT = 0, 1
+# fields of a migrant record
+migrant_field_names = ("agent_type_nr", "x", "y", "energy", "age")
+exchange_buffer_names = ("halo_strips", "migrants", "n_migrants", "accepted", "populations")
+
+
+def stripe_bounds(x_grid_size: int, num_stripes: int) -> np.ndarray:
+    # first column of every stripe and the end of the grid: (almost) equal widths
+    return np.linspace(0, x_grid_size, num_stripes + 1).astype(int)
+
+
+def exchange_buffer_specs(
+    num_stripes: int, n_channels: int, halo_width: int, y_grid_size: int
+) -> Dict[str, Tuple[Tuple[int, ...], Any]]:
+    # buffers between the stripes; the first axis is the stripe which writes them,
+    # except for 'accepted', which the receiving neighbour writes
+    # at most one agent per type and cell of the column next to a boundary
+    max_migrants = 2 * y_grid_size
+    return {
+        # the outer columns of every stripe (agent channels only)
+        "halo_strips": (
+            (num_stripes, 2, n_channels - 1, halo_width, y_grid_size),
+            np.float32,
+        ),
+        "migrants": ((num_stripes, 2, max_migrants, len(migrant_field_names)), np.float64),
+        "n_migrants": ((num_stripes, 2), np.int64),
+        "accepted": ((num_stripes, 2, max_migrants), bool),
+        # active predators, active prey and cycles per stripe
+        "populations": ((num_stripes, 3), np.int64),
+    }
+
+
+class PredPreyGrassStripe(PredPreyGrassWorlds):
+    """
+    The worker side of one stripe: the worlds of one engine, which places its
+    agents in the columns of the stripe. A cycle takes four phases, each
+    started by the main process once all stripes finished the previous one:
+    'step', 'receive' (accept the migrants of the neighbours), 'settle' (hand
+    over or take back the own migrants, publish the outer columns) and
+    'exchange_halos' (write the ghosts, then the observations).
+    """
+
+    def __init__(
+        self,
+        env_fn,
+        stripe_nr: int,
+        stripe_bound_array: np.ndarray,
+        halo_width: int,
+        **env_kwargs,
+    ):
+        self.stripe_nr: int = stripe_nr
+        self.num_stripes: int = len(stripe_bound_array) - 1
+        self.x_lo: int = int(stripe_bound_array[stripe_nr])
+        self.x_hi: int = int(stripe_bound_array[stripe_nr + 1])
+        self.halo_width: int = halo_width
+        super().__init__(env_fn, 1, **dict(env_kwargs, x_region=(self.x_lo, self.x_hi)))
+        self.pred_prey_env = self.pred_prey_env_list[0]
+        # places bounced migrants which cannot go back to their last cell
+        self.rng = random.Random()
+        # own agents which left the stripe in the last cycle, per side
+        self.migrant_instance_list: List[List[Any]] = [[], []]
+        # neighbour per side, None at the edges of the grid
+        self.neighbour_list: List[Optional[int]] = [
+            stripe_nr - 1 if stripe_nr > 0 else None,
+            stripe_nr + 1 if stripe_nr < self.num_stripes - 1 else None,
+        ]
+
+    def attach_buffers(self, buffers: Dict[str, np.ndarray]) -> None:
+        # all buffers: the step buffers are sliced to the stripe here
+        super().attach_buffers(
+            {
+                name: buffer[self.stripe_nr : self.stripe_nr + 1]
+                for name, buffer in buffers.items()
+                if name not in exchange_buffer_names
+            }
+        )
+        self.buf_halo_strips = buffers["halo_strips"]
+        self.buf_migrants = buffers["migrants"]
+        self.buf_n_migrants = buffers["n_migrants"]
+        self.buf_accepted = buffers["accepted"]
+        self.buf_populations = buffers["populations"]
+
+    def reset(self, seeds: List[Optional[int]]) -> None:
+        if seeds[0] is not None:
+            self.pred_prey_env._seed(seed=seeds[0])
+            self.rng.seed(seeds[0])
+        self.pred_prey_env.reset()
+        self.migrant_instance_list = [[], []]
+        self.buf_n_migrants[self.stripe_nr] = 0
+        self.publish()
+
+    def step(self) -> None:
+        pred_prey_env = self.pred_prey_env
+        pred_prey_env.step_cycle(self.buf_actions[0][self.agent_row_list[0]])
+        self.buf_rews[0][self.update_agent_rows(0)] = pred_prey_env.agent_reward_array[
+            pred_prey_env.agent_id_nr_array
+        ]
+        # moves are one cell: migrants are in the column next to the stripe
+        self.migrant_instance_list = [[], []]
+        for agent_instance in (
+            pred_prey_env.predator_instance_list + pred_prey_env.prey_instance_list
+        ):
+            x = agent_instance.position[0]
+            if x < self.x_lo:
+                self.migrant_instance_list[LEFT].append(agent_instance)
+            elif x >= self.x_hi:
+                self.migrant_instance_list[RIGHT].append(agent_instance)
+        for side, migrant_instance_list in enumerate(self.migrant_instance_list):
+            self.buf_n_migrants[self.stripe_nr, side] = len(migrant_instance_list)
+            for migrant_nr, agent_instance in enumerate(migrant_instance_list):
+                self.buf_migrants[self.stripe_nr, side, migrant_nr] = (
+                    agent_instance.agent_type_nr,
+                    agent_instance.position[0],
+                    agent_instance.position[1],
+                    agent_instance.energy,
+                    agent_instance.age,
+                )
+
+    def receive(self) -> None:
+        pred_prey_env = self.pred_prey_env
+        for side, neighbour_nr in enumerate(self.neighbour_list):
+            if neighbour_nr is None:
+                continue
+            # the migrants of the neighbour which crossed towards this stripe
+            neighbour_side = RIGHT if side == LEFT else LEFT
+            n_migrants = self.buf_n_migrants[neighbour_nr, neighbour_side]
+            migrants = self.buf_migrants[neighbour_nr, neighbour_side, :n_migrants]
+            accepted = self.buf_accepted[neighbour_nr, neighbour_side]
+            for migrant_nr, (agent_type_nr, x, y, energy, age) in enumerate(
+                migrants.tolist()
+            ):
+                agent_type_nr, x, y = int(agent_type_nr), int(x), int(y)
+                accepted[migrant_nr] = (
+                    pred_prey_env.model_state[agent_type_nr, x, y] == 0
+                    and pred_prey_env.activate_agent(agent_type_nr, (x, y), energy, int(age))
+                    is not None
+                )
+
+    def settle(self) -> None:
+        pred_prey_env = self.pred_prey_env
+        for side, migrant_instance_list in enumerate(self.migrant_instance_list):
+            accepted = self.buf_accepted[self.stripe_nr, side]
+            x_back = self.x_lo if side == LEFT else self.x_hi - 1
+            for migrant_nr, agent_instance in enumerate(migrant_instance_list):
+                if accepted[migrant_nr]:
+                    pred_prey_env.deactivate_agent(agent_instance)
+                    continue
+                # bounced: back to the last cell in the stripe, when still free
+                agent_type_nr = agent_instance.agent_type_nr
+                position = (x_back, agent_instance.position[1])
+                if pred_prey_env.model_state[agent_type_nr, position[0], position[1]] > 0:
+                    position = pred_prey_env.random_free_cell(agent_type_nr, self.rng)
+                pred_prey_env.relocate_agent(agent_instance, position)
+        self.migrant_instance_list = [[], []]
+        self.publish()
+
+    def publish(self) -> None:
+        # the outer columns of the stripe and its population, for the neighbours
+        # and the main process
+        pred_prey_env = self.pred_prey_env
+        model_state = pred_prey_env.model_state
+        halo_width = self.halo_width
+        self.buf_halo_strips[self.stripe_nr, LEFT] = model_state[
+            1:, self.x_lo : self.x_lo + halo_width, :
+        ]
+        self.buf_halo_strips[self.stripe_nr, RIGHT] = model_state[
+            1:, self.x_hi - halo_width : self.x_hi, :
+        ]
+        self.buf_populations[self.stripe_nr] = (
+            pred_prey_env.n_active_predator,
+            pred_prey_env.n_active_prey,
+            pred_prey_env.n_aec_cycles,
+        )
+
+    def exchange_halos(self) -> None:
+        # the halo columns hold no own agents after 'settle': they are overwritten
+        pred_prey_env = self.pred_prey_env
+        model_state = pred_prey_env.model_state
+        halo_width = self.halo_width
+        if self.neighbour_list[LEFT] is not None:
+            model_state[1:, self.x_lo - halo_width : self.x_lo, :] = self.buf_halo_strips[
+                self.neighbour_list[LEFT], RIGHT
+            ]
+        if self.neighbour_list[RIGHT] is not None:
+            model_state[1:, self.x_hi : self.x_hi + halo_width, :] = self.buf_halo_strips[
+                self.neighbour_list[RIGHT], LEFT
+            ]
+        pred_prey_env.world_version += 1
+        pred_prey_env.update_action_masks()
+        self.write_observations(0)
+
+
+def _stripe_worker(
+    remote: Connection,
+    parent_remote: Connection,
+    env_module_name: str,
+    stripe_nr: int,
+    stripe_bound_array: np.ndarray,
+    halo_width: int,
+    shared_memory_names: Dict[str, str],
+    specs: Dict[str, Tuple[Tuple[int, ...], Any]],
+    env_kwargs: Dict[str, Any],
+) -> None:
+    parent_remote.close()
+    env_fn = importlib.import_module(env_module_name)
+    buffers, shared_memory_list = attach_shared_buffers(shared_memory_names, specs)
+    stripe = PredPreyGrassStripe(
+        env_fn, stripe_nr, stripe_bound_array, halo_width, **env_kwargs
+    )
+    stripe.attach_buffers(buffers)
+    try:
+        serve_worlds(
+            remote,
+            stripe,
+            {
+                "receive": stripe.receive,
+                "settle": stripe.settle,
+                "exchange_halos": stripe.exchange_halos,
+            },
+        )
+    finally:
+        # the numpy views must be released before the shared memory is closed
+        del stripe, buffers
+        for shared_memory_block in shared_memory_list:
+            shared_memory_block.close()
+
+
+class PredPreyGrassDecomposedVecEnv(PredPreyGrassSharedMemoryVecEnv):
+    """
+    One world decomposed into 'num_stripes' stripes of columns, one worker
+    process each. The rows are laid out as for 'num_stripes' worlds (see
+    'PredPreyGrassVecEnv'): the agent pools of 'env_kwargs' (n_possible_*,
+    n_initial_active_*, n_possible_grass) are per stripe, and an agent which
+    migrates leaves its row in the old stripe (a dead slot) for a row in the new
+    one. All rows are done together: when the whole world has no predators or no
+    prey left, or after max_cycles.
+    """
+
+    def __init__(
+        self,
+        env_fn,
+        num_stripes: int = 4,
+        halo_width: Optional[int] = None,
+        start_method: Optional[str] = None,
+        **env_kwargs,
+    ):
+        if "x_region" in env_kwargs:
+            raise ValueError("the stripes set the x_region of their engines")
+        for name in [
+            "world_parameters",
+            "initial_state_bank_size",
+            "initial_state_bank_thread",
+        ]:
+            if name in env_kwargs:
+                raise ValueError(f"{name} is not supported for one decomposed world")
+        engine_arguments = inspect.signature(env_fn.PredPreyGrass).bind(
+            **world_kwargs(env_kwargs)
+        )
+        engine_arguments.apply_defaults()
+        engine_kwargs = engine_arguments.arguments
+        max_obs_offset = int((engine_kwargs["max_observation_range"] - 1) / 2)
+        self.halo_width: int = max_obs_offset if halo_width is None else halo_width
+        if self.halo_width < max_obs_offset:
+            raise ValueError(
+                f"halo_width {self.halo_width} is smaller than max_obs_offset {max_obs_offset}"
+            )
+        self.stripe_bound_array = stripe_bounds(engine_kwargs["x_grid_size"], num_stripes)
+        if np.diff(self.stripe_bound_array).min() < max(self.halo_width, 1):
+            raise ValueError(
+                f"{num_stripes} stripes are narrower than the halo width {self.halo_width}"
+            )
+        self.num_stripes: int = num_stripes
+        self.y_grid_size: int = engine_kwargs["y_grid_size"]
+        self.observation_history_length: int = engine_kwargs["observation_history_length"]
+        self.max_cycles: int = engine_kwargs["max_cycles"]
+        super().__init__(
+            env_fn,
+            num_envs=num_stripes,
+            num_workers=num_stripes,
+            start_method=start_method,
+            **env_kwargs,
+        )
+
+    def allocate_buffers(
+        self, specs: Dict[str, Tuple[Tuple[int, ...], Any]]
+    ) -> Dict[str, np.ndarray]:
+        # channels of one observation: those of the model state
+        n_channels = self.observation_space.shape[-1] // self.observation_history_length
+        return super().allocate_buffers(
+            dict(
+                specs,
+                **exchange_buffer_specs(
+                    self.num_stripes, n_channels, self.halo_width, self.y_grid_size
+                ),
+            )
+        )
+
+    def start_worlds(self, env_fn, env_kwargs: Dict[str, Any]) -> None:
+        # one stripe (world) per worker
+        self.start_workers(
+            _stripe_worker,
+            [slice(stripe_nr, stripe_nr + 1) for stripe_nr in range(self.num_stripes)],
+            [
+                (
+                    env_fn.__name__,
+                    stripe_nr,
+                    self.stripe_bound_array,
+                    self.halo_width,
+                    self.shared_memory_names,
+                    self.buffer_specs,
+                    env_kwargs,
+                )
+                for stripe_nr in range(self.num_stripes)
+            ],
+        )
+
+    def _run_phase(self, cmd: str, data_list: Optional[List[Any]] = None) -> None:
+        # a phase of all stripes; the next phase may read what this one wrote
+        for stripe_nr, remote in enumerate(self.remotes):
+            remote.send((cmd, None if data_list is None else data_list[stripe_nr]))
+        for remote in self.remotes:
+            remote.recv()
+
+    def _reset_worlds(self, seeds: List[Optional[int]]) -> None:
+        self._run_phase("reset", [[seed] for seed in seeds])
+        self._run_phase("exchange_halos")
+        self.buffers["terminated"].fill(False)
+        self.buffers["truncated"].fill(False)
+
+    def _wait_worlds(self) -> None:
+        for remote in self.remotes:
+            remote.recv()
+        self.waiting = False
+        self._run_phase("receive")
+        self._run_phase("settle")
+        # done for the whole world
+        n_active_predator, n_active_prey = self.populations()
+        terminated = n_active_predator == 0 or n_active_prey == 0
+        truncated = self.buffers["populations"][0, 2] >= self.max_cycles
+        self._run_phase("exchange_halos")
+        self.buffers["terminated"].fill(terminated)
+        self.buffers["truncated"].fill(truncated)
+        if terminated or truncated:
+            self.buffers["terminal_observations"][:] = self.buffers["observations"]
+            self._run_phase("reset", [[None] for _ in range(self.num_stripes)])
+            self._run_phase("exchange_halos")
+
+    def populations(self) -> Tuple[int, int]:
+        # active predators and prey of the whole world
+        n_active_predator, n_active_prey, _ = self.buffers["populations"].sum(axis=0)
+        return int(n_active_predator), int(n_active_prey)
@@ -0,0 +1,152 @@
+"""
+Double buffered vector environment: the worlds are split into two groups, each
+with its own (asynchronous) backend. As a plain VecEnv both groups are stepped
+together; 'rollout.pipelined_ppo' steps one group while the policy computes the
+actions of the other group, which hides the env latency behind inference.
+"""
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence, Type
+
+import gymnasium
+from stable_baselines3.common.vec_env import VecEnv
+from stable_baselines3.common.vec_env.base_vec_env import (
+    VecEnvIndices,
+    VecEnvObs,
+    VecEnvStepReturn,
+)
+
+from vec_env.predpreygrass_vec_env import PredPreyGrassVecEnv, shard_world_parameters
+from vec_env.shared_memory_vec_env import PredPreyGrassSharedMemoryVecEnv
+
+
+class PredPreyGrassDoubleBufferedVecEnv(VecEnv):
+    def __init__(
+        self,
+        env_fn,
+        num_envs: int = 8,
+        num_workers: int = 8,
+        vec_env_class: Type[PredPreyGrassVecEnv] = PredPreyGrassSharedMemoryVecEnv,
+        world_parameters: Optional[Dict[str, Sequence]] = None,
+        **env_kwargs,
+    ):
+        if num_envs < 2:
+            raise ValueError("double buffering needs at least two worlds")
+        num_worlds_group_a = num_envs // 2
+        group_world_slices = [
+            slice(0, num_worlds_group_a),
+            slice(num_worlds_group_a, num_envs),
+        ]
+        if vec_env_class is PredPreyGrassVecEnv:
+            # the serial backend steps in step_async: nothing to overlap, but valid
+            group_kwargs = [{}, {}]
+        else:
+            num_workers_group_a = max(num_workers // 2, 1)
+            group_kwargs = [
+                dict(num_workers=num_workers_group_a),
+                dict(num_workers=max(num_workers - num_workers_group_a, 1)),
+            ]
+        self.groups: List[PredPreyGrassVecEnv] = [
+            vec_env_class(
+                env_fn,
+                num_envs=world_slice.stop - world_slice.start,
+                world_parameters=shard_world_parameters(world_parameters, world_slice),
+                **group_kwargs[group_nr],
+                **env_kwargs,
+            )
+            for group_nr, world_slice in enumerate(group_world_slices)
+        ]
+        self.n_agents: int = self.groups[0].n_agents
+        # rows of the groups in the (concatenated) rows of this vector environment
+        self.group_rows: List[slice] = [
+            slice(0, self.groups[0].num_envs),
+            slice(self.groups[0].num_envs, self.groups[0].num_envs + self.groups[1].num_envs),
+        ]
+        super().__init__(
+            self.group_rows[1].stop,
+            self.groups[0].observation_space,
+            self.groups[0].action_space,
+        )
+        self.metadata = self.groups[0].metadata
+
+    def reset(self) -> VecEnvObs:
+        self.groups[0]._seeds = self._seeds[self.group_rows[0]]
+        self.groups[1]._seeds = self._seeds[self.group_rows[1]]
+        observations = np.concatenate([group.reset() for group in self.groups])
+        self._reset_seeds()
+        self._reset_options()
+        return observations
+
+    def step_async(self, actions: np.ndarray) -> None:
+        actions = np.asarray(actions)
+        for group, rows in zip(self.groups, self.group_rows):
+            group.step_async(actions[rows])
+
+    def step_wait(self) -> VecEnvStepReturn:
+        return concatenate_step_results([group.step_wait() for group in self.groups])
+
+    def close(self) -> None:
+        for group in self.groups:
+            group.close()
+
+    def action_masks(self) -> np.ndarray:
+        return np.concatenate([group.action_masks() for group in self.groups])
+
+    def active_rows(self) -> np.ndarray:
+        return np.concatenate([group.active_rows() for group in self.groups])
+
+    def born_rows(self) -> np.ndarray:
+        return np.concatenate([group.born_rows() for group in self.groups])
+
+    def _group_indices(self, indices: VecEnvIndices) -> List[List[int]]:
+        # indices per group, relative to the rows of the group
+        group_indices: List[List[int]] = [[], []]
+        for row in self._get_indices(indices):
+            group_nr = 0 if row < self.group_rows[1].start else 1
+            group_indices[group_nr].append(row - self.group_rows[group_nr].start)
+        return group_indices
+
+    def get_attr(self, attr_name: str, indices: VecEnvIndices = None) -> List[Any]:
+        if attr_name == "action_masks":
+            return [self.action_masks for _ in self._get_indices(indices)]
+        return [
+            value
+            for group, group_indices in zip(self.groups, self._group_indices(indices))
+            if group_indices
+            for value in group.get_attr(attr_name, group_indices)
+        ]
+
+    def set_attr(self, attr_name: str, value: Any, indices: VecEnvIndices = None) -> None:
+        for group, group_indices in zip(self.groups, self._group_indices(indices)):
+            if group_indices:
+                group.set_attr(attr_name, value, group_indices)
+
+    def env_method(
+        self,
+        method_name: str,
+        *method_args,
+        indices: VecEnvIndices = None,
+        **method_kwargs
+    ) -> List[Any]:
+        return [
+            value
+            for group, group_indices in zip(self.groups, self._group_indices(indices))
+            if group_indices
+            for value in group.env_method(
+                method_name, *method_args, indices=group_indices, **method_kwargs
+            )
+        ]
+
+    def env_is_wrapped(
+        self, wrapper_class: Type[gymnasium.Wrapper], indices: VecEnvIndices = None
+    ) -> List[bool]:
+        return [False for _ in self._get_indices(indices)]
+
+
+def concatenate_step_results(step_results: List[VecEnvStepReturn]) -> VecEnvStepReturn:
+    observations, rewards, dones, infos = zip(*step_results)
+    return (
+        np.concatenate(observations),
+        np.concatenate(rewards),
+        np.concatenate(dones),
+        [info for group_infos in infos for info in group_infos],
+    )
@@ -0,0 +1,112 @@
+"""
+Bank of pre-generated initial world states. A reset of a world becomes a copy of
+a ready-made initial state (see 'PredPreyGrass.snapshot' and 'restore') instead
+of placing and initializing all agents at the step where an episode ends. The
+states are generated ahead by a spare engine per world, either in a background
+thread or whenever the owner is idle ('fill_one').
+
+Every world draws its initial states from its own random.Random, so the k-th
+initial state of a seeded world is the same however the generation was timed.
+"""
+import random
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+import numpy as np
+
+
+class InitialStateBank:
+    """
+    Per world a queue of up to 'bank_size' initial states. 'take' pops the next
+    state of a world, or generates it right away when the queue is empty. The
+    spare engines only reset, so the states have the initial agent pool sizes.
+    """
+
+    def __init__(
+        self,
+        pred_prey_env_list: List[Any],
+        bank_size: int,
+        background_thread: bool = True,
+    ):
+        self.bank_size: int = bank_size
+        self.generator_env_list = []
+        for pred_prey_env in pred_prey_env_list:
+            generator_env = type(pred_prey_env)(**pred_prey_env.init_kwargs)
+            for table_name in generator_env.read_only_table_names:
+                setattr(generator_env, table_name, getattr(pred_prey_env, table_name))
+            self.generator_env_list.append(generator_env)
+        num_worlds = len(self.generator_env_list)
+        self.world_random_list: List[random.Random] = [
+            random.Random() for _ in range(num_worlds)
+        ]
+        self.state_queue_list: List[Deque[Dict[str, np.ndarray]]] = [
+            deque() for _ in range(num_worlds)
+        ]
+        # held while a state of the world is generated or taken, which keeps the
+        # states of a world in the order of its random generator
+        self.world_lock_list = [threading.Lock() for _ in range(num_worlds)]
+        self.condition = threading.Condition()
+        self.closed = False
+        self.thread: Optional[threading.Thread] = None
+        if background_thread:
+            self.thread = threading.Thread(
+                target=self._fill_forever,
+                name="predpreygrass_initial_states",
+                daemon=True,
+            )
+            self.thread.start()
+
+    def seed(self, world_nr: int, seed: Optional[int]) -> None:
+        # restarts the initial states of the world from 'seed'
+        with self.world_lock_list[world_nr]:
+            self.world_random_list[world_nr] = random.Random(seed)
+            self.state_queue_list[world_nr].clear()
+        self._notify()
+
+    def take(self, world_nr: int) -> Dict[str, np.ndarray]:
+        with self.world_lock_list[world_nr]:
+            state_queue = self.state_queue_list[world_nr]
+            snapshot = state_queue.popleft() if state_queue else self._generate(world_nr)
+        self._notify()
+        return snapshot
+
+    def fill_one(self) -> bool:
+        # generates one state for the world with the fewest states; False when
+        # the bank is full
+        world_nr = int(np.argmin([len(state_queue) for state_queue in self.state_queue_list]))
+        state_queue = self.state_queue_list[world_nr]
+        if len(state_queue) >= self.bank_size:
+            return False
+        with self.world_lock_list[world_nr]:
+            if len(state_queue) < self.bank_size:
+                state_queue.append(self._generate(world_nr))
+        return True
+
+    def is_full(self) -> bool:
+        return all(
+            len(state_queue) >= self.bank_size for state_queue in self.state_queue_list
+        )
+
+    def _generate(self, world_nr: int) -> Dict[str, np.ndarray]:
+        # the caller holds the lock of the world
+        generator_env = self.generator_env_list[world_nr]
+        generator_env.reset(rng=self.world_random_list[world_nr])
+        return generator_env.snapshot()
+
+    def _notify(self) -> None:
+        with self.condition:
+            self.condition.notify_all()
+
+    def _fill_forever(self) -> None:
+        while not self.closed:
+            if not self.fill_one():
+                with self.condition:
+                    self.condition.wait_for(lambda: self.closed or not self.is_full())
+
+    def close(self) -> None:
+        self.closed = True
+        self._notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
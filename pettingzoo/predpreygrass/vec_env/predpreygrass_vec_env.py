@@ -0,0 +1,568 @@
+"""
+Stable Baselines3 vector environment which maps the agent slots of a number of
+predpreygrass worlds directly to rows. Actions are read from, and observations,
+rewards and dones are written into preallocated arrays, without the PettingZoo
+dictionaries per agent of the supersuit conversion. The row layout (world major,
+agents in 'possible_agents' order) is the same as the one of
+ss.concat_vec_envs_v1(ss.pettingzoo_env_to_vec_env_v1(...)), so trained models
+are interchangeable. 'PredPreyGrassVectorEnv' exposes the same worlds through
+the gymnasium.vector.VectorEnv interface.
+"""
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type, Union
+
+import gymnasium
+from stable_baselines3.common.vec_env import VecEnv
+from stable_baselines3.common.vec_env.base_vec_env import (
+    VecEnvIndices,
+    VecEnvObs,
+    VecEnvStepReturn,
+)
+
+from vec_env.initial_state_bank import InitialStateBank
+
+
+def buffer_specs(
+    num_worlds: int,
+    n_agents: int,
+    observation_space: gymnasium.spaces.Box,
+    action_space: gymnasium.spaces.Discrete,
+) -> Dict[str, Tuple[Tuple[int, ...], Any]]:
+    # shape and dtype of the step buffers of 'num_worlds' worlds; the first axis
+    # is always the world, so a shard of worlds is a slice of every buffer
+    return {
+        "actions": ((num_worlds, n_agents), np.int64),
+        "observations": (
+            (num_worlds, n_agents) + observation_space.shape,
+            observation_space.dtype,
+        ),
+        "terminal_observations": (
+            (num_worlds, n_agents) + observation_space.shape,
+            observation_space.dtype,
+        ),
+        "rewards": ((num_worlds, n_agents), np.float32),
+        "terminated": ((num_worlds,), bool),
+        "truncated": ((num_worlds,), bool),
+        "action_masks": ((num_worlds, n_agents, action_space.n), bool),
+        # agent slots with a living agent; the other rows are dead slots
+        "active": ((num_worlds, n_agents), bool),
+        # rows with an agent which started in the last cycle (see 'born_rows')
+        "born": ((num_worlds, n_agents), bool),
+    }
+
+
+def world_kwargs(env_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    # one observation space for all rows: predator observations are padded
+    return dict(env_kwargs, pad_observations=True, render_mode=None)
+
+
+# parameters which may differ per world (domain randomization): they change
+# neither the spaces nor the number of rows of a world
+world_parameter_names = (
+    "max_cycles",
+    "n_initial_active_predator",
+    "n_initial_active_prey",
+    "energy_gain_per_step_predator",
+    "energy_gain_per_step_prey",
+    "energy_gain_per_step_grass",
+    "initial_energy_predator",
+    "initial_energy_prey",
+    "initial_energy_grass",
+    "regrow_grass",
+    "prey_creation_energy_threshold",
+    "predator_creation_energy_threshold",
+    "create_prey",
+    "create_predator",
+    "step_reward_predator",
+    "step_reward_prey",
+    "step_reward_grass",
+    "catch_reward_prey",
+    "catch_reward_grass",
+    "death_reward_prey",
+    "death_reward_predator",
+    "reproduction_reward_prey",
+    "reproduction_reward_predator",
+    "catch_prey_energy",
+    "catch_grass_energy",
+)
+
+
+def world_kwargs_list(
+    env_kwargs: Dict[str, Any],
+    num_worlds: int,
+    world_parameters: Optional[Dict[str, Sequence]] = None,
+) -> List[Dict[str, Any]]:
+    # kwargs per world: 'world_parameters' maps parameter names to one value per
+    # world, which overrides the value of 'env_kwargs'
+    world_parameters = world_parameters or {}
+    unknown_parameter_names = set(world_parameters) - set(world_parameter_names)
+    if unknown_parameter_names:
+        raise ValueError(
+            f"parameters {sorted(unknown_parameter_names)} cannot differ per world"
+        )
+    world_parameter_arrays = {
+        name: np.asarray(values) for name, values in world_parameters.items()
+    }
+    for name, values in world_parameter_arrays.items():
+        if values.shape != (num_worlds,):
+            raise ValueError(
+                f"'{name}' needs one value per world ({num_worlds}), got shape {values.shape}"
+            )
+    return [
+        dict(
+            world_kwargs(env_kwargs),
+            **{
+                name: values[world_nr].item()
+                for name, values in world_parameter_arrays.items()
+            },
+        )
+        for world_nr in range(num_worlds)
+    ]
+
+
+def shard_world_parameters(
+    world_parameters: Optional[Dict[str, Sequence]], world_slice: slice
+) -> Optional[Dict[str, np.ndarray]]:
+    # the per world parameters of a shard of worlds
+    if world_parameters is None:
+        return None
+    return {
+        name: np.asarray(values)[world_slice] for name, values in world_parameters.items()
+    }
+
+
+def sample_world_parameters(
+    parameter_ranges: Dict[str, Tuple[Any, Any]],
+    num_worlds: int,
+    seed: Optional[int] = None,
+) -> Dict[str, np.ndarray]:
+    # uniformly sampled per world parameters from (low, high) ranges; integer
+    # ranges are sampled as integers, including 'high'
+    rng = np.random.default_rng(seed)
+    world_parameters = {}
+    for name, (low, high) in parameter_ranges.items():
+        if isinstance(low, (int, np.integer)) and isinstance(high, (int, np.integer)):
+            world_parameters[name] = rng.integers(low, high, size=num_worlds, endpoint=True)
+        else:
+            world_parameters[name] = rng.uniform(low, high, size=num_worlds)
+    return world_parameters
+
+
+def world_spaces(
+    env_fn, env_kwargs: Dict[str, Any]
+) -> Tuple[int, gymnasium.spaces.Box, gymnasium.spaces.Discrete]:
+    # number of agent slots and spaces of a world, without resetting it; growing
+    # agent pools need caps, which fix the number of rows per world
+    pred_prey_env = env_fn.PredPreyGrass(**world_kwargs(env_kwargs))
+    if (
+        pred_prey_env.max_n_possible_predator is None
+        or pred_prey_env.max_n_possible_prey is None
+    ):
+        raise ValueError(
+            "growing agent pools need max_n_possible_predator and max_n_possible_prey"
+            " in a vector environment"
+        )
+    return (
+        pred_prey_env.max_n_possible_predator + pred_prey_env.max_n_possible_prey,
+        pred_prey_env.observation_space[0],
+        pred_prey_env.action_space[0],
+    )
+
+
+class PredPreyGrassWorlds:
+    """
+    A shard of predpreygrass worlds which are stepped in a (parallel) cycle and
+    write their results into step buffers. Finished worlds are reset right away;
+    their last observations are kept in 'terminal_observations'. Predators have
+    the first rows of a world and prey the rows from the predator cap on, so the
+    rows of the agents do not move when the agent pools grow; rows beyond the
+    pools are dead slots. With 'initial_state_bank_size' > 0 resets copy initial
+    states from an 'InitialStateBank', filled by a background thread or, without
+    'initial_state_bank_thread', by 'fill_initial_state_bank' when idle.
+    """
+
+    def __init__(
+        self,
+        env_fn,
+        num_worlds: int,
+        world_parameters: Optional[Dict[str, Sequence]] = None,
+        initial_state_bank_size: int = 0,
+        initial_state_bank_thread: bool = True,
+        **env_kwargs,
+    ):
+        self.num_worlds: int = num_worlds
+        self.pred_prey_env_list = [
+            env_fn.PredPreyGrass(**kwargs)
+            for kwargs in world_kwargs_list(env_kwargs, num_worlds, world_parameters)
+        ]
+        self.share_read_only_tables()
+        self.max_n_possible_predator: int = self.pred_prey_env_list[
+            0
+        ].max_n_possible_predator
+        # row of every agent of 'agent_name_list' per world
+        self.agent_row_list: List[np.ndarray] = [
+            self.agent_rows(pred_prey_env) for pred_prey_env in self.pred_prey_env_list
+        ]
+        self.buffers: Dict[str, np.ndarray] = {}
+        self.initial_state_bank: Optional[InitialStateBank] = None
+        if initial_state_bank_size > 0:
+            self.initial_state_bank = InitialStateBank(
+                self.pred_prey_env_list,
+                initial_state_bank_size,
+                background_thread=initial_state_bank_thread,
+            )
+
+    def share_read_only_tables(self) -> None:
+        # all worlds have the same parameters: keep one copy of every read-only
+        # lookup table instead of one per world
+        if not self.pred_prey_env_list:
+            return
+        first_env = self.pred_prey_env_list[0]
+        for table_name in first_env.read_only_table_names:
+            table = getattr(first_env, table_name)
+            for pred_prey_env in self.pred_prey_env_list[1:]:
+                setattr(pred_prey_env, table_name, table)
+
+    def attach_buffers(self, buffers: Dict[str, np.ndarray]) -> None:
+        # buffers of this shard of worlds only; dead slots can only "stay"
+        buffers["action_masks"][..., self.pred_prey_env_list[0].stay_action] = True
+        self.buffers = buffers
+        self.buf_actions = buffers["actions"]
+        self.buf_obs = buffers["observations"]
+        self.buf_terminal_obs = buffers["terminal_observations"]
+        self.buf_rews = buffers["rewards"]
+        self.buf_terminated = buffers["terminated"]
+        self.buf_truncated = buffers["truncated"]
+        self.buf_action_masks = buffers["action_masks"]
+        self.buf_active = buffers["active"]
+        self.buf_born = buffers["born"]
+
+    def agent_rows(self, pred_prey_env) -> np.ndarray:
+        return np.concatenate(
+            [
+                np.arange(pred_prey_env.n_possible_predator),
+                self.max_n_possible_predator + np.arange(pred_prey_env.n_possible_prey),
+            ]
+        )
+
+    def update_agent_rows(self, world_nr: int) -> np.ndarray:
+        pred_prey_env = self.pred_prey_env_list[world_nr]
+        if len(self.agent_row_list[world_nr]) != pred_prey_env.n_possible_agents:
+            # the agent pools have grown
+            self.agent_row_list[world_nr] = self.agent_rows(pred_prey_env)
+        return self.agent_row_list[world_nr]
+
+    def reset(self, seeds: List[Optional[int]]) -> None:
+        for world_nr, pred_prey_env in enumerate(self.pred_prey_env_list):
+            if seeds[world_nr] is not None:
+                pred_prey_env._seed(seed=seeds[world_nr])
+                if self.initial_state_bank is not None:
+                    self.initial_state_bank.seed(world_nr, seeds[world_nr])
+            self.reset_world(world_nr)
+        self.buf_terminated.fill(False)
+        self.buf_truncated.fill(False)
+
+    def reset_world(self, world_nr: int) -> None:
+        pred_prey_env = self.pred_prey_env_list[world_nr]
+        if self.initial_state_bank is None:
+            pred_prey_env.reset()
+        else:
+            n_possible_agents = pred_prey_env.n_possible_agents
+            pred_prey_env.restore(self.initial_state_bank.take(world_nr))
+            if pred_prey_env.n_possible_agents != n_possible_agents:
+                # grown agent pools are back at their initial size: clear the
+                # rows of the agents which are gone
+                self.buf_obs[world_nr] = 0.0
+                self.buf_active[world_nr] = False
+                self.buf_born[world_nr] = False
+                self.buf_action_masks[world_nr] = False
+                self.buf_action_masks[world_nr][:, pred_prey_env.stay_action] = True
+        self.write_observations(world_nr)
+
+    def fill_initial_state_bank(self) -> bool:
+        # generates one initial state when the bank is filled during idle time;
+        # False if there is nothing to do
+        if self.initial_state_bank is None or self.initial_state_bank.thread is not None:
+            return False
+        return self.initial_state_bank.fill_one()
+
+    def step(self) -> None:
+        # steps all worlds with the actions in the actions buffer
+        for world_nr in range(self.num_worlds):
+            self.step_world(world_nr)
+
+    def step_world(self, world_nr: int) -> None:
+        pred_prey_env = self.pred_prey_env_list[world_nr]
+        pred_prey_env.step_cycle(self.buf_actions[world_nr][self.agent_row_list[world_nr]])
+        self.buf_rews[world_nr][
+            self.update_agent_rows(world_nr)
+        ] = pred_prey_env.agent_reward_array[pred_prey_env.agent_id_nr_array]
+        terminated = pred_prey_env.is_terminated
+        truncated = pred_prey_env.is_truncated
+        self.buf_terminated[world_nr] = terminated
+        self.buf_truncated[world_nr] = truncated
+        self.write_observations(world_nr)
+        if terminated or truncated:
+            self.buf_terminal_obs[world_nr] = self.buf_obs[world_nr]
+            self.reset_world(world_nr)
+
+    def write_observations(self, world_nr: int) -> None:
+        pred_prey_env = self.pred_prey_env_list[world_nr]
+        agent_rows = self.update_agent_rows(world_nr)
+        world_obs = self.buf_obs[world_nr]
+        world_active = self.buf_active[world_nr]
+        for agent_instance, row in zip(pred_prey_env.agent_pool_list, agent_rows):
+            is_active = agent_instance.is_active
+            world_active[row] = is_active
+            if is_active:
+                # same (y, x, channel) layout as raw_env.observe
+                world_obs[row] = np.swapaxes(
+                    pred_prey_env.observe_agent(agent_instance), 2, 0
+                )
+            else:
+                world_obs[row] = 0.0
+        self.buf_action_masks[world_nr][agent_rows] = pred_prey_env.action_mask_array[
+            pred_prey_env.agent_id_nr_array
+        ]
+        self.buf_born[world_nr][agent_rows] = pred_prey_env.born_array[
+            pred_prey_env.agent_id_nr_array
+        ]
+
+    def close(self) -> None:
+        if self.initial_state_bank is not None:
+            self.initial_state_bank.close()
+        for pred_prey_env in self.pred_prey_env_list:
+            pred_prey_env.close()
+
+
+class PredPreyGrassVecEnv(VecEnv):
+    """
+    Serial backend: all worlds are stepped in the calling process. 'num_envs' is
+    the number of worlds, the number of rows is num_envs * n_agents, with n_agents
+    the (maximum) number of possible agents of a world. 'world_parameters' gives
+    parameters a value per world (see 'world_parameter_names'), so one vector
+    environment covers a distribution of configurations. With
+    'initial_state_bank_size' > 0 every world keeps that many initial states in
+    stock (see 'PredPreyGrassWorlds').
+    """
+
+    def __init__(
+        self,
+        env_fn,
+        num_envs: int = 8,
+        world_parameters: Optional[Dict[str, Sequence]] = None,
+        initial_state_bank_size: int = 0,
+        initial_state_bank_thread: bool = True,
+        **env_kwargs,
+    ):
+        self.num_worlds: int = num_envs
+        # validated before any world is created
+        world_kwargs_list(env_kwargs, self.num_worlds, world_parameters)
+        self.world_parameters = world_parameters
+        self.initial_state_bank_size = initial_state_bank_size
+        self.initial_state_bank_thread = initial_state_bank_thread
+        self.n_agents, observation_space, action_space = world_spaces(env_fn, env_kwargs)
+        super().__init__(self.num_worlds * self.n_agents, observation_space, action_space)
+        self.metadata = env_fn.raw_env.metadata
+        self.buffers: Dict[str, np.ndarray] = self.allocate_buffers(
+            buffer_specs(
+                self.num_worlds, self.n_agents, self.observation_space, self.action_space
+            )
+        )
+        # views with one row per agent slot
+        self.buf_obs = self.buffers["observations"].reshape(
+            (self.num_envs,) + self.observation_space.shape
+        )
+        self.buf_terminal_obs = self.buffers["terminal_observations"].reshape(
+            (self.num_envs,) + self.observation_space.shape
+        )
+        self.buf_rews = self.buffers["rewards"].reshape(self.num_envs)
+        self.start_worlds(env_fn, env_kwargs)
+
+    # backend: where the worlds live and how they are stepped
+
+    def allocate_buffers(
+        self, specs: Dict[str, Tuple[Tuple[int, ...], Any]]
+    ) -> Dict[str, np.ndarray]:
+        return {name: np.zeros(shape, dtype=dtype) for name, (shape, dtype) in specs.items()}
+
+    def start_worlds(self, env_fn, env_kwargs: Dict[str, Any]) -> None:
+        self.worlds = PredPreyGrassWorlds(
+            env_fn,
+            self.num_worlds,
+            self.world_parameters,
+            self.initial_state_bank_size,
+            self.initial_state_bank_thread,
+            **env_kwargs,
+        )
+        self.worlds.attach_buffers(self.buffers)
+
+    def _reset_worlds(self, seeds: List[Optional[int]]) -> None:
+        self.worlds.reset(seeds)
+
+    def _step_worlds(self) -> None:
+        self.worlds.step()
+
+    def _wait_worlds(self) -> None:
+        # the serial backend has stepped the worlds in _step_worlds already
+        pass
+
+    def _get_world_attr(self, world_nr: int, attr_name: str) -> Any:
+        return getattr(self.worlds.pred_prey_env_list[world_nr], attr_name)
+
+    def _set_world_attr(self, world_nr: int, attr_name: str, value: Any) -> None:
+        setattr(self.worlds.pred_prey_env_list[world_nr], attr_name, value)
+
+    def _call_world_method(
+        self, world_nr: int, method_name: str, method_args, method_kwargs
+    ) -> Any:
+        return getattr(self.worlds.pred_prey_env_list[world_nr], method_name)(
+            *method_args, **method_kwargs
+        )
+
+    def close(self) -> None:
+        self.worlds.close()
+
+    # end backend
+
+    def reset(self) -> VecEnvObs:
+        # one seed per world: the seed of its first row
+        self._reset_worlds(self._seeds[:: self.n_agents])
+        self._reset_seeds()
+        self._reset_options()
+        return self.buf_obs.copy()
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self.buffers["actions"][:] = np.asarray(actions).reshape(
+            self.num_worlds, self.n_agents
+        )
+        self._step_worlds()
+
+    def step_wait(self) -> VecEnvStepReturn:
+        self._wait_worlds()
+        return self._step_results()
+
+    def _step_results(self) -> VecEnvStepReturn:
+        terminated = self.buffers["terminated"]
+        truncated = self.buffers["truncated"]
+        world_dones = terminated | truncated
+        infos: List[Dict[str, Any]] = [{} for _ in range(self.num_envs)]
+        for world_nr in np.flatnonzero(world_dones):
+            for row in range(world_nr * self.n_agents, (world_nr + 1) * self.n_agents):
+                infos[row]["TimeLimit.truncated"] = bool(
+                    truncated[world_nr] and not terminated[world_nr]
+                )
+                infos[row]["terminal_observation"] = self.buf_terminal_obs[row].copy()
+        return (
+            self.buf_obs.copy(),
+            self.buf_rews.copy(),
+            np.repeat(world_dones, self.n_agents),
+            infos,
+        )
+
+    def action_masks(self) -> np.ndarray:
+        # MaskablePPO (sb3_contrib) compatible action masks of all rows
+        return self.buffers["action_masks"].reshape(self.num_envs, -1).copy()
+
+    def active_rows(self) -> np.ndarray:
+        # rows of living agents in the last returned observations; dead slots get
+        # zero observations and rewards and their actions are ignored
+        return self.buffers["active"].reshape(self.num_envs).copy()
+
+    def born_rows(self) -> np.ndarray:
+        # rows whose agent in the last returned observations started in the last
+        # cycle: a new episode of the row, also when the row was active before
+        # (its agent died and the slot was filled again in the same cycle)
+        return self.buffers["born"].reshape(self.num_envs).copy()
+
+    def get_attr(self, attr_name: str, indices: VecEnvIndices = None) -> List[Any]:
+        if attr_name == "render_mode":
+            return [None for _ in self._get_indices(indices)]
+        if attr_name == "action_masks":
+            return [self.action_masks for _ in self._get_indices(indices)]
+        return [
+            self._get_world_attr(row // self.n_agents, attr_name)
+            for row in self._get_indices(indices)
+        ]
+
+    def set_attr(self, attr_name: str, value: Any, indices: VecEnvIndices = None) -> None:
+        for row in self._get_indices(indices):
+            self._set_world_attr(row // self.n_agents, attr_name, value)
+
+    def env_method(
+        self,
+        method_name: str,
+        *method_args,
+        indices: VecEnvIndices = None,
+        **method_kwargs
+    ) -> List[Any]:
+        if method_name == "action_masks":
+            # one row per learning agent instead of one per world
+            action_masks = self.action_masks()
+            return [action_masks[row] for row in self._get_indices(indices)]
+        return [
+            self._call_world_method(
+                row // self.n_agents, method_name, method_args, method_kwargs
+            )
+            for row in self._get_indices(indices)
+        ]
+
+    def env_is_wrapped(
+        self, wrapper_class: Type[gymnasium.Wrapper], indices: VecEnvIndices = None
+    ) -> List[bool]:
+        return [False for _ in self._get_indices(indices)]
+
+
+class PredPreyGrassVectorEnv(gymnasium.vector.VectorEnv):
+    """
+    gymnasium.vector.VectorEnv interface on top of a PredPreyGrassVecEnv (of any
+    backend); finished worlds are reset automatically and their last
+    observations are returned in infos["final_observation"].
+    """
+
+    def __init__(self, vec_env: PredPreyGrassVecEnv):
+        super().__init__(vec_env.num_envs, vec_env.observation_space, vec_env.action_space)
+        self.vec_env = vec_env
+        self.metadata = vec_env.metadata
+
+    def reset_wait(
+        self,
+        seed: Optional[Union[int, List[int]]] = None,
+        options: Optional[dict] = None,
+    ):
+        if isinstance(seed, int):
+            self.vec_env.seed(seed)
+        elif seed is not None:
+            self.vec_env._seeds = list(seed)
+        return self.vec_env.reset(), {}
+
+    def step_async(self, actions) -> None:
+        self.vec_env.step_async(actions)
+
+    def step_wait(self, **kwargs):
+        observations, rewards, dones, step_infos = self.vec_env.step_wait()
+        terminations = np.repeat(self.vec_env.buffers["terminated"], self.vec_env.n_agents)
+        truncations = dones & ~terminations
+        infos: Dict[str, Any] = {}
+        if dones.any():
+            final_observation = np.full(self.num_envs, None, dtype=object)
+            for row in np.flatnonzero(dones):
+                final_observation[row] = step_infos[row]["terminal_observation"]
+            infos["final_observation"] = final_observation
+            infos["_final_observation"] = dones
+        return observations, rewards, terminations, truncations, infos
+
+    def call(self, name: str, *args, **kwargs) -> Tuple[Any, ...]:
+        return tuple(self.vec_env.env_method(name, *args, **kwargs))
+
+    def get_attr(self, name: str) -> Tuple[Any, ...]:
+        return tuple(self.vec_env.get_attr(name))
+
+    def set_attr(self, name: str, values: Union[List[Any], Tuple[Any, ...], Any]) -> None:
+        if not isinstance(values, (list, tuple)):
+            values = [values for _ in range(self.num_envs)]
+        for row, value in enumerate(values):
+            self.vec_env.set_attr(name, value, indices=row)
+
+    def close_extras(self, **kwargs) -> None:
+        self.vec_env.close()
@@ -0,0 +1,268 @@
+"""
+Multiprocess backend of 'PredPreyGrassVecEnv'. Every worker process steps its
+own shard of the worlds; actions, observations, rewards and dones are exchanged
+through multiprocessing.shared_memory buffers, so only small command and ready
+messages pass through the pipes instead of pickled observation arrays.
+"""
+import importlib
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from vec_env.predpreygrass_vec_env import (
+    PredPreyGrassVecEnv,
+    PredPreyGrassWorlds,
+    shard_world_parameters,
+)
+
+
+def attach_shared_buffers(
+    shared_memory_names: Dict[str, str],
+    specs: Dict[str, Tuple[Tuple[int, ...], Any]],
+) -> Tuple[Dict[str, np.ndarray], List[shared_memory.SharedMemory]]:
+    # numpy views on the shared memory blocks created by the main process
+    shared_memory_list = []
+    buffers = {}
+    for name, (shape, dtype) in specs.items():
+        shared_memory_block = shared_memory.SharedMemory(name=shared_memory_names[name])
+        shared_memory_list.append(shared_memory_block)
+        buffers[name] = np.ndarray(shape, dtype=dtype, buffer=shared_memory_block.buf)
+    return buffers, shared_memory_list
+
+
+def _worker(
+    remote: Connection,
+    parent_remote: Connection,
+    env_module_name: str,
+    world_slice: slice,
+    shared_memory_names: Dict[str, str],
+    specs: Dict[str, Tuple[Tuple[int, ...], Any]],
+    world_parameters: Optional[Dict[str, np.ndarray]],
+    initial_state_bank_size: int,
+    initial_state_bank_thread: bool,
+    env_kwargs: Dict[str, Any],
+) -> None:
+    parent_remote.close()
+    env_fn = importlib.import_module(env_module_name)
+    buffers, shared_memory_list = attach_shared_buffers(shared_memory_names, specs)
+    worlds = PredPreyGrassWorlds(
+        env_fn,
+        world_slice.stop - world_slice.start,
+        world_parameters,
+        initial_state_bank_size,
+        initial_state_bank_thread,
+        **env_kwargs,
+    )
+    # the first axis of every buffer is the world
+    worlds.attach_buffers({name: buffer[world_slice] for name, buffer in buffers.items()})
+    try:
+        serve_worlds(remote, worlds)
+    finally:
+        # the numpy views must be released before the shared memory is closed
+        del worlds, buffers
+        for shared_memory_block in shared_memory_list:
+            shared_memory_block.close()
+
+
+def serve_worlds(
+    remote: Connection,
+    worlds: PredPreyGrassWorlds,
+    commands: Optional[Dict[str, Callable[[], None]]] = None,
+) -> None:
+    # command loop of a worker; 'commands' adds commands without data, which
+    # are acknowledged like "step"
+    commands = commands or {}
+    try:
+        while True:
+            # idle until the next command: stock up on initial states
+            while not remote.poll() and worlds.fill_initial_state_bank():
+                pass
+            try:
+                cmd, data = remote.recv()
+            except EOFError:
+                break
+            if cmd == "step":
+                worlds.step()
+                remote.send(None)
+            elif cmd == "reset":
+                worlds.reset(data)
+                remote.send(None)
+            elif cmd in commands:
+                commands[cmd]()
+                remote.send(None)
+            elif cmd == "get_attr":
+                world_nr, attr_name = data
+                remote.send(getattr(worlds.pred_prey_env_list[world_nr], attr_name))
+            elif cmd == "set_attr":
+                world_nr, attr_name, value = data
+                remote.send(setattr(worlds.pred_prey_env_list[world_nr], attr_name, value))
+            elif cmd == "env_method":
+                world_nr, method_name, method_args, method_kwargs = data
+                method = getattr(worlds.pred_prey_env_list[world_nr], method_name)
+                remote.send(method(*method_args, **method_kwargs))
+            elif cmd == "close":
+                worlds.close()
+                remote.close()
+                break
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+    except KeyboardInterrupt:
+        print("SharedMemoryVecEnv worker: got KeyboardInterrupt")
+
+
+class PredPreyGrassSharedMemoryVecEnv(PredPreyGrassVecEnv):
+    """
+    'num_envs' worlds are divided over 'num_workers' processes. step_async only
+    signals the workers to step, step_wait waits for their ready messages.
+    """
+
+    def __init__(
+        self,
+        env_fn,
+        num_envs: int = 8,
+        num_workers: int = 8,
+        start_method: Optional[str] = None,
+        **env_kwargs,
+    ):
+        self.num_workers: int = min(num_workers, num_envs)
+        self.start_method = start_method
+        self.shared_memory_list: List[shared_memory.SharedMemory] = []
+        self.waiting = False
+        self.closed = False
+        super().__init__(env_fn, num_envs, **env_kwargs)
+
+    def allocate_buffers(
+        self, specs: Dict[str, Tuple[Tuple[int, ...], Any]]
+    ) -> Dict[str, np.ndarray]:
+        self.buffer_specs = specs
+        self.shared_memory_names: Dict[str, str] = {}
+        buffers = {}
+        for name, (shape, dtype) in specs.items():
+            size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            shared_memory_block = shared_memory.SharedMemory(create=True, size=size)
+            self.shared_memory_list.append(shared_memory_block)
+            self.shared_memory_names[name] = shared_memory_block.name
+            buffers[name] = np.ndarray(shape, dtype=dtype, buffer=shared_memory_block.buf)
+            buffers[name].fill(0)
+        return buffers
+
+    def start_worlds(self, env_fn, env_kwargs: Dict[str, Any]) -> None:
+        # shards of (almost) equal numbers of worlds
+        shard_bounds = np.linspace(0, self.num_worlds, self.num_workers + 1).astype(int)
+        world_slice_list = [
+            slice(shard_bounds[worker_nr], shard_bounds[worker_nr + 1])
+            for worker_nr in range(self.num_workers)
+        ]
+        self.start_workers(
+            _worker,
+            world_slice_list,
+            [
+                (
+                    env_fn.__name__,
+                    world_slice,
+                    self.shared_memory_names,
+                    self.buffer_specs,
+                    shard_world_parameters(self.world_parameters, world_slice),
+                    self.initial_state_bank_size,
+                    self.initial_state_bank_thread,
+                    env_kwargs,
+                )
+                for world_slice in world_slice_list
+            ],
+        )
+
+    def start_workers(
+        self,
+        worker_target: Callable[..., None],
+        world_slice_list: List[slice],
+        worker_args_list: List[Tuple[Any, ...]],
+    ) -> None:
+        # one worker process per shard of worlds, started as
+        # worker_target(work_remote, remote, *worker_args)
+        if self.start_method is None:
+            # fork is not a thread safe method (see issue #217 of stable_baselines3)
+            forkserver_available = "forkserver" in mp.get_all_start_methods()
+            self.start_method = "forkserver" if forkserver_available else "spawn"
+        ctx = mp.get_context(self.start_method)
+
+        self.world_slice_list = world_slice_list
+        self.world_worker_array = np.repeat(
+            np.arange(len(world_slice_list)),
+            [world_slice.stop - world_slice.start for world_slice in world_slice_list],
+        )
+
+        self.remotes, self.work_remotes = zip(
+            *[ctx.Pipe() for _ in range(len(world_slice_list))]
+        )
+        self.processes = []
+        for work_remote, remote, worker_args in zip(
+            self.work_remotes, self.remotes, worker_args_list
+        ):
+            args = (work_remote, remote) + tuple(worker_args)
+            # daemon=True: if the main process crashes, we should not cause things to hang
+            process = ctx.Process(target=worker_target, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+    def _reset_worlds(self, seeds: List[Optional[int]]) -> None:
+        for remote, world_slice in zip(self.remotes, self.world_slice_list):
+            remote.send(("reset", seeds[world_slice]))
+        for remote in self.remotes:
+            remote.recv()
+
+    def _step_worlds(self) -> None:
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def _wait_worlds(self) -> None:
+        for remote in self.remotes:
+            remote.recv()
+        self.waiting = False
+
+    def _world_remote(self, world_nr: int) -> Tuple[Connection, int]:
+        # pipe of the worker of 'world_nr' and the index of the world in its shard
+        worker_nr = self.world_worker_array[world_nr]
+        return (
+            self.remotes[worker_nr],
+            world_nr - self.world_slice_list[worker_nr].start,
+        )
+
+    def _get_world_attr(self, world_nr: int, attr_name: str) -> Any:
+        remote, shard_world_nr = self._world_remote(world_nr)
+        remote.send(("get_attr", (shard_world_nr, attr_name)))
+        return remote.recv()
+
+    def _set_world_attr(self, world_nr: int, attr_name: str, value: Any) -> None:
+        remote, shard_world_nr = self._world_remote(world_nr)
+        remote.send(("set_attr", (shard_world_nr, attr_name, value)))
+        remote.recv()
+
+    def _call_world_method(
+        self, world_nr: int, method_name: str, method_args, method_kwargs
+    ) -> Any:
+        remote, shard_world_nr = self._world_remote(world_nr)
+        remote.send(
+            ("env_method", (shard_world_nr, method_name, method_args, method_kwargs))
+        )
+        return remote.recv()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        if self.waiting:
+            self._wait_worlds()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        # release the numpy views before the shared memory is closed
+        self.buffers = {}
+        self.buf_obs = self.buf_terminal_obs = self.buf_rews = None
+        for shared_memory_block in self.shared_memory_list:
+            shared_memory_block.close()
+            shared_memory_block.unlink()
+        self.closed = True
@@ -0,0 +1,249 @@
+"""
+Stable Baselines3 vector environments per species. A number of predpreygrass
+worlds is stepped in lockstep and every species (Predator, Prey) gets its own
+VecEnv with its native observation shape (obs_range x obs_range), so that each
+species can be trained by its own policy without padding to max_observation_range.
+"""
+import numpy as np
+from typing import Any, Dict, List, Optional, Type
+
+import gymnasium
+from stable_baselines3.common.vec_env import VecEnv
+from stable_baselines3.common.vec_env.base_vec_env import (
+    VecEnvIndices,
+    VecEnvObs,
+    VecEnvStepReturn,
+)
+
+
+class PredPreyGrassSpeciesVecEnvs:
+    def __init__(self, env_fn, num_envs: int = 8, **env_kwargs):
+        # the species vector environments only make sense with native observation shapes
+        env_kwargs["pad_observations"] = False
+        env_kwargs["render_mode"] = None
+        if env_kwargs.get("grow_agent_pools", False):
+            raise ValueError("the species vector environments need fixed agent pools")
+        self.metadata = env_fn.raw_env.metadata
+        self.num_worlds: int = num_envs
+        self.pred_prey_env_list = [
+            env_fn.PredPreyGrass(**env_kwargs) for _ in range(self.num_worlds)
+        ]
+        pred_prey_env = self.pred_prey_env_list[0]
+
+        # species are the learning agent types; their slots are contiguous in 'agent_name_list'
+        self.species_name_list: List[str] = ["predator", "prey"]
+        self.n_agents: int = pred_prey_env.n_possible_agents
+        self.species_slice: Dict[str, slice] = {
+            "predator": slice(0, pred_prey_env.n_possible_predator),
+            "prey": slice(pred_prey_env.n_possible_predator, self.n_agents),
+        }
+        self.species_observation_space: Dict[str, gymnasium.spaces.Box] = {
+            "predator": pred_prey_env.obs_space_predator,
+            "prey": pred_prey_env.obs_space_prey,
+        }
+        self.action_space = pred_prey_env.action_space[0]
+
+        # actions of all agents of all worlds, default action is "stay"
+        self.actions = np.full(
+            (self.num_worlds, self.n_agents),
+            pred_prey_env.motion_range.index([0, 0]),
+            dtype=np.int64,
+        )
+        self.submitted_species = set()
+        self.species_to_collect = set()
+        self.species_reset_done = set(self.species_name_list)
+
+        self.vec_envs: Dict[str, SpeciesVecEnv] = {
+            species_name: SpeciesVecEnv(self, species_name)
+            for species_name in self.species_name_list
+        }
+
+    def n_species_agents(self, species_name: str) -> int:
+        species_slice = self.species_slice[species_name]
+        return species_slice.stop - species_slice.start
+
+    def reset(self, species_name: str, seeds: List[Optional[int]]) -> None:
+        # the worlds are shared by all species: only reset them once per round,
+        # when the calling species already received the observations of the last reset
+        if species_name not in self.species_reset_done:
+            return
+        n_species_agents = self.n_species_agents(species_name)
+        for world_nr, pred_prey_env in enumerate(self.pred_prey_env_list):
+            seed = seeds[world_nr * n_species_agents]
+            if seed is not None:
+                pred_prey_env._seed(seed=seed)
+            pred_prey_env.reset()
+            self._write_observations(world_nr)
+        self.species_reset_done = set()
+        self.submitted_species = set()
+        self.species_to_collect = set()
+
+    def submit_actions(self, species_name: str, actions: np.ndarray) -> None:
+        self.actions[:, self.species_slice[species_name]] = np.asarray(
+            actions
+        ).reshape(self.num_worlds, self.n_species_agents(species_name))
+        self.submitted_species.add(species_name)
+
+    def collect(self, species_name: str) -> None:
+        # the worlds are stepped when the first species collects its results after
+        # all species have submitted their actions
+        if species_name not in self.species_to_collect:
+            if len(self.submitted_species) < len(self.species_name_list):
+                raise RuntimeError(
+                    "step_wait of species '"
+                    + species_name
+                    + "' called before all species submitted their actions"
+                )
+            self._step_worlds()
+            self.submitted_species = set()
+            self.species_to_collect = set(self.species_name_list)
+        self.species_to_collect.remove(species_name)
+
+    def _step_worlds(self) -> None:
+        for world_nr, pred_prey_env in enumerate(self.pred_prey_env_list):
+            pred_prey_env.step_cycle(self.actions[world_nr])
+            terminated = pred_prey_env.is_terminated
+            truncated = pred_prey_env.is_truncated
+            for species_name in self.species_name_list:
+                self.vec_envs[species_name].write_step_results(
+                    world_nr, pred_prey_env, terminated, truncated
+                )
+            self._write_observations(world_nr)
+            if terminated or truncated:
+                for species_name in self.species_name_list:
+                    self.vec_envs[species_name].save_terminal_observations(world_nr)
+                pred_prey_env.reset()
+                self._write_observations(world_nr)
+
+    def _write_observations(self, world_nr: int) -> None:
+        for species_name in self.species_name_list:
+            self.vec_envs[species_name].write_observations(
+                world_nr, self.pred_prey_env_list[world_nr]
+            )
+
+
+class SpeciesVecEnv(VecEnv):
+    def __init__(self, species_vec_envs: PredPreyGrassSpeciesVecEnvs, species_name: str):
+        self.species_vec_envs = species_vec_envs
+        self.species_name = species_name
+        self.n_species_agents = species_vec_envs.n_species_agents(species_name)
+        # agents of the species in 'agent_pool_list' (and 'agent_name_list')
+        self.species_slice: slice = species_vec_envs.species_slice[species_name]
+        observation_space = species_vec_envs.species_observation_space[species_name]
+        super().__init__(
+            species_vec_envs.num_worlds * self.n_species_agents,
+            observation_space,
+            species_vec_envs.action_space,
+        )
+        self.metadata = species_vec_envs.metadata
+
+        self.buf_obs = np.zeros(
+            (self.num_envs,) + observation_space.shape, dtype=observation_space.dtype
+        )
+        self.buf_rews = np.zeros((self.num_envs,), dtype=np.float32)
+        self.buf_dones = np.zeros((self.num_envs,), dtype=bool)
+        self.buf_infos: List[Dict[str, Any]] = [{} for _ in range(self.num_envs)]
+
+    def rows(self, world_nr: int) -> slice:
+        return slice(
+            world_nr * self.n_species_agents, (world_nr + 1) * self.n_species_agents
+        )
+
+    def write_observations(self, world_nr: int, pred_prey_env) -> None:
+        row = world_nr * self.n_species_agents
+        for agent_instance in pred_prey_env.agent_pool_list[self.species_slice]:
+            if agent_instance.is_active:
+                # same (y, x, channel) layout as raw_env.observe
+                self.buf_obs[row] = np.swapaxes(
+                    pred_prey_env.observe_agent(agent_instance), 2, 0
+                )
+            else:
+                self.buf_obs[row] = 0.0
+            row += 1
+
+    def write_step_results(
+        self, world_nr: int, pred_prey_env, terminated: bool, truncated: bool
+    ) -> None:
+        rows = self.rows(world_nr)
+        self.buf_rews[rows] = pred_prey_env.agent_reward_array[
+            pred_prey_env.agent_id_nr_array[self.species_slice]
+        ]
+        self.buf_dones[rows] = terminated or truncated
+        for row in range(rows.start, rows.stop):
+            self.buf_infos[row] = {}
+            if terminated or truncated:
+                self.buf_infos[row]["TimeLimit.truncated"] = truncated and not terminated
+
+    def save_terminal_observations(self, world_nr: int) -> None:
+        for row in range(self.rows(world_nr).start, self.rows(world_nr).stop):
+            self.buf_infos[row]["terminal_observation"] = self.buf_obs[row].copy()
+
+    def reset(self) -> VecEnvObs:
+        self.species_vec_envs.reset(self.species_name, self._seeds)
+        self.species_vec_envs.species_reset_done.add(self.species_name)
+        self._reset_seeds()
+        self._reset_options()
+        return self.buf_obs.copy()
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self.species_vec_envs.submit_actions(self.species_name, actions)
+
+    def step_wait(self) -> VecEnvStepReturn:
+        self.species_vec_envs.collect(self.species_name)
+        return (
+            self.buf_obs.copy(),
+            self.buf_rews.copy(),
+            self.buf_dones.copy(),
+            self.buf_infos[:],
+        )
+
+    def action_masks(self) -> np.ndarray:
+        # MaskablePPO (sb3_contrib) compatible action masks of all rows
+        species_slice = self.species_vec_envs.species_slice[self.species_name]
+        return np.concatenate(
+            [
+                pred_prey_env.action_mask_array[
+                    pred_prey_env.agent_id_nr_array[species_slice]
+                ].astype(bool)
+                for pred_prey_env in self.species_vec_envs.pred_prey_env_list
+            ]
+        )
+
+    def close(self) -> None:
+        for pred_prey_env in self.species_vec_envs.pred_prey_env_list:
+            pred_prey_env.close()
+
+    def _world(self, row: int):
+        return self.species_vec_envs.pred_prey_env_list[row // self.n_species_agents]
+
+    def get_attr(self, attr_name: str, indices: VecEnvIndices = None) -> List[Any]:
+        if attr_name == "render_mode":
+            return [None for _ in self._get_indices(indices)]
+        if attr_name == "action_masks":
+            return [self.action_masks for _ in self._get_indices(indices)]
+        return [getattr(self._world(row), attr_name) for row in self._get_indices(indices)]
+
+    def set_attr(self, attr_name: str, value: Any, indices: VecEnvIndices = None) -> None:
+        for row in self._get_indices(indices):
+            setattr(self._world(row), attr_name, value)
+
+    def env_method(
+        self,
+        method_name: str,
+        *method_args,
+        indices: VecEnvIndices = None,
+        **method_kwargs
+    ) -> List[Any]:
+        if method_name == "action_masks":
+            # one row per learning agent instead of one per world
+            action_masks = self.action_masks()
+            return [action_masks[row] for row in self._get_indices(indices)]
+        return [
+            getattr(self._world(row), method_name)(*method_args, **method_kwargs)
+            for row in self._get_indices(indices)
+        ]
+
+    def env_is_wrapped(
+        self, wrapper_class: Type[gymnasium.Wrapper], indices: VecEnvIndices = None
+    ) -> List[bool]:
+        return [False for _ in self._get_indices(indices)]
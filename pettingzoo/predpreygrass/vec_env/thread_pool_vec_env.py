@@ -0,0 +1,95 @@
+"""
+Thread pool backend of 'PredPreyGrassVecEnv'. All worlds live in the main
+process and are stepped concurrently by a pool of threads, each stepping its own
+shard of the worlds directly into the step buffers. Compared to the
+multiprocess backend there is no serialization and no copy of the environment
+per process, and the read-only lookup tables are shared by all worlds. The
+threads only run in parallel while the engine runs code that releases the GIL
+(the Numba kernels, see environments/kernels.py, and parts of NumPy), or on a
+free-threaded Python build (python3.13t and later).
+"""
+import sys
+import warnings
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+from vec_env.predpreygrass_vec_env import PredPreyGrassVecEnv
+
+
+def is_gil_enabled() -> bool:
+    # free-threaded builds can run the world shards truly in parallel
+    return getattr(sys, "_is_gil_enabled", lambda: True)()
+
+
+class PredPreyGrassThreadPoolVecEnv(PredPreyGrassVecEnv):
+    """
+    'num_envs' worlds are divided over 'num_workers' threads. step_async submits
+    the shards to the pool, step_wait waits for them. A seeded world (see 'seed')
+    draws from a 'random.Random' of its own (see '_seed'), so seeded runs are
+    reproducible with any number of threads. Only unseeded worlds share the
+    global 'random' module; with more than one thread the order of their draws
+    (and thereby the episodes) is not reproducible.
+    """
+
+    def __init__(
+        self,
+        env_fn,
+        num_envs: int = 8,
+        num_workers: int = 8,
+        **env_kwargs,
+    ):
+        self.num_workers: int = max(min(num_workers, num_envs), 1)
+        self.futures: List[Future] = []
+        self.closed = False
+        super().__init__(env_fn, num_envs, **env_kwargs)
+
+    def start_worlds(self, env_fn, env_kwargs: Dict[str, Any]) -> None:
+        super().start_worlds(env_fn, env_kwargs)
+        # shards of (almost) equal numbers of worlds
+        shard_bounds = np.linspace(0, self.num_worlds, self.num_workers + 1).astype(int)
+        self.world_range_list = [
+            range(shard_bounds[worker_nr], shard_bounds[worker_nr + 1])
+            for worker_nr in range(self.num_workers)
+        ]
+        if (
+            self.num_workers > 1
+            and is_gil_enabled()
+            and self.worlds.pred_prey_env_list[0].kernel_backend != "numba"
+        ):
+            warnings.warn(
+                "with the GIL and without the Numba kernels the world shards hardly "
+                "overlap: install numba, use a free-threaded Python build or the "
+                "multiprocess backend"
+            )
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.num_workers, thread_name_prefix="predpreygrass_world"
+        )
+
+    def _step_shard(self, world_range: range) -> None:
+        for world_nr in world_range:
+            self.worlds.step_world(world_nr)
+
+    def _reset_worlds(self, seeds: List[Optional[int]]) -> None:
+        # seeding and resetting is cheap compared to stepping: done serially
+        self.worlds.reset(seeds)
+
+    def _step_worlds(self) -> None:
+        self.futures = [
+            self.executor.submit(self._step_shard, world_range)
+            for world_range in self.world_range_list
+        ]
+
+    def _wait_worlds(self) -> None:
+        futures, self.futures = self.futures, []
+        for future in futures:
+            # re-raises an exception of the thread
+            future.result()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self._wait_worlds()
+        self.executor.shutdown(wait=True)
+        super().close()
+        self.closed = True
@@ -1,6 +1,10 @@
-#import imageio
 import imageio.v2 as imageio
 import os
+import sys
+
+# streams the images one by one into the GIF, without loading them all
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "predpreygrass"))
+from environments.frame_writer import FrameWriter
 
 # Specify the directory containing the images
 image_directory = './assets/images'
@@ -14,13 +18,8 @@ image_files = [file for file in file_names if file.endswith('.png')]
 # Sort the image files (optional, use if images should be in a specific order)
 image_files.sort()
 
-# Create a list to hold the images
-images = []
-
-# Read each image file and add it to the images list
-for image_file in image_files:
-    image_path = os.path.join(image_directory, image_file)
-    images.append(imageio.imread(image_path))
-
 # Save the images as a GIF
-imageio.mimsave('./assets/gif/predpreygrass1.gif', images)
\ No newline at end of file
+with FrameWriter('./assets/gif/predpreygrass1.gif') as frame_writer:
+    for image_file in image_files:
+        image_path = os.path.join(image_directory, image_file)
+        frame_writer.write(imageio.imread(image_path, pilmode='RGB'))
@@ -18,7 +18,8 @@ class DiscreteAgent():
         initial_energy=10,
         catch_grass_reward=5.0,
         catch_prey_reward=5.0,
-        energy_loss_per_step=-0.1
+        energy_loss_per_step=-0.1,
+        energy_array=None,
 
     ):
         #identification agent
@@ -30,6 +31,10 @@ class DiscreteAgent():
         self.observation_range = observation_range
         self.motion_range = motion_range
         self.position = np.zeros(2, dtype=np.int32)  # x and y position
+        # energy is stored in an environment wide array indexed by agent_id_nr
+        if energy_array is None:
+            energy_array = np.zeros(agent_id_nr + 1, dtype=np.float64)
+        self.energy_array = energy_array
         self.energy = initial_energy  
         self.energy_loss_per_step = energy_loss_per_step
         self.catch_grass_reward = catch_grass_reward
@@ -40,6 +45,14 @@ class DiscreteAgent():
         self.x_grid_dim = self.model_state_agent.shape[0]
         self.y_grid_dim = self.model_state_agent.shape[1]
 
+    @property
+    def energy(self):
+        return float(self.energy_array[self.agent_id_nr])
+
+    @energy.setter
+    def energy(self, energy):
+        self.energy_array[self.agent_id_nr] = energy
+
     def move(self, action : int):
         # returns new position of agent "self" given action "action"
 
@@ -16,6 +16,8 @@ configuration = dict(
     initial_energy_prey = 5.0, 
     catch_reward_grass = 3.0,
     catch_reward_prey = 3.0,      
+    # observations as {"observations": ..., "action_mask": ...} for action masking models
+    action_mask_observations=False,
  
     # visualization parameters
     render_mode="human",
@@ -16,6 +16,11 @@ from ray.rllib import MultiAgentEnv
 
 from agents.discrete_agent import DiscreteAgent
 
+# observation space layouts which have been validated in this process: workers
+# building many environments with the same configuration validate only once
+_validated_observation_space_keys = set()
+
+
 class PredPreyGrassEnv(MultiAgentEnv):
     metadata = {
         "render_modes": ["human", "rgb_array"],
@@ -53,6 +58,8 @@ class PredPreyGrassEnv(MultiAgentEnv):
         self.cell_scale = configuration.get("cell_scale",40)
         self.x_pygame_window = configuration.get("x_pygame_window",0)
         self.y_pygame_window = configuration.get("y_pygame_window",0)
+        # action masking configuration: observations as {"observations": ..., "action_mask": ...}
+        self.action_mask_observations = configuration.get("action_mask_observations",False)
 
 
         self._skip_env_checking = False
@@ -65,7 +72,7 @@ class PredPreyGrassEnv(MultiAgentEnv):
         self._seed()
 
         self.render_mode = "human"
-        pygame.init()
+        # pygame is initialized by the first render call
         self.closed = False
 
 
@@ -111,6 +118,16 @@ class PredPreyGrassEnv(MultiAgentEnv):
 
 
 
+        # motions of the actions
+        self.motion_range = [
+            [-1, 0], # move left
+            [0, -1], # move up
+            [0, 0], # stay
+            [0, 1], # move down
+            [1, 0], # move right
+        ]    
+        self.n_actions_agent=len(self.motion_range)
+
         # observations
         self.nr_observation_channels = len(self.agent_type_name_list)
 
@@ -133,6 +150,12 @@ class PredPreyGrassEnv(MultiAgentEnv):
         )
 
 
+        if self.action_mask_observations:
+            # the action mask (see 'update_action_masks') next to the observation, for action masking models
+            action_mask_space = Box(low=0, high=1, shape=(self.n_actions_agent,), dtype=np.float32)
+            self.obs_space_predator = Dict({"observations": self.obs_space_predator, "action_mask": action_mask_space})
+            self.obs_space_prey = Dict({"observations": self.obs_space_prey, "action_mask": action_mask_space})
+
         self._observation_space_predators = [self.obs_space_predator for _ in range(self.n_initial_predator)]
         self._observation_space_prey = [self.obs_space_prey for _ in range(self.n_initial_prey)]
         self._observation_space_agents = self._observation_space_predators + self._observation_space_prey
@@ -148,17 +171,22 @@ class PredPreyGrassEnv(MultiAgentEnv):
         # check observation space and observations sample
         self._spaces_in_preferred_format = True 
         
-        observations_sample = self.observation_space.sample()
-        if self._check_if_obs_space_maps_agent_id_to_sub_space(): 
-            #print("Observation space maps correctly agent ids to spaces of individual agents")
-            pass
-        else:
-            raise ValueError("Observation space NOT correctly maps agent ids to spaces of individual agents")            
-        if self.observation_space_contains(observations_sample):
-            #print("Observation sample is correctly an element of observation space")
-            pass
-        else:
-            raise ValueError("Observation sample is NOT correctly an element of the observation space")
+        observation_space_key = (
+            tuple(self._agents), self.obs_shape_predator, self.obs_shape_prey, self.action_mask_observations
+        )
+        if observation_space_key not in _validated_observation_space_keys:
+            observations_sample = self.observation_space.sample()
+            if self._check_if_obs_space_maps_agent_id_to_sub_space(): 
+                #print("Observation space maps correctly agent ids to spaces of individual agents")
+                pass
+            else:
+                raise ValueError("Observation space NOT correctly maps agent ids to spaces of individual agents")            
+            if self.observation_space_contains(observations_sample):
+                #print("Observation sample is correctly an element of observation space")
+                pass
+            else:
+                raise ValueError("Observation sample is NOT correctly an element of the observation space")
+            _validated_observation_space_keys.add(observation_space_key)
         
 
         obs_predator = np.zeros(self.obs_shape_predator, dtype=np.int32)
@@ -172,20 +200,34 @@ class PredPreyGrassEnv(MultiAgentEnv):
 
         # end observations
 
+        # global state, allocated once so the read-only views of state() remain valid over resets
+        n_state_agents = self.n_initial_predator + self.n_initial_prey + self.n_initial_grass
+        self.model_state = np.zeros((self.nr_observation_channels, self.x_grid_size, self.y_grid_size), dtype=np.int32)
+        self.agent_energy_array = np.zeros(n_state_agents, dtype=np.float64) # indexed by agent_id_nr
+        self.state_space = Dict({
+            "model_state": Box(low=0, high=1, shape=self.model_state.shape, dtype=np.int32),
+            "energy": Box(low=-np.inf, high=np.inf, shape=(n_state_agents,), dtype=np.float64),
+        })
+        self.state_views = {}
+        for state_name, state_array in [("model_state", self.model_state), ("energy", self.agent_energy_array)]:
+            state_view = state_array.view()
+            state_view.flags.writeable = False
+            self.state_views[state_name] = state_view
+        # end global state
+
 
         # actions
-        self.motion_range = [
-            [-1, 0], # move left
-            [0, -1], # move up
-            [0, 0], # stay
-            [0, 1], # move down
-            [1, 0], # move right
-        ]    
-        self.n_actions_agent=len(self.motion_range)
         action_space_agent = Discrete(self.n_actions_agent)  
         self._action_space = [action_space_agent for _ in range(self.n_agents)] 
         self.action_space = Dict(dict(zip(self.agents, self._action_space)))
         self._action_space_in_preferred_format = self._check_if_action_space_maps_agent_id_to_sub_space() # True
+        self.stay_action = self.motion_range.index([0, 0])
+        # move transition table: target cell per (x, y, action); moves into the wall are clipped to the own cell
+        motion_array = np.array(self.motion_range)
+        self.move_x_target_table = np.clip(np.arange(self.x_grid_size)[:, None, None] + motion_array[:, 0], 0, self.x_grid_size - 1).repeat(self.y_grid_size, axis=1)
+        self.move_y_target_table = np.clip(np.arange(self.y_grid_size)[None, :, None] + motion_array[:, 1], 0, self.y_grid_size - 1).repeat(self.x_grid_size, axis=0)
+        # action mask (0.0 or 1.0) per learning agent (indexed by agent_id_nr), dead agents can only "stay"
+        self.action_mask_array = np.zeros((self.n_agents, self.n_actions_agent), dtype=np.float32)
         # end actions
 
         # removal agents
@@ -237,8 +279,9 @@ class PredPreyGrassEnv(MultiAgentEnv):
 
         self.agent_id_counter = 0
         self.agent_name_to_instance_dict = {}        
-        self.model_state = np.zeros((self.nr_observation_channels, self.x_grid_size, self.y_grid_size), dtype=np.int32)
-        
+        self.model_state.fill(0)
+        self.agent_energy_array.fill(0.0)
+
 
         # create agents of all types excluding "wall"
         for agent_type_nr in range(1, len(self.agent_type_name_list)):
@@ -262,7 +305,8 @@ class PredPreyGrassEnv(MultiAgentEnv):
                     initial_energy=self.initial_energy_list[agent_type_nr],
                     catch_grass_reward=self.catch_grass_reward,
                     catch_prey_reward=self.catch_prey_reward,
-                    energy_loss_per_step=self.energy_loss_per_step_list[agent_type_nr]
+                    energy_loss_per_step=self.energy_loss_per_step_list[agent_type_nr],
+                    energy_array=self.agent_energy_array
                 )
                 position = np.zeros(2, dtype=np.int32)  # x and y position
                 
@@ -303,6 +347,10 @@ class PredPreyGrassEnv(MultiAgentEnv):
         # define the learning agents
         self.agent_instance_list = self.predator_instance_list + self.prey_instance_list        
         self.agent_name_list = self.predator_name_list + self.prey_name_list
+        # agent_id_nr per learning agent in the order of self.agents, to index the arrays of the learning agents
+        self.agent_id_nr_array = np.array([self.agent_name_to_instance_dict[agent_name].agent_id_nr for agent_name in self.possible_agents])
+        # the masks are part of the observations with action_mask_observations
+        self.update_action_masks()
         self.observations = self._get_obs()
         # print("self.observations",self.observations)
 
@@ -322,7 +370,8 @@ class PredPreyGrassEnv(MultiAgentEnv):
         self.terminateds["__all__"] = False
         self.truncateds = dict(zip(self.agents, [False for _ in self.agents]))
         self.truncateds["__all__"] = False
-        self.infos = dict(zip(self.agents, [{} for _ in self.agents]))
+        # the action masks in the infos are views that follow the environment
+        self.infos = {agent_name: {"action_mask": self.action_mask_array[agent_id_nr]} for agent_name, agent_id_nr in zip(self.agents, self.agent_id_nr_array)}
 
 
         return self.observations, self.infos 
@@ -446,6 +495,7 @@ class PredPreyGrassEnv(MultiAgentEnv):
         self.predator_who_remove_prey_dict = dict(zip(self.predator_name_list, [False for _ in self.predator_name_list])) 
         self.prey_to_be_removed_by_predator_dict = dict(zip(self.prey_name_list, [False for _ in self.prey_name_list]))
 
+        self.update_action_masks()
         self.observations = self._get_obs()
         if self.n_cycles > self.max_cycles:
             for agent_name in self.agents:
@@ -468,6 +518,30 @@ class PredPreyGrassEnv(MultiAgentEnv):
         self.np_random, seed_ = seeding.np_random(seed)
         return [seed_]
 
+    def update_action_masks(self):
+        # moves into the wall or into a cell occupied by the same agent type are no-ops and are masked out
+        self.action_mask_array.fill(0.0)
+        self.action_mask_array[:, self.stay_action] = 1.0
+        alive_instance_list = [agent_instance for agent_instance in self.agent_instance_list if agent_instance.is_alive]
+        if not alive_instance_list:
+            return
+        agent_id_nr_array = np.array([agent_instance.agent_id_nr for agent_instance in alive_instance_list])
+        agent_type_nr_array = np.array([agent_instance.agent_type_nr for agent_instance in alive_instance_list])
+        position_array = np.array([agent_instance.position for agent_instance in alive_instance_list])
+        x_target = self.move_x_target_table[position_array[:, 0], position_array[:, 1]]
+        y_target = self.move_y_target_table[position_array[:, 0], position_array[:, 1]]
+        is_free = self.model_state[agent_type_nr_array[:, None], x_target, y_target] == 0
+        is_free[:, self.stay_action] = True
+        self.action_mask_array[agent_id_nr_array] = is_free
+
+    def action_masks(self):
+        # action mask per learning agent, as used by RLlib action masking models
+        return {agent_name: self.action_mask_array[agent_id_nr] for agent_name, agent_id_nr in zip(self.agents, self.agent_id_nr_array)}
+
+    def state(self):
+        # read-only views on the global state for centralized critics, no copies
+        return self.state_views
+
     def create_agent_name_list_from_instance_list(self, _agent_instance_list):
         _agent_name_list = []
         for agent_instance in _agent_instance_list:
@@ -509,6 +583,8 @@ class PredPreyGrassEnv(MultiAgentEnv):
             xlo, xhi, ylo, yhi, xolo, xohi, yolo, yohi = self.obs_clip(obs_range, xp, yp)
 
             observation[0:self.nr_observation_channels, xolo:xohi, yolo:yohi] = np.abs(self.model_state[0:self.nr_observation_channels, xlo:xhi, ylo:yhi])
+            if self.action_mask_observations:
+                observation = {"observations": observation, "action_mask": self.action_mask_array[agent_instance.agent_id_nr].copy()}
             _observations[agent_name] = observation
         return _observations
 
@@ -844,6 +920,8 @@ class PredPreyGrassEnv(MultiAgentEnv):
             return
 
         if self.screen is None:
+            if not pygame.get_init():
+                pygame.init()
             if self.render_mode == "human":
                 pygame.display.init()
                 self.screen = pygame.display.set_mode(
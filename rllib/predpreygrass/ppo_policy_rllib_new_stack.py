@@ -17,7 +17,8 @@ import time
 
 warnings.filterwarnings("ignore", category=DeprecationWarning) 
 
-check_env(PredPreyGrassEnv(configuration))
+env = PredPreyGrassEnv(configuration)
+check_env(env)
 print("Environment checked")
 
 
@@ -26,8 +27,15 @@ def env_creator(configuration):
 
 register_env("pred_prey_grass", env_creator)
 
-policy1 = PolicySpec()
-policy2 = PolicySpec()
+# one policy per species, each batched on the native observation shape of its species
+policy1 = PolicySpec(
+    observation_space=env.obs_space_predator,
+    action_space=env.action_space[env.predator_name_list[0]],
+)
+policy2 = PolicySpec(
+    observation_space=env.obs_space_prey,
+    action_space=env.action_space[env.prey_name_list[0]],
+)
 
 policies = { 
     "policy1": policy1,